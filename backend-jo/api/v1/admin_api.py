@@ -1,8 +1,14 @@
 from fastapi import APIRouter
 from .endpoints.admin import offers as admin_offers
 from .endpoints.admin import users as admin_users
+from .endpoints.admin import jobs as admin_jobs
+from .endpoints.admin import export as admin_export
+from .endpoints.admin import transactions as admin_transactions
 
 admin_router = APIRouter()
 
 admin_router.include_router(admin_offers.router, prefix="/offers", tags=["Admin - Offers"])
 admin_router.include_router(admin_users.router, prefix="/users", tags=["Admin - Users"])
+admin_router.include_router(admin_jobs.router, prefix="/jobs", tags=["Admin - Jobs"])
+admin_router.include_router(admin_export.router, prefix="/export", tags=["Admin - Export"])
+admin_router.include_router(admin_transactions.router, prefix="/transactions", tags=["Admin - Transactions"])
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from .endpoints import offers, auth, user, reservations, etickets, checkout
+from .endpoints import offers, auth, user, reservations, etickets, checkout, waiting_room
 from .admin_api import admin_router
 
 api_router = APIRouter()
@@ -10,6 +10,7 @@ api_router.include_router(user.router, prefix="/users", tags=["Users & Authentic
 api_router.include_router(reservations.router, prefix="/reservations", tags=["Reservations"])
 api_router.include_router(etickets.router, prefix="/etickets", tags=["E-Tickets"])
 api_router.include_router(checkout.router, prefix="/checkout", tags=["Checkout"])
+api_router.include_router(waiting_room.router, prefix="/queue", tags=["Waiting Room"])
 
 # Admin routes
 api_router.include_router(admin_router, prefix="/admin", tags=["Administration"])
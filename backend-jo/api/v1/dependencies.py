@@ -1,14 +1,60 @@
-from fastapi import Depends, HTTPException, status
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from typing import Optional
 from jose import JWTError, jwt
 from core.supabase_client import supabase_client
 from .models.auth_models import User, TokenData
 from core.security import oauth2_scheme
+from core.singleflight import single_flight, SingleFlightOverloaded, SingleFlightTimeout
+from core import waiting_room
+from core.claims import decode_access_token, claims_revocations, StaleClaims
+from core.database import database
+from core.replicas import read_client
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+PROFILE_SQL = "SELECT * FROM public.users WHERE id = $1"
+
+async def fetch_profile_pg(user_id):
+    async with database.as_user(user_id, readonly=True) as connection:
+        row = await connection.fetchrow(PROFILE_SQL, user_id)
+    return dict(row) if row else None
+
+def fetch_profile(user_id):
+    """Lit le profil de l'utilisateur dans la table 'users', avec ses propres droits."""
+    if database.uses_pool("profile"):
+        return database.run(fetch_profile_pg, user_id)
+    return read_client(user_id).table('users').select('*').eq('id', user_id).single().execute().data
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    # Dépendance synchrone : FastAPI l'exécute dans le pool de threads, ce qui
+    # évite de bloquer la boucle d'événements pendant les appels à Supabase.
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Supabase client not initialized")
-    
+
+    # Chemin rapide : le hook d'access token a placé le rôle et le profil dans le
+    # JWT, l'utilisateur est construit sans aucun appel à Supabase.
+    try:
+        claims = decode_access_token(token)
+        if claims:
+            claims_revocations.check(claims)
+            return User(
+                id=claims["sub"],
+                email=claims["email"],
+                first_name=claims["user_profile"]["first_name"],
+                last_name=claims["user_profile"]["last_name"],
+                is_admin=claims["is_admin"],
+            )
+    except StaleClaims:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Les droits de l'utilisateur ont changé : la session doit être rafraîchie.",
+            headers={"WWW-Authenticate": 'Bearer error="invalid_token", error_description="claims_outdated"'},
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Could not validate credentials: {e}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     try:
         user_response = supabase_client.auth.get_user(token)
         user = user_response.user
@@ -20,12 +66,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             )
 
         # Enrich user object with data from the 'users' table
-        profile_response = supabase_client.table('users').select('*').eq('id', user.id).single().execute()
+        # Les requêtes concurrentes d'un même utilisateur partagent la lecture du profil
+        profile = single_flight.do(f"profile:{user.id}", lambda: fetch_profile(user.id))
         
-        if not profile_response.data:
+        if not profile:
             raise HTTPException(status_code=404, detail="User profile not found in database.")
 
-        return User(**profile_response.data)
+        return User(**profile)
+    except (SingleFlightOverloaded, SingleFlightTimeout):
+        raise HTTPException(status_code=503, detail="Service surchargé, veuillez réessayer.", headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,3 +94,26 @@ def get_current_admin_user(current_user: User = Depends(get_current_user)) -> Us
             detail="L'utilisateur n'a pas les privilèges suffisants.",
         )
     return current_user
+
+def require_queue_admission(
+    current_user: User = Depends(get_current_user),
+    admission_token: Optional[str] = Header(None, alias="X-Queue-Admission"),
+) -> None:
+    """
+    Lorsque la file d'attente est active, exige un jeton d'admission valide
+    émis pour l'utilisateur courant (en-tête X-Queue-Admission).
+    """
+    if waiting_room.queue is None:
+        return
+    if not admission_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="La file d'attente est active : un jeton d'admission est requis.",
+        )
+    try:
+        waiting_room.verify_admission(admission_token, str(current_user.id))
+    except waiting_room.InvalidQueueToken:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Jeton d'admission invalide ou expiré.",
+        )
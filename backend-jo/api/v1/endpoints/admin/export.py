@@ -0,0 +1,142 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from datetime import datetime, timezone
+from decimal import Decimal
+import csv
+import io
+import json
+from api.v1.models.auth_models import User
+from api.v1.dependencies import get_current_admin_user
+from core.supabase_client import supabase_client
+from core.replicas import read_client
+from core.database import database
+from core.config import EXPORT_PAGE_SIZE
+
+router = APIRouter()
+
+# Tables exportables et colonnes exportées (la clé secrète des transactions n'en fait pas partie)
+EXPORT_COLUMNS = {
+    'transactions': ['id', 'user_id', 'amount', 'status', 'payment_method', 'created_at'],
+    'reservations': ['id', 'user_id', 'offer_id', 'quantity', 'transaction_id', 'created_at'],
+}
+# Filtres de statut acceptés, par table
+EXPORT_STATUSES = {
+    'transactions': {'pending', 'completed', 'failed', 'refunded'},
+}
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+def export_sql(table: str, status: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    """Requête d'export (parcours dans l'ordre de la clé primaire) et ses paramètres."""
+    conditions, args = [], []
+    if status is not None:
+        args.append(status)
+        conditions.append(f"status = ${len(args)}")
+    if since is not None:
+        args.append(since)
+        conditions.append(f"created_at >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"created_at < ${len(args)}")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {', '.join(EXPORT_COLUMNS[table])} FROM public.{table} {where} ORDER BY id", args
+
+def json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Même représentation que PostgREST pour les colonnes numeric
+        return float(value)
+    return str(value)
+
+def encode_rows(rows, columns, export_format: str) -> str:
+    if export_format == 'ndjson':
+        return ''.join(json.dumps(dict(row), default=json_value, ensure_ascii=False) + '\n' for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([json_value(row[column]) if row[column] is not None else '' for column in columns])
+    return buffer.getvalue()
+
+def csv_header(columns) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+def stream_postgrest(table, columns, export_format, admin_id, status, since, until):
+    """Pages successives de `EXPORT_PAGE_SIZE` lignes, par clé (id > dernier id reçu)."""
+    last_id = None
+    while True:
+        query = read_client(admin_id).table(table).select(','.join(columns))
+        if status is not None:
+            query = query.eq('status', status)
+        if since is not None:
+            query = query.gte('created_at', since.isoformat())
+        if until is not None:
+            query = query.lt('created_at', until.isoformat())
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(EXPORT_PAGE_SIZE).execute().data
+        if not rows:
+            return
+        yield encode_rows(rows, columns, export_format)
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        last_id = rows[-1]['id']
+
+async def stream_pg(table, columns, export_format, admin_id, status, since, until):
+    """Curseur côté serveur, lu par paquets de `EXPORT_PAGE_SIZE` lignes, sur un réplica s'il y en a."""
+    query, args = export_sql(table, status, since, until)
+    async with database.as_user(admin_id, readonly=True) as connection:
+        rows = []
+        async for row in connection.cursor(query, *args, prefetch=EXPORT_PAGE_SIZE):
+            rows.append(row)
+            if len(rows) == EXPORT_PAGE_SIZE:
+                yield encode_rows(rows, columns, export_format)
+                rows = []
+        if rows:
+            yield encode_rows(rows, columns, export_format)
+
+@router.get("/{table}")
+def export_table(
+    table: Literal['transactions', 'reservations'],
+    format: Literal['ndjson', 'csv'] = 'ndjson',
+    status: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Lignes créées à partir de cette date (incluse)"),
+    until: Optional[datetime] = Query(None, description="Lignes créées avant cette date (exclue)"),
+    admin: User = Depends(get_current_admin_user),
+):
+    """
+    Exporte une table en NDJSON ou en CSV (Admin requis).
+
+    Les lignes sont envoyées au fil de la lecture, par paquets de taille fixe : la
+    mémoire utilisée ne dépend pas du volume exporté. L'ordre est celui de la clé
+    primaire (chronologique pour les identifiants UUID v7).
+    """
+    if not supabase_client:
+        raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
+    if status is not None and status not in EXPORT_STATUSES.get(table, set()):
+        raise HTTPException(status_code=400, detail=f"Filtre de statut invalide pour la table {table}.")
+
+    columns = EXPORT_COLUMNS[table]
+    stream = stream_pg if database.uses_pool("export") else stream_postgrest
+    body = stream(table, columns, format, admin.id, status, since, until)
+
+    def with_header(body):
+        yield csv_header(columns)
+        yield from body
+
+    async def with_header_async(body):
+        yield csv_header(columns)
+        async for chunk in body:
+            yield chunk
+
+    if format == 'csv':
+        body = with_header_async(body) if stream is stream_pg else with_header(body)
+
+    filename = f"{table}_{datetime.now(timezone.utc):%Y-%m-%d}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
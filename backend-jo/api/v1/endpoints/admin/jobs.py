@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Literal, Optional
+from datetime import datetime, timezone
+import uuid
+from api.v1.models.job_models import Job
+from api.v1.models.auth_models import User
+from api.v1.dependencies import get_current_admin_user
+from core.supabase_client import service_client
+
+router = APIRouter()
+
+def jobs_table():
+    # La table n'a pas de politique RLS : seul le client service_role y accède
+    if not service_client:
+        raise HTTPException(status_code=503, detail="Le client service_role n'est pas initialisé.")
+    return service_client.table('jobs')
+
+@router.get("/", response_model=List[Job])
+def get_jobs(
+    status: Optional[Literal['pending', 'running', 'completed', 'dead']] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    admin: User = Depends(get_current_admin_user),
+):
+    """Liste les tâches les plus récentes, filtrées par statut ou par type (Admin requis)."""
+    query = jobs_table().select('*')
+    if status:
+        query = query.eq('status', status)
+    if kind:
+        query = query.eq('kind', kind)
+    return query.order('id', desc=True).limit(limit).execute().data
+
+@router.get("/{job_id}", response_model=Job)
+def get_job(job_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
+    """Récupère une tâche, avec son avancement et sa dernière erreur (Admin requis)."""
+    response = jobs_table().select('*').eq('id', str(job_id)).execute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Tâche non trouvée.")
+    return response.data[0]
+
+@router.post("/{job_id}/retry", response_model=Job)
+def retry_job(job_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
+    """Remet en file une tâche morte, avec un nouveau jeu d'essais (Admin requis)."""
+    response = jobs_table().update({
+        'status': 'pending',
+        'attempts': 0,
+        'run_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+    }).eq('id', str(job_id)).eq('status', 'dead').execute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Aucune tâche morte avec cet identifiant.")
+    return response.data[0]
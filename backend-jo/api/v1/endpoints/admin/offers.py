@@ -1,19 +1,341 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from typing import List, Literal, Optional
+from datetime import datetime, timezone
+import json
+import time
 import uuid
-from api.v1.models.offer_models import Offer, OfferCreate, OfferUpdate
+from api.v1.models.offer_models import (
+    Offer,
+    OfferCreate,
+    OfferUpdate,
+    OfferBulkRow,
+    OfferBulkReport,
+    OfferCancellationAccepted,
+)
 from api.v1.models.auth_models import User
 from api.v1.dependencies import get_current_admin_user
+from api.v1.endpoints.offers import OFFERS_LIST_FLIGHT_KEY, offer_flight_key
 from core.supabase_client import supabase_client
+from core.replicas import write_tracker
+from core.singleflight import single_flight
+from core.database import database
+from core.jobs import job_queue, PermanentJobError
+from core.metrics import metrics
+from core.config import OFFERS_BULK_BATCH_SIZE, OFFER_CANCELLATION_CHUNK_SIZE
+from core.uploads import upload_format, upload_records, validation_message
 
 router = APIRouter()
 
+OFFER_CANCELLATION_JOB = 'offers.cancel'
+
+offer_cancellation_rows = metrics.counter(
+    "offer_cancellation_rows_total",
+    "Lignes traitées par l'annulation des offres, par type (reservations, tickets, transactions).",
+)
+
+# Séparateur des `features` dans une cellule CSV
+CSV_LIST_SEPARATOR = '|'
+
+# Une instruction par lot ; l'ordinal relie chaque ligne écrite à sa ligne du fichier
+# et `xmax = 0` distingue les insertions des mises à jour
+UPSERT_OFFERS_SQL = """
+    WITH input AS MATERIALIZED (
+        SELECT e.ord, coalesce(r.id, gen_random_uuid()) AS id, r.name, r.description, r.price, r.type,
+               r.image_url, r.max_attendees, coalesce(r.features, '{}') AS features
+        FROM jsonb_array_elements($1::jsonb) WITH ORDINALITY AS e(doc, ord),
+             jsonb_to_record(e.doc) AS r(id uuid, name text, description text, price numeric, type text,
+                                         image_url text, max_attendees int, features text[])
+    ), written AS (
+        INSERT INTO public.offers (id, name, description, price, type, image_url, max_attendees, features)
+        SELECT id, name, description, price, type, image_url, max_attendees, features FROM input
+        ON CONFLICT (id) DO UPDATE SET
+            name = excluded.name,
+            description = excluded.description,
+            price = excluded.price,
+            type = excluded.type,
+            image_url = excluded.image_url,
+            max_attendees = excluded.max_attendees,
+            features = excluded.features,
+            updated_at = now()
+        RETURNING id, xmax = 0 AS inserted
+    )
+    SELECT input.ord, written.id, written.inserted
+    FROM written JOIN input USING (id)
+    ORDER BY input.ord
+"""
+
+# La date d'une offre déjà annulée est conservée : un nouvel appel relance seulement la tâche
+CANCEL_OFFER_SQL = """
+    UPDATE public.offers
+    SET cancelled_at = coalesce(cancelled_at, now()), updated_at = now()
+    WHERE id = $1
+    RETURNING cancelled_at
+"""
+# NULL pour une offre inconnue, false pour une offre qui n'est pas annulée
+OFFER_CANCELLED_SQL = "SELECT cancelled_at IS NOT NULL FROM public.offers WHERE id = $1"
+OFFER_RESERVATIONS_COUNTS_SQL = """
+    SELECT count(*) AS total, count(refunded_at) AS refunded, coalesce(sum(refund_amount), 0) AS refund_amount
+    FROM public.reservations WHERE offer_id = $1
+"""
+OFFER_RESERVATIONS_CHUNK_SQL = """
+    SELECT id FROM public.reservations WHERE offer_id = $1 AND id > $2 ORDER BY id LIMIT $3
+"""
+# Montant remboursé : part de la réservation dans sa transaction, au prorata des prix
+# des offres qu'elle porte ; rien pour une transaction qui n'a pas été payée. La
+# condition `refunded_at IS NULL` est revérifiée à l'écriture : deux tâches sur la
+# même offre ne remboursent pas deux fois
+REFUND_RESERVATIONS_SQL = """
+    WITH chunk AS (
+        SELECT r.id, r.transaction_id, r.quantity * o.price AS value
+        FROM public.reservations r JOIN public.offers o ON o.id = r.offer_id
+        WHERE r.id = ANY($1::uuid[]) AND r.refunded_at IS NULL
+    ), totals AS (
+        SELECT r.transaction_id, t.amount, sum(r.quantity * o.price) AS value
+        FROM public.reservations r
+        JOIN public.offers o ON o.id = r.offer_id
+        JOIN public.transactions t ON t.id = r.transaction_id
+        WHERE r.transaction_id IN (SELECT transaction_id FROM chunk) AND t.status = 'completed'
+        GROUP BY r.transaction_id, t.amount
+    )
+    UPDATE public.reservations r
+    SET refunded_at = now(),
+        refund_amount = coalesce(round(totals.amount * chunk.value / nullif(totals.value, 0), 2), 0)
+    FROM chunk LEFT JOIN totals USING (transaction_id)
+    WHERE r.id = chunk.id AND r.refunded_at IS NULL
+    RETURNING r.refund_amount
+"""
+VOID_TICKETS_SQL = """
+    UPDATE public.e_tickets SET voided_at = now()
+    WHERE reservation_id = ANY($1::uuid[]) AND voided_at IS NULL
+"""
+# Une transaction qui porte aussi d'autres offres reste `completed` (remboursement partiel)
+# tant que toutes ses réservations ne sont pas remboursées
+REFUND_TRANSACTIONS_SQL = """
+    UPDATE public.transactions t SET status = 'refunded'
+    WHERE t.id IN (SELECT transaction_id FROM public.reservations WHERE id = ANY($1::uuid[]))
+      AND t.status = 'completed'
+      AND NOT EXISTS (
+          SELECT 1 FROM public.reservations r WHERE r.transaction_id = t.id AND r.refunded_at IS NULL
+      )
+"""
+
+def csv_offer(record):
+    """Ligne CSV : les `features` sont une cellule unique, séparées par `|`."""
+    if 'features' in record:
+        features = record['features'].split(CSV_LIST_SEPARATOR)
+        record['features'] = [feature.strip() for feature in features if feature.strip()]
+    return record
+
+def upsert_offers_postgrest(batch):
+    """Écrit un lot de (numéro de ligne, OfferBulkRow) ; renvoie le résultat de chaque ligne."""
+    results = []
+    new = [(row, offer) for row, offer in batch if offer.id is None]
+    if new:
+        data = supabase_client.table('offers').insert([offer.model_dump(exclude={'id'}) for _, offer in new]).execute().data
+        results += [{'row': row, 'status': 'created', 'id': written['id']} for (row, _), written in zip(new, data)]
+    replaced = [(row, offer) for row, offer in batch if offer.id is not None]
+    if replaced:
+        ids = [str(offer.id) for _, offer in replaced]
+        known = {offer['id'] for offer in supabase_client.table('offers').select('id').in_('id', ids).execute().data}
+        updated_at = datetime.now(timezone.utc).isoformat()
+        supabase_client.table('offers').upsert(
+            [{**offer.model_dump(mode='json'), 'updated_at': updated_at} for _, offer in replaced]
+        ).execute()
+        results += [
+            {'row': row, 'status': 'updated' if str(offer.id) in known else 'created', 'id': offer.id}
+            for row, offer in replaced
+        ]
+    return results
+
+async def upsert_offers_pg(batch, admin_id):
+    payload = json.dumps([offer.model_dump(mode='json') for _, offer in batch])
+    async with database.as_user(admin_id) as connection:
+        written = await connection.fetch(UPSERT_OFFERS_SQL, payload)
+    return [
+        {'row': batch[record['ord'] - 1][0], 'status': 'created' if record['inserted'] else 'updated', 'id': record['id']}
+        for record in written
+    ]
+
+async def write_offers(batch, admin_id):
+    """
+    Écrit un lot en une fois. Si le lot est refusé (contrainte, id en double...),
+    chaque ligne est réécrite seule pour que l'erreur ne touche que les lignes fautives.
+    """
+    if database.uses_pool("offers"):
+        write = lambda items: upsert_offers_pg(items, admin_id)
+    else:
+        # Créations et remplacements font deux requêtes PostgREST : chaque groupe est
+        # repris séparément, pour ne pas recréer des offres déjà insérées
+        new = [item for item in batch if item[1].id is None]
+        if new and len(new) < len(batch):
+            replaced = [item for item in batch if item[1].id is not None]
+            return await write_offers(new, admin_id) + await write_offers(replaced, admin_id)
+        write = lambda items: run_in_threadpool(upsert_offers_postgrest, items)
+    try:
+        return await write(batch)
+    except Exception as e:
+        error = e
+    if len(batch) == 1:
+        row, offer = batch[0]
+        return [{'row': row, 'status': 'error', 'id': offer.id, 'error': str(error)}]
+    results = []
+    for item in batch:
+        results += await write_offers([item], admin_id)
+    return results
+
+@router.post("/bulk", response_model=OfferBulkReport)
+async def bulk_upsert_offers(
+    request: Request,
+    format: Optional[Literal['csv', 'ndjson']] = None,
+    admin: User = Depends(get_current_admin_user),
+):
+    """
+    Crée ou met à jour des offres en masse à partir d'un fichier CSV ou NDJSON (Admin requis).
+
+    Le format vient de `format` ou, à défaut, du Content-Type (`text/csv`,
+    `application/x-ndjson`). Une ligne porte les champs d'une offre ; avec un `id`,
+    elle crée ou remplace cette offre. En CSV, la première ligne nomme les colonnes
+    et les `features` sont séparées par `|`.
+
+    Le corps est lu et validé au fil de l'envoi, et les lignes valides sont écrites
+    par lots de `OFFERS_BULK_BATCH_SIZE`. Le rapport donne le résultat de chaque
+    ligne ; une ligne invalide n'empêche pas l'écriture des autres.
+    """
+    if not supabase_client:
+        raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
+    format = upload_format(request, format)
+
+    results = []
+    batch = []
+    row = 0
+    async for record in upload_records(request, format):
+        row += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append((row, OfferBulkRow.model_validate(csv_offer(record) if format == 'csv' else record)))
+        except (ValidationError, ValueError) as e:
+            results.append({'row': row, 'status': 'error', 'id': None, 'error': validation_message(e)})
+            continue
+        if len(batch) >= OFFERS_BULK_BATCH_SIZE:
+            results += await write_offers(batch, admin.id)
+            batch = []
+    if batch:
+        results += await write_offers(batch, admin.id)
+
+    results.sort(key=lambda result: result['row'])
+    written = [result for result in results if result['status'] != 'error']
+    if written:
+        write_tracker.mark(admin.id)
+        # Une seule invalidation pour tout l'import : les lectures en cours ne sont plus partagées
+        single_flight.forget(OFFERS_LIST_FLIGHT_KEY)
+        for result in written:
+            single_flight.forget(offer_flight_key(result['id']))
+    return {
+        'created': sum(result['status'] == 'created' for result in results),
+        'updated': sum(result['status'] == 'updated' for result in results),
+        'errors': sum(result['status'] == 'error' for result in results),
+        'rows': results,
+    }
+
+async def enqueue_cancellation(offer_id, admin_id):
+    async with database.as_service() as connection:
+        cancelled_at = await connection.fetchval(CANCEL_OFFER_SQL, offer_id)
+        if cancelled_at is None:
+            return None
+        [job_id] = await job_queue.enqueue_many(
+            connection, OFFER_CANCELLATION_JOB, [{'offer_id': offer_id}], [admin_id]
+        )
+    return {'job_id': job_id, 'offer_id': offer_id, 'cancelled_at': cancelled_at}
+
+@router.post("/{offer_id}/cancel", response_model=OfferCancellationAccepted, status_code=status.HTTP_202_ACCEPTED)
+def cancel_offer(offer_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
+    """
+    Annule une offre (séance annulée) et rembourse ses réservations en tâche de fond (Admin requis).
+
+    L'offre n'est plus vendue dès la réponse. La tâche rembourse ensuite les
+    réservations par lots de `OFFER_CANCELLATION_CHUNK_SIZE`, chacun dans sa
+    propre transaction : montant remboursé noté sur la réservation, e-tickets
+    annulés (refusés au contrôle d'accès), transaction passée à `refunded` une
+    fois toutes ses réservations remboursées, événements publiés par l'outbox.
+    L'avancement et le débit se suivent sur `GET /admin/jobs/{job_id}` ; un
+    nouvel appel sur une offre déjà annulée relance la tâche sans rien
+    rembourser deux fois.
+    """
+    if database.pool is None:
+        raise HTTPException(status_code=503, detail="L'annulation nécessite le pool Postgres.")
+    accepted = database.run(enqueue_cancellation, offer_id, admin.id)
+    if accepted is None:
+        raise HTTPException(status_code=404, detail="Offre non trouvée.")
+    write_tracker.mark(admin.id)
+    single_flight.forget(OFFERS_LIST_FLIGHT_KEY)
+    single_flight.forget(offer_flight_key(offer_id))
+    return accepted
+
+@job_queue.handler(OFFER_CANCELLATION_JOB)
+async def refund_offer(job):
+    """
+    Rembourse les réservations d'une offre annulée par lots, en parcourant ses
+    réservations par clé. Une tâche interrompue repart du début sans coût :
+    les réservations déjà remboursées ne sont plus modifiées, et l'avancement
+    publié les compte dès le départ.
+
+    Rien n'est remboursé si la tâche n'a pas été inscrite par un administrateur
+    ou si l'offre n'est pas annulée : la tâche passe alors en file morte.
+    """
+    await job.require_admin()
+    offer_id = uuid.UUID(job.payload['offer_id'])
+    async with database.as_service(readonly=True) as connection:
+        if not await connection.fetchval(OFFER_CANCELLED_SQL, offer_id):
+            raise PermanentJobError(f"L'offre {offer_id} n'est pas annulée")
+        counts = await connection.fetchrow(OFFER_RESERVATIONS_COUNTS_SQL, offer_id)
+    progress = {
+        'total': counts['total'],
+        'refunded': counts['refunded'],
+        'refund_amount': counts['refund_amount'],
+        'tickets_voided': 0,
+        'transactions_refunded': 0,
+    }
+    started = time.monotonic()
+    processed = 0
+    after = uuid.UUID(int=0)
+    while True:
+        async with database.as_service() as connection:
+            ids = [row['id'] for row in await connection.fetch(
+                OFFER_RESERVATIONS_CHUNK_SQL, offer_id, after, OFFER_CANCELLATION_CHUNK_SIZE
+            )]
+            if not ids:
+                break
+            refunds = await connection.fetch(REFUND_RESERVATIONS_SQL, ids)
+            tickets = int((await connection.execute(VOID_TICKETS_SQL, ids)).split()[-1])
+            transactions = int((await connection.execute(REFUND_TRANSACTIONS_SQL, ids)).split()[-1])
+        after = ids[-1]
+        processed += len(ids)
+        offer_cancellation_rows.inc(len(refunds), kind='reservations')
+        offer_cancellation_rows.inc(tickets, kind='tickets')
+        offer_cancellation_rows.inc(transactions, kind='transactions')
+        progress['refunded'] += len(refunds)
+        progress['refund_amount'] += sum(row['refund_amount'] for row in refunds)
+        progress['tickets_voided'] += tickets
+        progress['transactions_refunded'] += transactions
+        rate = round(processed / max(time.monotonic() - started, 1e-6), 1)
+        await job.report_progress(step='reservations', processed=processed, reservations_per_second=rate, **progress)
+    # Décomptes finaux relus : une autre tâche sur la même offre a pu rembourser une partie des lots
+    async with database.as_service(readonly=True) as connection:
+        counts = await connection.fetchrow(OFFER_RESERVATIONS_COUNTS_SQL, offer_id)
+    progress.update(total=counts['total'], refunded=counts['refunded'], refund_amount=counts['refund_amount'])
+    rate = round(processed / max(time.monotonic() - started, 1e-6), 1)
+    await job.report_progress(step='done', processed=processed, reservations_per_second=rate, **progress)
+
 @router.post("/", response_model=Offer, status_code=status.HTTP_201_CREATED)
 def create_offer(offer_data: OfferCreate, admin: User = Depends(get_current_admin_user)):
     """Crée une nouvelle offre (Admin requis)."""
     response = supabase_client.table('offers').insert(offer_data.model_dump()).execute()
     if not response.data:
         raise HTTPException(status_code=500, detail="Erreur lors de la création de l'offre.")
+    write_tracker.mark(admin.id)
     return response.data[0]
 
 @router.put("/{offer_id}", response_model=Offer)
@@ -25,6 +347,7 @@ def update_offer(offer_id: uuid.UUID, offer_data: OfferUpdate, admin: User = Dep
     response = supabase_client.table('offers').update(update_dict).eq('id', str(offer_id)).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Offre non trouvée.")
+    write_tracker.mark(admin.id)
     return response.data[0]
 
 @router.delete("/{offer_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -33,4 +356,5 @@ def delete_offer(offer_id: uuid.UUID, admin: User = Depends(get_current_admin_us
     response = supabase_client.table('offers').delete().eq('id', str(offer_id)).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Offre non trouvée.")
+    write_tracker.mark(admin.id)
     return
@@ -0,0 +1,181 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Literal, Optional
+from datetime import datetime
+from decimal import Decimal
+import base64
+import binascii
+import json
+import uuid
+from api.v1.models.transaction_models import TransactionPage
+from api.v1.models.auth_models import User
+from api.v1.dependencies import get_current_admin_user
+from core.supabase_client import supabase_client
+from core.replicas import read_client
+from core.database import database
+from core.config import COUNT_ESTIMATE_THRESHOLD
+
+router = APIRouter()
+
+TransactionStatus = Literal['pending', 'completed', 'failed', 'refunded']
+TransactionSort = Literal['-created_at', 'created_at', '-amount', 'amount']
+
+# Mêmes embarquements que la page admin ; la clé secrète de la transaction n'est pas renvoyée
+TRANSACTION_COLUMNS = (
+    'id, user_id, amount, status, payment_method, created_at, '
+    'users(first_name, last_name, email), reservations(quantity, offers(name, type))'
+)
+TRANSACTIONS_SQL = """
+    SELECT t.id, t.user_id, t.amount, t.status, t.payment_method, t.created_at,
+           (SELECT json_build_object('first_name', u.first_name, 'last_name', u.last_name, 'email', u.email)
+            FROM public.users u WHERE u.id = t.user_id) AS users,
+           (SELECT coalesce(json_agg(json_build_object(
+                       'quantity', r.quantity,
+                       'offers', (SELECT json_build_object('name', o.name, 'type', o.type)
+                                  FROM public.offers o WHERE o.id = r.offer_id))), '[]')
+            FROM public.reservations r WHERE r.transaction_id = t.id) AS reservations
+    FROM public.transactions t
+    {where}
+    ORDER BY t.{column} {direction}, t.id {direction}
+    LIMIT {limit}
+"""
+COUNT_SQL = "SELECT count(*) FROM public.transactions t {where}"
+ESTIMATE_SQL = "EXPLAIN (FORMAT JSON) SELECT 1 FROM public.transactions t {where}"
+
+def encode_cursor(value, transaction_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([str(value), str(transaction_id)]).encode()).decode()
+
+def decode_cursor(cursor: str, column: str):
+    """(valeur de la colonne de tri, id) de la dernière transaction de la page précédente."""
+    try:
+        value, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(value) if column == 'created_at' else Decimal(value)
+        return value, uuid.UUID(transaction_id)
+    except (ValueError, TypeError, ArithmeticError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide.")
+
+def fetch_transactions_postgrest(admin_id, filters, column, desc, limit, after, count):
+    query = read_client(admin_id).table('transactions').select(TRANSACTION_COLUMNS, count=count)
+    if filters['status']:
+        query = query.in_('status', filters['status'])
+    if filters['user_id'] is not None:
+        query = query.eq('user_id', str(filters['user_id']))
+    if filters['since'] is not None:
+        query = query.gte('created_at', filters['since'].isoformat())
+    if filters['until'] is not None:
+        query = query.lt('created_at', filters['until'].isoformat())
+    if filters['min_amount'] is not None:
+        query = query.gte('amount', filters['min_amount'])
+    if filters['max_amount'] is not None:
+        query = query.lte('amount', filters['max_amount'])
+    if after is not None:
+        value, last_id = after
+        value = value.isoformat() if isinstance(value, datetime) else str(value)
+        op = 'lt' if desc else 'gt'
+        query = query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}.{last_id})')
+    response = query.order(column, desc=desc).order('id', desc=desc).limit(limit).execute()
+    return response.data, response.count
+
+def where_clause(filters, column, desc, after):
+    conditions, args = [], []
+
+    def arg(value):
+        args.append(value)
+        return f"${len(args)}"
+
+    if filters['status']:
+        conditions.append(f"t.status = ANY({arg(filters['status'])}::text[])")
+    if filters['user_id'] is not None:
+        conditions.append(f"t.user_id = {arg(filters['user_id'])}")
+    if filters['since'] is not None:
+        conditions.append(f"t.created_at >= {arg(filters['since'])}")
+    if filters['until'] is not None:
+        conditions.append(f"t.created_at < {arg(filters['until'])}")
+    if filters['min_amount'] is not None:
+        conditions.append(f"t.amount >= {arg(Decimal(str(filters['min_amount'])))}")
+    if filters['max_amount'] is not None:
+        conditions.append(f"t.amount <= {arg(Decimal(str(filters['max_amount'])))}")
+    # Le décompte porte sur les filtres seuls, sans le curseur
+    count_where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    count_args = list(args)
+    if after is not None:
+        value, last_id = after
+        conditions.append(f"(t.{column}, t.id) {'<' if desc else '>'} ({arg(value)}, {arg(last_id)})")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, args, count_where, count_args
+
+async def fetch_transactions_pg(filters, column, desc, limit, after, count):
+    where, args, count_where, count_args = where_clause(filters, column, desc, after)
+    query = TRANSACTIONS_SQL.format(where=where, column=column, direction='DESC' if desc else 'ASC', limit=int(limit))
+    # Sans RLS : l'endpoint est réservé aux admins, qui voient toutes les lignes, et le
+    # filtre de la politique (`is_admin() OR user_id = auth.uid()`) fausse les
+    # estimations du planificateur (plan de la page comme décompte estimé)
+    async with database.as_service(readonly=True) as connection:
+        rows = await connection.fetch(query, *args)
+        total = None
+        if count == 'estimated':
+            plan = await connection.fetchval(ESTIMATE_SQL.format(where=count_where), *count_args)
+            total = int(json.loads(plan)[0]['Plan']['Plan Rows'])
+        if count == 'exact' or (count == 'estimated' and total < COUNT_ESTIMATE_THRESHOLD):
+            total = await connection.fetchval(COUNT_SQL.format(where=count_where), *count_args)
+    items = []
+    for row in rows:
+        item = dict(row)
+        item['users'] = json.loads(item['users']) if item['users'] else None
+        item['reservations'] = json.loads(item['reservations'])
+        items.append(item)
+    return items, total
+
+@router.get("/", response_model=TransactionPage)
+def get_transactions(
+    status: Optional[List[TransactionStatus]] = Query(None, description="Un ou plusieurs statuts"),
+    user_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = Query(None, description="Transactions créées à partir de cette date (incluse)"),
+    until: Optional[datetime] = Query(None, description="Transactions créées avant cette date (exclue)"),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    sort: TransactionSort = Query('-created_at', description="Colonne de tri, préfixée par - pour l'ordre décroissant"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Curseur `next_cursor` de la page précédente"),
+    count: Optional[Literal['exact', 'estimated']] = Query(None, description="Renvoyer le nombre de transactions correspondant aux filtres"),
+    admin: User = Depends(get_current_admin_user),
+):
+    """
+    Liste les transactions, filtrées et triées côté serveur (Admin requis).
+
+    La pagination se fait par clé : `next_cursor` encode la valeur de tri et l'id
+    de la dernière transaction renvoyée, à repasser dans `cursor` pour la page
+    suivante. Les filtres et le tri doivent rester les mêmes d'une page à l'autre.
+
+    `count=estimated` renvoie l'estimation du planificateur (statistiques de la
+    table) au lieu d'un `count(*)` qui parcourt toutes les lignes correspondantes,
+    et ne compte exactement qu'en dessous d'un seuil (`COUNT_ESTIMATE_THRESHOLD`
+    en accès direct, `max_rows` de PostgREST sinon) ; `count=exact` force le
+    décompte.
+    """
+    if not supabase_client:
+        raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(status_code=400, detail="min_amount doit être inférieur ou égal à max_amount.")
+
+    column = sort.lstrip('-')
+    desc = sort.startswith('-')
+    after = decode_cursor(cursor, column) if cursor else None
+    filters = {
+        'status': status,
+        'user_id': user_id,
+        'since': since,
+        'until': until,
+        'min_amount': min_amount,
+        'max_amount': max_amount,
+    }
+    # Une ligne de plus que la page, pour savoir s'il en reste une suivante
+    if database.uses_pool("transactions"):
+        items, total = database.run(fetch_transactions_pg, filters, column, desc, limit + 1, after, count)
+    else:
+        items, total = fetch_transactions_postgrest(admin.id, filters, column, desc, limit + 1, after, count)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1][column], items[-1]['id'])
+    return {"items": items, "next_cursor": next_cursor, "count": total}
@@ -1,22 +1,120 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from supabase import AuthApiError, AuthRetryableError
+from typing import List, Literal, Optional
+import asyncio
+import logging
 import uuid
-from api.v1.models.auth_models import User, AdminUserUpdate
+from api.v1.models.auth_models import (
+    User,
+    AdminUserUpdate,
+    UserProvisioningRow,
+    UserProvisioningAccepted,
+    UserProvisioningStatus,
+    UserErasureAccepted,
+)
 from api.v1.dependencies import get_current_admin_user
-from core.supabase_client import supabase_client
+from core.supabase_client import supabase_client, service_client
+from core.claims import claims_revocations
+from core.replicas import read_client, write_tracker
+from core.database import database
+from core.jobs import job_queue
+from core.uploads import upload_format, upload_records, validation_message
+from core.config import USER_PROVISIONING_CONCURRENCY, USER_PROVISIONING_CHUNK_SIZE, USER_ERASURE_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+USER_PROVISIONING_JOB = 'users.provision'
+USER_ERASURE_JOB = 'users.erase'
+
+INSERT_PROVISIONING_ROWS_SQL = """
+    INSERT INTO public.user_provisioning (job_id, email, first_name, last_name)
+    SELECT $1, email, first_name, last_name
+    FROM unnest($2::text[], $3::text[], $4::text[]) AS row(email, first_name, last_name)
+"""
+# Reprise par clé : les lignes laissées en attente (erreur passagère) ne sont pas relues avant le prochain essai
+PENDING_PROVISIONING_ROWS_SQL = """
+    SELECT id, email, first_name, last_name, user_id
+    FROM public.user_provisioning
+    WHERE job_id = $1 AND status = 'pending' AND id > $2
+    ORDER BY id
+    LIMIT $3
+"""
+# Profils des comptes créés, en une instruction par lot. Le trigger de auth.users les
+# crée déjà avec le compte ; l'insertion ne complète que ceux qui manqueraient. Renvoie
+# les comptes qui ont un profil
+INSERT_PROFILES_SQL = """
+    WITH input AS (
+        SELECT * FROM unnest($1::uuid[], $2::text[], $3::text[], $4::text[]) AS p(id, email, first_name, last_name)
+    ), inserted AS (
+        INSERT INTO public.users (id, user_key, email, first_name, last_name)
+        SELECT id, gen_random_uuid(), email, first_name, last_name FROM input
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    )
+    SELECT id FROM inserted
+    UNION
+    SELECT u.id FROM public.users u WHERE u.id IN (SELECT id FROM input)
+"""
+# Un e-mail déjà inscrit est rattaché à son profil, s'il en a un
+UPDATE_PROVISIONING_ROWS_SQL = """
+    UPDATE public.user_provisioning p
+    SET status = r.status,
+        error = r.error,
+        user_id = CASE WHEN r.status = 'existing'
+                       THEN (SELECT u.id FROM public.users u WHERE u.email = p.email)
+                       ELSE p.user_id END,
+        updated_at = now()
+    FROM unnest($1::uuid[], $2::text[], $3::text[]) AS r(id, status, error)
+    WHERE p.id = r.id
+"""
+PROVISIONING_COUNTS_SQL = """
+    SELECT status, count(*) AS rows FROM public.user_provisioning WHERE job_id = $1 GROUP BY status
+"""
+# Les lignes refusées sont renvoyées dans la limite de 1000 ; les décomptes portent sur toutes
+PROVISIONING_FAILURES_SQL = """
+    SELECT email, error FROM public.user_provisioning
+    WHERE job_id = $1 AND status = 'failed'
+    ORDER BY id
+    LIMIT 1000
+"""
+PROVISIONING_JOB_SQL = "SELECT status, last_error FROM public.jobs WHERE id = $1 AND kind = $2"
+
+# Les jetons déjà émis sont refusés dès l'inscription de la suppression (toutes instances)
+REVOKE_USER_CLAIMS_SQL = "UPDATE public.users SET claims_updated_at = now() WHERE id = $1 RETURNING id"
+# Réservations de l'utilisateur par lots, parcourues par clé sur (user_id, id)
+RESERVATIONS_CHUNK_SQL = """
+    SELECT id FROM public.reservations WHERE user_id = $1 AND id > $2 ORDER BY id LIMIT $3
+"""
+DELETE_TICKETS_SQL = "DELETE FROM public.e_tickets WHERE reservation_id = ANY($1::uuid[])"
+DELETE_RESERVATIONS_SQL = "DELETE FROM public.reservations WHERE id = ANY($1::uuid[])"
+DELETE_TRANSACTIONS_CHUNK_SQL = """
+    DELETE FROM public.transactions
+    WHERE id IN (SELECT id FROM public.transactions WHERE user_id = $1 LIMIT $2)
+"""
+DELETE_PROFILE_SQL = "DELETE FROM public.users WHERE id = $1"
+# Le profil reste la cible des réservations et transactions conservées, sans donnée personnelle.
+# La clé des e-tickets est renouvelée : les QR codes déjà émis ne sont plus valides
+ANONYMIZE_PROFILE_SQL = """
+    UPDATE public.users
+    SET email = 'anonyme-' || id || '@example.com', first_name = 'Anonyme', last_name = '',
+        user_key = gen_random_uuid(), is_admin = false, mfa_enabled = false, mfa_secret = NULL
+    WHERE id = $1
+"""
+
 @router.get("/", response_model=List[User])
 def get_all_users(admin: User = Depends(get_current_admin_user)):
     """Récupère la liste de tous les utilisateurs (Admin requis)."""
-    response = supabase_client.table('users').select('*').execute()
+    response = read_client(admin.id).table('users').select('*').execute()
     return response.data
 
 @router.get("/{user_id}", response_model=User)
 def get_user_by_id(user_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
     """Récupère un utilisateur par son ID (Admin requis)."""
-    response = supabase_client.table('users').select('*').eq('id', str(user_id)).single().execute()
+    response = read_client(admin.id).table('users').select('*').eq('id', str(user_id)).single().execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
     return response.data
@@ -31,12 +129,253 @@ def update_user_by_admin(user_id: uuid.UUID, user_data: AdminUserUpdate, admin:
     response = supabase_client.table('users').update(update_dict).eq('id', str(user_id)).execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
+    # Les jetons déjà émis portent l'ancien rôle : ils sont refusés jusqu'au rafraîchissement de la session
+    claims_revocations.mark(user_id)
+    write_tracker.mark(admin.id)
+    write_tracker.mark(user_id)
     return response.data[0]
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_by_admin(user_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
-    """Supprime un utilisateur (Admin requis)."""
-    response = supabase_client.table('users').delete().eq('id', str(user_id)).execute()
-    if not response.data:
+async def enqueue_erasure(user_id, mode, admin_id):
+    async with database.as_service() as connection:
+        if await connection.fetchval(REVOKE_USER_CLAIMS_SQL, user_id) is None:
+            return None
+        [job_id] = await job_queue.enqueue_many(
+            connection, USER_ERASURE_JOB, [{'user_id': user_id, 'mode': mode}], [admin_id]
+        )
+    return job_id
+
+@router.delete("/{user_id}", response_model=UserErasureAccepted, status_code=status.HTTP_202_ACCEPTED)
+def delete_user_by_admin(
+    user_id: uuid.UUID,
+    mode: Literal['delete', 'anonymize'] = 'delete',
+    admin: User = Depends(get_current_admin_user),
+):
+    """
+    Supprime un utilisateur en tâche de fond (Admin requis).
+
+    Le compte Auth et les e-tickets sont supprimés dans tous les cas. Avec
+    `mode=delete`, les réservations, les transactions puis le profil le sont
+    aussi ; avec `mode=anonymize`, réservations et transactions sont conservées
+    (comptabilité, statistiques de vente) et le profil est vidé de ses données
+    personnelles. Les lignes sont traitées par lots de `USER_ERASURE_CHUNK_SIZE`,
+    chacun dans sa propre transaction : un gros compte ne verrouille pas les
+    tables. L'avancement se suit sur `GET /admin/jobs/{job_id}`.
+    """
+    if database.pool is None or not service_client:
+        raise HTTPException(status_code=503, detail="La suppression nécessite le pool Postgres et le client service_role.")
+    job_id = database.run(enqueue_erasure, user_id, mode, admin.id)
+    if job_id is None:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
-    return
+    # Les jetons de l'utilisateur sont refusés tout de suite sur cette instance
+    claims_revocations.mark(user_id)
+    write_tracker.mark(admin.id)
+    return {'job_id': job_id, 'user_id': user_id, 'mode': mode}
+
+@job_queue.handler(USER_ERASURE_JOB)
+async def erase_user(job):
+    """
+    Supprime ou anonymise un utilisateur par lots. Chaque lot est idempotent :
+    une tâche interrompue reprend là où elle s'était arrêtée, les lignes déjà
+    supprimées n'étant plus trouvées.
+    """
+    if not service_client:
+        raise RuntimeError("Le client service_role n'est pas initialisé.")
+    # Rien n'est supprimé pour une tâche qui ne vient pas d'un administrateur
+    await job.require_admin()
+    user_id = uuid.UUID(job.payload['user_id'])
+    delete = job.payload['mode'] == 'delete'
+
+    # Le compte Auth d'abord : plus de connexion ni de nouvelle commande pendant le nettoyage
+    try:
+        await run_in_threadpool(service_client.auth.admin.delete_user, str(user_id))
+    except AuthApiError as e:
+        if e.status != 404:
+            raise
+
+    deleted = {'tickets': 0, 'reservations': 0, 'transactions': 0}
+    after = uuid.UUID(int=0)
+    while True:
+        async with database.as_service() as connection:
+            ids = [row['id'] for row in await connection.fetch(
+                RESERVATIONS_CHUNK_SQL, user_id, after, USER_ERASURE_CHUNK_SIZE
+            )]
+            if not ids:
+                break
+            deleted['tickets'] += int((await connection.execute(DELETE_TICKETS_SQL, ids)).split()[-1])
+            if delete:
+                deleted['reservations'] += int((await connection.execute(DELETE_RESERVATIONS_SQL, ids)).split()[-1])
+        after = ids[-1]
+        await job.report_progress(step='reservations', **deleted)
+
+    while delete:
+        async with database.as_service() as connection:
+            count = int((await connection.execute(DELETE_TRANSACTIONS_CHUNK_SQL, user_id, USER_ERASURE_CHUNK_SIZE)).split()[-1])
+        if not count:
+            break
+        deleted['transactions'] += count
+        await job.report_progress(step='transactions', **deleted)
+
+    async with database.as_service() as connection:
+        await connection.execute(DELETE_PROFILE_SQL if delete else ANONYMIZE_PROFILE_SQL, user_id)
+    await job.report_progress(step='done', **deleted)
+
+@router.post("/provisioning", response_model=UserProvisioningAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def provision_users(
+    request: Request,
+    format: Optional[Literal['csv', 'ndjson']] = None,
+    admin: User = Depends(get_current_admin_user),
+):
+    """
+    Crée des comptes en masse (personnel, bénévoles, délégations) à partir d'un
+    fichier CSV ou NDJSON aux champs `email`, `first_name`, `last_name` (Admin requis).
+
+    Les lignes valides sont enregistrées et confiées à une tâche de fond, suivie par
+    `GET /admin/users/provisioning/{job_id}`. Les comptes sont créés avec leur
+    e-mail confirmé et sans mot de passe : chacun définit le sien par la
+    récupération de mot de passe.
+    """
+    if database.pool is None or not service_client:
+        raise HTTPException(status_code=503, detail="La création de comptes en masse nécessite le pool Postgres et le client service_role.")
+    format = upload_format(request, format)
+
+    rows = []
+    errors = []
+    seen = set()
+    row = 0
+    async for record in upload_records(request, format):
+        row += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            account = UserProvisioningRow.model_validate(record)
+        except (ValidationError, ValueError) as e:
+            email = record.get('email') if isinstance(record, dict) else None
+            errors.append({'row': row, 'email': email, 'error': validation_message(e)})
+            continue
+        # GoTrue enregistre les e-mails en minuscules
+        email = account.email.lower()
+        if email in seen:
+            errors.append({'row': row, 'email': email, 'error': "E-mail en double dans le fichier."})
+            continue
+        seen.add(email)
+        rows.append((email, account.first_name.strip(), account.last_name.strip()))
+    if not rows:
+        detail = f"Aucune ligne valide ({len(errors)} rejetée(s)"
+        if errors:
+            detail += f", ligne {errors[0]['row']} : {errors[0]['error']}"
+        raise HTTPException(status_code=400, detail=detail + ").")
+
+    async with database.as_service() as connection:
+        [job_id] = await job_queue.enqueue_many(connection, USER_PROVISIONING_JOB, [{}], [admin.id])
+        await connection.execute(INSERT_PROVISIONING_ROWS_SQL, job_id, *(list(column) for column in zip(*rows)))
+    return {'job_id': job_id, 'accepted': len(rows), 'errors': errors}
+
+async def fetch_provisioning_status(job_id):
+    async with database.as_service(readonly=True) as connection:
+        job = await connection.fetchrow(PROVISIONING_JOB_SQL, job_id, USER_PROVISIONING_JOB)
+        if job is None:
+            return None
+        counts = await connection.fetch(PROVISIONING_COUNTS_SQL, job_id)
+        failures = await connection.fetch(PROVISIONING_FAILURES_SQL, job_id)
+    return {
+        'job_id': job_id,
+        'status': job['status'],
+        'last_error': job['last_error'],
+        **{row['status']: row['rows'] for row in counts},
+        'failures': [dict(row) for row in failures],
+    }
+
+@router.get("/provisioning/{job_id}", response_model=UserProvisioningStatus)
+def get_provisioning_status(job_id: uuid.UUID, admin: User = Depends(get_current_admin_user)):
+    """Avancement d'une création de comptes en masse et lignes refusées (Admin requis)."""
+    if database.pool is None:
+        raise HTTPException(status_code=503, detail="Le pool Postgres n'est pas initialisé.")
+    result = database.run(fetch_provisioning_status, job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Création de comptes non trouvée.")
+    return result
+
+async def create_account(row, semaphore):
+    """
+    Crée le compte Auth d'une ligne sous l'identifiant réservé. Renvoie
+    (statut, erreur), ou None si l'erreur est passagère et la ligne à réessayer.
+    """
+    attributes = {
+        'id': str(row['user_id']),
+        'email': row['email'],
+        'email_confirm': True,
+        'user_metadata': {'first_name': row['first_name'], 'last_name': row['last_name']},
+    }
+    async with semaphore:
+        try:
+            await run_in_threadpool(service_client.auth.admin.create_user, attributes)
+            return 'created', None
+        except AuthRetryableError:
+            return None
+        except AuthApiError as e:
+            if e.status == 429 or e.status >= 500:
+                return None
+            if e.code not in ('email_exists', 'user_already_exists'):
+                return 'failed', e.message
+        # E-mail déjà inscrit : compte créé par un essai interrompu de cette tâche, ou compte préexistant
+        try:
+            response = await run_in_threadpool(service_client.auth.admin.get_user_by_id, str(row['user_id']))
+        except AuthApiError as e:
+            if e.status == 404:
+                return 'existing', None
+            return None if e.status == 429 or e.status >= 500 else ('failed', e.message)
+        except AuthRetryableError:
+            return None
+        return ('created', None) if response.user.email == row['email'] else ('existing', None)
+
+@job_queue.handler(USER_PROVISIONING_JOB)
+async def run_provisioning(job):
+    """
+    Traite les lignes en attente d'une création de comptes en masse, par lots de
+    `USER_PROVISIONING_CHUNK_SIZE` : comptes Auth créés en parallèle (au plus
+    `USER_PROVISIONING_CONCURRENCY` appels simultanés), profils écrits en une
+    instruction, puis avancement publié. Les lignes en erreur passagère (limitation
+    de débit, indisponibilité) restent en attente et la tâche échoue pour être
+    réessayée plus tard ; les lignes déjà traitées ne sont pas refaites.
+    """
+    if not service_client:
+        raise RuntimeError("Le client service_role n'est pas initialisé.")
+    semaphore = asyncio.Semaphore(USER_PROVISIONING_CONCURRENCY)
+    after = uuid.UUID(int=0)
+    deferred = 0
+    while True:
+        async with database.as_service(readonly=True) as connection:
+            rows = await connection.fetch(PENDING_PROVISIONING_ROWS_SQL, job.id, after, USER_PROVISIONING_CHUNK_SIZE)
+        if not rows:
+            break
+        after = rows[-1]['id']
+        outcomes = await asyncio.gather(*(create_account(row, semaphore) for row in rows))
+
+        created = [row for row, outcome in zip(rows, outcomes) if outcome and outcome[0] == 'created']
+        results = {row['id']: outcome for row, outcome in zip(rows, outcomes) if outcome is not None}
+        deferred += len(rows) - len(results)
+        async with database.as_service() as connection:
+            if created:
+                with_profile = {
+                    record['id'] for record in await connection.fetch(
+                        INSERT_PROFILES_SQL,
+                        *(list(column) for column in zip(*(
+                            (row['user_id'], row['email'], row['first_name'], row['last_name']) for row in created
+                        ))),
+                    )
+                }
+                for row in created:
+                    if row['user_id'] not in with_profile:
+                        results[row['id']] = ('failed', "Compte créé, mais l'e-mail est déjà utilisé par un autre profil.")
+            if results:
+                await connection.execute(
+                    UPDATE_PROVISIONING_ROWS_SQL,
+                    list(results),
+                    [status for status, _ in results.values()],
+                    [error for _, error in results.values()],
+                )
+            counts = {row['status']: row['rows'] for row in await connection.fetch(PROVISIONING_COUNTS_SQL, job.id)}
+        await job.report_progress(**{key: counts.get(key, 0) for key in ('pending', 'created', 'existing', 'failed')})
+
+    if deferred:
+        raise RuntimeError(f"{deferred} compte(s) non créé(s) après une erreur passagère de l'API Auth, à réessayer.")
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
-from ..models.auth_models import UserCreate, UserLogin, User, Token, LoginResponse
-from core.supabase_client import supabase_client
+from supabase import AuthApiError
+from ..models.auth_models import UserCreate, UserLogin, User, Token, LoginResponse, RefreshRequest
+from core.supabase_client import supabase_client, service_client
 from ..dependencies import get_current_user
+from core.rate_limit import rate_limit
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Codes d'erreur de l'API Auth pour un e-mail déjà inscrit
+EMAIL_TAKEN_ERRORS = {"user_already_exists", "email_exists"}
 
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
 def register_user(user_in: UserCreate):
@@ -12,36 +19,79 @@ def register_user(user_in: UserCreate):
         raise HTTPException(status_code=503, detail="Supabase client not initialized")
     
     try:
-        # Créer l'utilisateur dans Supabase Auth
+        # Créer l'utilisateur dans Supabase Auth. Le profil 'users' est créé par le
+        # trigger de auth.users, dans la même transaction, à partir de ces métadonnées :
+        # si le profil ne peut pas être créé (e-mail déjà pris), l'inscription échoue
         auth_response = supabase_client.auth.sign_up({
             "email": user_in.email,
-            "password": user_in.password
+            "password": user_in.password,
+            "options": {
+                "data": {
+                    "first_name": user_in.first_name,
+                    "last_name": user_in.last_name
+                }
+            }
         })
-        
-        if not auth_response.user:
-            raise HTTPException(status_code=400, detail="Could not register user")
+    except AuthApiError as e:
+        if e.code in EMAIL_TAKEN_ERRORS:
+            raise HTTPException(status_code=409, detail="An account already exists for this email")
+        if e.status >= 500:
+            # L'API Auth masque les erreurs du trigger de profil sous un même message : le
+            # conflit d'e-mail (`profile_email_taken`) est confirmé en relisant le profil
+            if profile_email_taken(user_in.email):
+                raise HTTPException(status_code=409, detail="An account already exists for this email")
+            logger.error("Inscription refusée par l'API Auth (%s) : %s", e.code, e.message)
+            raise HTTPException(status_code=500, detail="Could not register user")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Ajouter les informations supplémentaires dans la table 'users'
-        profile_data = {
-            "id": auth_response.user.id,
-            "user_key": auth_response.user.id,
-            "email": user_in.email,
-            "first_name": user_in.first_name,
-            "last_name": user_in.last_name
-        }
-        profile_response = supabase_client.table('users').insert(profile_data).execute()
+    user = auth_response.user
+    if not user:
+        raise HTTPException(status_code=400, detail="Could not register user")
+    # Avec la confirmation par e-mail, un e-mail déjà inscrit renvoie un utilisateur
+    # factice, sans identité, au lieu d'une erreur
+    if user.identities is not None and not user.identities:
+        raise HTTPException(status_code=409, detail="An account already exists for this email")
 
-        if not profile_response.data:
-             raise HTTPException(status_code=500, detail="Could not create user profile")
+    return stored_profile(user, auth_response.session)
 
-        return profile_response.data[0]
+def profile_email_taken(email):
+    """Indique si un profil porte déjà cet e-mail (False sans client service_role)."""
+    if not service_client:
+        return False
+    try:
+        return bool(service_client.table('users').select('id').eq('email', email.lower()).limit(1).execute().data)
+    except Exception:
+        logger.exception("Profil non relu pour l'e-mail %s", email)
+        return False
 
-    except Exception as e:
-        # Simplification de la gestion d'erreur pour l'exemple
-        # Dans un cas réel, il faudrait gérer les différents types d'erreurs (ex: email déjà pris)
-        raise HTTPException(status_code=400, detail=str(e))
+def stored_profile(user, session):
+    """
+    Profil créé par le trigger, relu en base : avec le client service_role, ou
+    avec le jeton de la session ouverte par l'inscription. Sans l'un ni l'autre
+    (confirmation par e-mail, pas de clé service_role), le profil est reconstruit
+    à partir du compte Auth enregistré, dont le trigger l'a tiré.
+    """
+    if service_client:
+        client = service_client
+    elif session:
+        client = supabase_client.postgrest.auth(session.access_token)
+    else:
+        metadata = user.user_metadata or {}
+        return {
+            "id": user.id,
+            "email": user.email,
+            "first_name": metadata.get("first_name", ""),
+            "last_name": metadata.get("last_name", ""),
+            "is_admin": False,
+        }
+    profile = client.table('users').select('id, email, first_name, last_name, is_admin').eq('id', user.id).execute().data
+    if not profile:
+        raise HTTPException(status_code=500, detail="User profile was not created")
+    return profile[0]
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(rate_limit("login"))])
 def login_for_access_token(form_data: UserLogin):
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Supabase client not initialized")
@@ -66,12 +116,41 @@ def login_for_access_token(form_data: UserLogin):
         # 3. Construire et retourner la réponse complète
         return {
             "access_token": auth_response.session.access_token,
+            "refresh_token": auth_response.session.refresh_token,
             "user_profile": profile_response.data
         }
 
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {e}")
 
+@router.post("/refresh", response_model=LoginResponse)
+def refresh_access_token(refresh_request: RefreshRequest):
+    """
+    Échange un refresh token contre un nouveau jeton d'accès, qui porte les claims
+    à jour (rôle, nom). À appeler lorsqu'une requête est refusée avec
+    `error_description="claims_outdated"`.
+    """
+    if not supabase_client:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
+
+    try:
+        auth_response = supabase_client.auth.refresh_session(refresh_request.refresh_token)
+        if not auth_response.session or not auth_response.user:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+        profile_response = supabase_client.table('users').select("*").eq('id', auth_response.user.id).single().execute()
+        if not profile_response.data:
+            raise HTTPException(status_code=404, detail="User profile not found.")
+
+        return {
+            "access_token": auth_response.session.access_token,
+            "refresh_token": auth_response.session.refresh_token,
+            "user_profile": profile_response.data
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Token refresh failed: {e}")
+
 @router.get("/me", response_model=User)
 def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
@@ -1,21 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import TypeAdapter
+from typing import List, Optional
+import asyncio
 import uuid
 import logging
+from collections import Counter
 
 from ..models.ticketing_models import CheckoutRequest, Reservation
 from ..models.auth_models import User
-from ..dependencies import get_current_user
+from ..dependencies import get_current_user, require_queue_admission
 from core.supabase_client import supabase_client
 from core.security import oauth2_scheme
+from core.idempotency import run_idempotent, request_fingerprint
+from core.rate_limit import rate_limit
+from core.database import database
+from core.replicas import write_tracker
+from core.group_commit import GroupCommit
+from core.ids import uuid7
+from core.jobs import job_queue, PermanentJobError
+from core.config import CHECKOUT_BATCHING_ENABLED, CHECKOUT_BATCH_MAX_DELAY_MS, CHECKOUT_BATCH_MAX_SIZE
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/", response_model=List[Reservation], status_code=201)
-def process_checkout(checkout_request: CheckoutRequest, current_user: User = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
+# Travail post-checkout, traité en arrière-plan par la file de tâches
+CHECKOUT_COMPLETED_JOB = "checkout.completed"
+
+# Les offres annulées ne sont plus vendues : elles sont traitées comme invalides
+CHECKOUT_OFFERS_SQL = "SELECT id, price FROM public.offers WHERE id = ANY($1::uuid[]) AND cancelled_at IS NULL"
+INSERT_TRANSACTION_SQL = """
+    INSERT INTO public.transactions (user_id, amount, status, transaction_key, payment_method)
+    VALUES ($1, $2, 'completed', $3, 'card')
+    RETURNING id
+"""
+INSERT_RESERVATIONS_SQL = """
+    INSERT INTO public.reservations (user_id, offer_id, quantity, transaction_id)
+    SELECT $1, offer_id, quantity, $4
+    FROM unnest($2::uuid[], $3::int[]) AS item(offer_id, quantity)
+    RETURNING *
+"""
+INSERT_E_TICKETS_SQL = """
+    INSERT INTO public.e_tickets (reservation_id)
+    SELECT unnest($1::uuid[])
+"""
+# Lots de commandes : les identifiants sont générés côté backend pour relier les lignes
+INSERT_TRANSACTIONS_BATCH_SQL = """
+    INSERT INTO public.transactions (id, user_id, amount, status, transaction_key, payment_method)
+    SELECT id, user_id, amount, 'completed', transaction_key, 'card'
+    FROM unnest($1::uuid[], $2::uuid[], $3::numeric[], $4::uuid[]) AS t(id, user_id, amount, transaction_key)
+"""
+INSERT_RESERVATIONS_BATCH_SQL = """
+    INSERT INTO public.reservations (id, user_id, offer_id, quantity, transaction_id)
+    SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::uuid[], $4::int[], $5::uuid[])
+    RETURNING *
+"""
+ORDER_CONFIRMATION_SQL = """
+    SELECT t.id, t.amount, u.email,
+           (SELECT count(*) FROM public.reservations r JOIN public.e_tickets e ON e.reservation_id = r.id
+            WHERE r.transaction_id = t.id) AS tickets
+    FROM public.transactions t JOIN public.users u ON u.id = t.user_id
+    WHERE t.id = $1 AND t.user_id = $2
+"""
+
+def compute_total_amount(items, offers_map):
+    """Calcule le montant total d'une commande à partir des prix des offres."""
+    return sum(offers_map[str(item.offer_id)] * item.quantity for item in items)
+
+def build_e_tickets(created_reservations, items):
+    """
+    Construit les lignes e-billets à insérer pour chaque réservation créée.
+    Le jeton du QR code (`qr_token`) est généré par la base.
+    """
+    e_tickets_to_create = []
+    for reservation in created_reservations:
+        # Trouver la quantité correspondante dans la requête initiale
+        quantity = next((item.quantity for item in items if str(item.offer_id) == str(reservation['offer_id'])), 0)
+        for _ in range(quantity):
+            e_tickets_to_create.append({'reservation_id': reservation['id']})
+    return e_tickets_to_create
+
+reservations_adapter = TypeAdapter(List[Reservation])
+
+@router.post("/", response_model=List[Reservation], status_code=201, dependencies=[Depends(rate_limit("checkout")), Depends(require_queue_admission)])
+def process_checkout(
+    checkout_request: CheckoutRequest,
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
     """
     Gère le processus de paiement de manière atomique.
-    Crée la transaction, la réservation et les e-billets.
+    Crée la transaction, la réservation et les e-billets ; le reste du travail
+    (confirmation de commande) est inscrit dans la file de tâches.
+
+    Avec un en-tête `Idempotency-Key`, les nouvelles tentatives d'une même
+    commande renvoient le résultat de la première au lieu d'en créer une autre.
     """
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
@@ -24,18 +103,135 @@ def process_checkout(checkout_request: CheckoutRequest, current_user: User = Dep
     # C'est cette instance qui doit être utilisée pour toutes les opérations d'écriture.
     authenticated_client = supabase_client.postgrest.auth(token)
 
-    user_id = current_user.id
+    if idempotency_key is None:
+        return create_order(checkout_request, current_user.id, authenticated_client)
+
+    # On enregistre la réponse sous sa forme finale (filtrée par le modèle) pour la rejouer à l'identique
+    def response_body(created_reservations):
+        return reservations_adapter.dump_python(
+            reservations_adapter.validate_python(created_reservations), mode="json"
+        )
+
+    # La clé de la transaction est celle de la clé d'idempotence : une nouvelle
+    # tentative ne peut pas écrire une seconde commande
+    def handler(order_key):
+        return response_body(create_order(checkout_request, current_user.id, authenticated_client, order_key))
+
+    def recover(order_key):
+        created_reservations = resume_order(checkout_request, current_user.id, authenticated_client, order_key)
+        return None if created_reservations is None else response_body(created_reservations)
+
+    return run_idempotent(
+        authenticated_client,
+        idempotency_key,
+        request_fingerprint(checkout_request.model_dump(mode="json")),
+        handler,
+        status_code=201,
+        recover=recover,
+    )
+
+def resume_order(checkout_request: CheckoutRequest, user_id, authenticated_client, transaction_key):
+    """
+    Réservations de la commande écrite avec cette clé de transaction, ou None si
+    sa transaction n'a pas été écrite.
+
+    Sur le chemin PostgREST, la transaction, les réservations et les e-billets
+    sont écrits par trois requêtes : une tentative interrompue a pu laisser la
+    transaction sans réservations, ou des réservations sans tous leurs e-billets.
+    Les lignes manquantes sont écrites ici, pour que la réponse enregistrée
+    décrive une commande complète.
+    """
+    try:
+        transactions = authenticated_client.table('transactions').select('id').eq(
+            'transaction_key', str(transaction_key)
+        ).execute().data
+        if not transactions:
+            return None
+        transaction_id = transactions[0]['id']
+
+        created_reservations = authenticated_client.table('reservations').select('*').eq(
+            'transaction_id', transaction_id
+        ).order('id').execute().data
+        resumed = not created_reservations
+        if resumed:
+            created_reservations = insert_reservations(checkout_request, user_id, authenticated_client, transaction_id)
+
+        tickets = authenticated_client.table('e_tickets').select('reservation_id').in_(
+            'reservation_id', [reservation['id'] for reservation in created_reservations]
+        ).execute().data
+        written = Counter(str(ticket['reservation_id']) for ticket in tickets)
+        e_tickets_to_create = [
+            {'reservation_id': reservation['id']}
+            for reservation in created_reservations
+            for _ in range(reservation['quantity'] - written[str(reservation['id'])])
+        ]
+        if e_tickets_to_create:
+            authenticated_client.table('e_tickets').insert(e_tickets_to_create).execute()
+            resumed = True
+    except Exception as e:
+        # La clé n'est pas enregistrée : la tentative suivante reprendra la commande
+        raise HTTPException(status_code=500, detail=f"Le processus de paiement a échoué: {str(e)}")
+
+    if resumed:
+        logger.warning("Commande %s complétée à la reprise de sa clé d'idempotence", transaction_id)
+        enqueue_checkout_completed(authenticated_client, transaction_id)
+        write_tracker.mark(user_id)
+    return created_reservations
+
+def insert_reservations(checkout_request: CheckoutRequest, user_id, authenticated_client, transaction_id):
+    """Réservations d'une commande, écrites par PostgREST pour sa transaction."""
+    reservations_to_create = [
+        {
+            'user_id': str(user_id),
+            'offer_id': str(item.offer_id),
+            'quantity': item.quantity,
+            'transaction_id': str(transaction_id) # str() pour la sécurité, bien que déjà une chaîne
+        }
+        for item in checkout_request.items
+    ]
+    return authenticated_client.table('reservations').insert(reservations_to_create).execute().data
 
+def enqueue_checkout_completed(authenticated_client, transaction_id):
+    """
+    Confie le reste (confirmation...) à la file de tâches. La commande est déjà
+    écrite : un échec ici ne doit pas la faire rejouer par le client. Sans pool
+    Postgres, aucun worker ne tourne (voir JobQueue.start) : rien n'est inscrit,
+    plutôt que des tâches qui resteraient `pending`.
+    """
+    if database.pool is None:
+        return
     try:
+        authenticated_client.rpc('enqueue_job', {
+            'p_kind': CHECKOUT_COMPLETED_JOB,
+            'p_payload': {'transaction_id': str(transaction_id)},
+        }).execute()
+    except Exception:
+        logger.exception("Tâche post-checkout non inscrite pour la transaction %s", transaction_id)
+
+def create_order(checkout_request: CheckoutRequest, user_id, authenticated_client, transaction_key=None):
+    """
+    Crée la transaction, les réservations et les e-billets d'une commande.
+    `transaction_key` (unique) est tiré au hasard s'il n'est pas fourni.
+    """
+    transaction_key = transaction_key or uuid.uuid4()
+    try:
+        if database.uses_pool("checkout"):
+            if checkout_batcher is not None:
+                created_reservations = database.run(checkout_batcher.submit, (checkout_request, user_id, transaction_key))
+                # Le lot a pu être écrit depuis la requête d'un autre acheteur
+                write_tracker.propagate(user_id)
+                return created_reservations
+            return database.run(create_order_pg, checkout_request, user_id, transaction_key)
+
         # 1. Valider les offres et calculer le montant total
         offer_ids = [item.offer_id for item in checkout_request.items]
-        offers_response = supabase_client.table('offers').select('id, price').in_('id', offer_ids).execute()
+        offers_response = supabase_client.table('offers').select('id, price').in_('id', offer_ids).is_('cancelled_at', 'null').execute()
         
         if len(offers_response.data) != len(offer_ids):
             raise HTTPException(status_code=404, detail="Une ou plusieurs offres sont invalides.")
 
         offers_map = {str(offer['id']): offer['price'] for offer in offers_response.data}
-        total_amount = sum(offers_map[str(item.offer_id)] * item.quantity for item in checkout_request.items)
+        total_amount = compute_total_amount(checkout_request.items, offers_map)
 
         # 2. Créer la transaction avec le client authentifié
         # 2. Créer la transaction avec le client authentifié (en s'assurant que les UUID et Decimal sont sérialisables)
@@ -43,38 +239,27 @@ def process_checkout(checkout_request: CheckoutRequest, current_user: User = Dep
             'user_id': str(user_id), 
             'amount': float(total_amount), 
             'status': 'completed',
-            'transaction_key': str(uuid.uuid4()),
+            # Clé secrète : elle reste entièrement aléatoire (v4), contrairement aux identifiants v7
+            'transaction_key': str(transaction_key),
             'payment_method': 'card' # Ajout d'une valeur par défaut
         }
         transaction_response = authenticated_client.table('transactions').insert(transaction_data).execute()
         transaction_id = transaction_response.data[0]['id']
 
         # 3. Créer les réservations avec le client authentifié
-        reservations_to_create = [
-            {
-                'user_id': str(user_id),
-                'offer_id': str(item.offer_id),
-                'quantity': item.quantity,
-                'transaction_id': str(transaction_id) # str() pour la sécurité, bien que déjà une chaîne
-            }
-            for item in checkout_request.items
-        ]
-        reservations_response = authenticated_client.table('reservations').insert(reservations_to_create).execute()
-        created_reservations = reservations_response.data
+        created_reservations = insert_reservations(checkout_request, user_id, authenticated_client, transaction_id)
 
         # 4. Créer les e-billets pour chaque réservation avec le client authentifié
-        e_tickets_to_create = []
-        for reservation in created_reservations:
-            # Trouver la quantité correspondante dans la requête initiale
-            quantity = next((item.quantity for item in checkout_request.items if str(item.offer_id) == str(reservation['offer_id'])), 0)
-            for _ in range(quantity):
-                e_tickets_to_create.append({
-                    'reservation_id': reservation['id'],
-                    'qr_code_url': f"https://api.qrserver.com/v1/create-qr-code/?data={uuid.uuid4()}&size=100x100"
-                })
+        e_tickets_to_create = build_e_tickets(created_reservations, checkout_request.items)
         if e_tickets_to_create:
             authenticated_client.table('e_tickets').insert(e_tickets_to_create).execute()
 
+        # 5. Le reste (confirmation...) est confié à la file de tâches
+        enqueue_checkout_completed(authenticated_client, transaction_id)
+
+        # Les lectures suivantes de l'utilisateur (historique, billets) iront sur le primaire
+        write_tracker.mark(user_id)
+
         # Convertir les UUID en chaînes pour la sérialisation JSON
         for r in created_reservations:
             for key, value in r.items():
@@ -83,8 +268,143 @@ def process_checkout(checkout_request: CheckoutRequest, current_user: User = Dep
 
         return created_reservations
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Pas besoin de logger l'exception en détail ici, FastAPI le fait déjà.
         # logging.exception("Erreur détaillée lors du processus de paiement :")
         # Idéalement, une vraie transaction de base de données (RPC) gérerait le rollback.
         raise HTTPException(status_code=500, detail=f"Le processus de paiement a échoué: {str(e)}")
+
+async def create_order_pg(checkout_request: CheckoutRequest, user_id, transaction_key):
+    """
+    Même commande que `create_order`, passée par le pool asyncpg dans une seule
+    transaction Postgres : en cas d'erreur, rien n'est écrit.
+    """
+    items = checkout_request.items
+    async with database.as_user(user_id) as connection:
+        offers = await connection.fetch(CHECKOUT_OFFERS_SQL, [item.offer_id for item in items])
+        if len(offers) != len(items):
+            raise HTTPException(status_code=404, detail="Une ou plusieurs offres sont invalides.")
+
+        offers_map = {str(offer['id']): offer['price'] for offer in offers}
+        total_amount = compute_total_amount(items, offers_map)
+
+        transaction_id = await connection.fetchval(INSERT_TRANSACTION_SQL, user_id, total_amount, transaction_key)
+        rows = await connection.fetch(
+            INSERT_RESERVATIONS_SQL,
+            user_id,
+            [item.offer_id for item in items],
+            [item.quantity for item in items],
+            transaction_id,
+        )
+        created_reservations = [dict(row) for row in rows]
+
+        e_tickets_to_create = build_e_tickets(created_reservations, items)
+        if e_tickets_to_create:
+            await connection.execute(
+                INSERT_E_TICKETS_SQL,
+                [ticket['reservation_id'] for ticket in e_tickets_to_create],
+            )
+        await job_queue.enqueue(connection, CHECKOUT_COMPLETED_JOB, {'transaction_id': transaction_id})
+
+    return serialize_reservations(created_reservations)
+
+def serialize_reservations(reservations):
+    """Convertit les UUID en chaînes, comme dans les réponses de PostgREST."""
+    return [
+        {key: str(value) if isinstance(value, uuid.UUID) else value for key, value in reservation.items()}
+        for reservation in reservations
+    ]
+
+async def write_orders_pg(orders):
+    """
+    Écrit un lot de commandes `(checkout_request, user_id, transaction_key)` et renvoie, pour
+    chacune, ses réservations ou l'exception qui la concerne.
+
+    Le lot tient en une transaction et une requête multi-lignes par table. Si
+    cette transaction échoue, chaque commande est rejouée seule pour que
+    l'erreur n'atteigne que la commande fautive.
+    """
+    try:
+        return await write_orders_batch_pg(orders)
+    except Exception:
+        return await asyncio.gather(
+            *(create_order_pg(*order) for order in orders),
+            return_exceptions=True,
+        )
+
+async def write_orders_batch_pg(orders):
+    results = [None] * len(orders)
+    transactions = []  # (id, user_id, montant, clé)
+    reservations = []  # (id, user_id, offer_id, quantité, transaction_id)
+    orders_by_transaction = {}
+
+    # Les commandes du lot appartiennent à des utilisateurs différents : la
+    # transaction tourne en service_role, le propriétaire de chaque ligne étant
+    # l'utilisateur authentifié de la commande.
+    async with database.as_service(on_behalf_of=[user_id for _, user_id, _ in orders]) as connection:
+        offer_ids = list({item.offer_id for checkout_request, _, _ in orders for item in checkout_request.items})
+        prices = {str(row['id']): row['price'] for row in await connection.fetch(CHECKOUT_OFFERS_SQL, offer_ids)}
+
+        for index, (checkout_request, user_id, transaction_key) in enumerate(orders):
+            items = checkout_request.items
+            # Même règle que create_order : une offre par ligne de commande, toutes existantes
+            if len({str(item.offer_id) for item in items} & prices.keys()) != len(items):
+                results[index] = HTTPException(status_code=404, detail="Une ou plusieurs offres sont invalides.")
+                continue
+            transaction_id = uuid7()
+            orders_by_transaction[transaction_id] = index
+            transactions.append((transaction_id, user_id, compute_total_amount(items, prices), transaction_key))
+            reservations.extend(
+                (uuid7(), user_id, item.offer_id, item.quantity, transaction_id) for item in items
+            )
+
+        if transactions:
+            await connection.execute(INSERT_TRANSACTIONS_BATCH_SQL, *(list(column) for column in zip(*transactions)))
+            rows = await connection.fetch(INSERT_RESERVATIONS_BATCH_SQL, *(list(column) for column in zip(*reservations)))
+
+            created_by_order = {index: [] for index in orders_by_transaction.values()}
+            for row in rows:
+                created_by_order[orders_by_transaction[row['transaction_id']]].append(dict(row))
+
+            e_tickets_to_create = []
+            for index, created_reservations in created_by_order.items():
+                e_tickets_to_create.extend(build_e_tickets(created_reservations, orders[index][0].items))
+                results[index] = serialize_reservations(created_reservations)
+            if e_tickets_to_create:
+                await connection.execute(
+                    INSERT_E_TICKETS_SQL,
+                    [ticket['reservation_id'] for ticket in e_tickets_to_create],
+                )
+            await job_queue.enqueue_many(
+                connection,
+                CHECKOUT_COMPLETED_JOB,
+                [{'transaction_id': transaction_id} for transaction_id, *_ in transactions],
+                [user_id for _, user_id, *_ in transactions],
+            )
+
+    return results
+
+checkout_batcher = (
+    GroupCommit(write_orders_pg, CHECKOUT_BATCH_MAX_DELAY_MS / 1000, CHECKOUT_BATCH_MAX_SIZE)
+    if CHECKOUT_BATCHING_ENABLED else None
+)
+
+@job_queue.handler(CHECKOUT_COMPLETED_JOB)
+async def confirm_order(job):
+    """
+    Travail post-checkout d'une commande, hors du temps de réponse du checkout.
+    L'envoi de l'e-mail de confirmation et les événements analytiques viennent
+    s'ajouter ici ; ils doivent tolérer d'être rejoués.
+    """
+    async with database.as_service() as connection:
+        order = await connection.fetchrow(
+            ORDER_CONFIRMATION_SQL, uuid.UUID(job.payload['transaction_id']), job.user_id
+        )
+    if order is None:
+        raise PermanentJobError(f"Commande {job.payload['transaction_id']} introuvable pour l'utilisateur {job.user_id}")
+    logger.info(
+        "Commande %s confirmée pour %s : %s billet(s), %s €",
+        order['id'], order['email'], order['tickets'], order['amount'],
+    )
@@ -1,12 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timezone
 import uuid
 from ..models.ticketing_models import ETicket
 from ..models.auth_models import User
-from ..dependencies import get_current_user
+from ..dependencies import get_current_user, get_current_admin_user
 from core.supabase_client import supabase_client
+from core.security import oauth2_scheme
+from core.database import database
+from core.replicas import read_client, write_tracker
 
 router = APIRouter()
 
+SCAN_TICKET_SQL = """
+    UPDATE public.e_tickets SET is_used = true, used_at = $2
+    WHERE id = $1 AND is_used = false AND voided_at IS NULL
+    RETURNING *
+"""
+TICKET_VOIDED_SQL = "SELECT voided_at IS NOT NULL FROM public.e_tickets WHERE id = $1"
+
 @router.get("/{ticket_id}", response_model=ETicket)
 def get_eticket_details(ticket_id: uuid.UUID, current_user: User = Depends(get_current_user)):
     """
@@ -15,10 +26,10 @@ def get_eticket_details(ticket_id: uuid.UUID, current_user: User = Depends(get_c
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
 
-    user_id = current_user['id']
+    user_id = str(current_user.id)
     try:
         # Fetch the ticket and its reservation details to check for ownership
-        response = supabase_client.table('e_tickets').select('*, reservation:reservations(user_id)').eq('id', str(ticket_id)).single().execute()
+        response = read_client(user_id).table('e_tickets').select('*, reservation:reservations(user_id)').eq('id', str(ticket_id)).single().execute()
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Billet non trouvé.")
@@ -34,3 +45,64 @@ def get_eticket_details(ticket_id: uuid.UUID, current_user: User = Depends(get_c
         if "PGRST116" in str(e): # Not found
             raise HTTPException(status_code=404, detail="Billet non trouvé.")
         raise HTTPException(status_code=500, detail=f"Une erreur est survenue: {str(e)}")
+
+async def scan_e_ticket_pg(ticket_id, admin_id, used_at):
+    async with database.as_user(admin_id) as connection:
+        row = await connection.fetchrow(SCAN_TICKET_SQL, ticket_id, used_at)
+        if row:
+            return dict(row), 'scanned'
+        voided = await connection.fetchval(TICKET_VOIDED_SQL, ticket_id)
+    if voided is None:
+        return None, None
+    return None, 'voided' if voided else 'used'
+
+def scan_e_ticket(ticket_id, admin_id, token, used_at):
+    """
+    Marque le billet comme utilisé s'il ne l'était pas encore et n'est pas annulé.
+    Renvoie (billet mis à jour ou None, état : 'scanned', 'used', 'voided' ou
+    None si le billet n'existe pas).
+    """
+    if database.uses_pool("scan"):
+        return database.run(scan_e_ticket_pg, ticket_id, admin_id, used_at)
+
+    authenticated_client = supabase_client.postgrest.auth(token)
+    response = (
+        authenticated_client.table('e_tickets')
+        .update({'is_used': True, 'used_at': used_at.isoformat()})
+        .eq('id', str(ticket_id))
+        .eq('is_used', False)
+        .is_('voided_at', 'null')
+        .execute()
+    )
+    if response.data:
+        write_tracker.mark(admin_id)
+        return response.data[0], 'scanned'
+    existing = authenticated_client.table('e_tickets').select('voided_at').eq('id', str(ticket_id)).execute()
+    if not existing.data:
+        return None, None
+    return None, 'voided' if existing.data[0]['voided_at'] else 'used'
+
+@router.post("/{ticket_id}/scan", response_model=ETicket)
+def scan_eticket(
+    ticket_id: uuid.UUID,
+    admin: User = Depends(get_current_admin_user),
+    token: str = Depends(oauth2_scheme),
+):
+    """
+    Valide un e-billet au contrôle d'accès (Admin requis). Un billet ne peut être scanné qu'une fois.
+    """
+    if not supabase_client:
+        raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
+
+    try:
+        ticket, state = scan_e_ticket(ticket_id, admin.id, token, datetime.now(timezone.utc))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Une erreur est survenue: {str(e)}")
+
+    if ticket:
+        return ticket
+    if state is None:
+        raise HTTPException(status_code=404, detail="Billet non trouvé.")
+    if state == 'voided':
+        raise HTTPException(status_code=409, detail="Ce billet a été annulé.")
+    raise HTTPException(status_code=409, detail="Ce billet a déjà été utilisé.")
@@ -2,23 +2,56 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 import uuid
 from core.supabase_client import supabase_client
+from core.singleflight import single_flight, SingleFlightOverloaded, SingleFlightTimeout
+from core.database import database
+from core.replicas import read_client
 from ..models.offer_models import Offer
 
 router = APIRouter()
 
+OFFERS_SQL = "SELECT * FROM public.offers"
+OFFER_BY_ID_SQL = "SELECT * FROM public.offers WHERE id = $1"
+
+def offer_flight_key(offer_id) -> str:
+    return f"offers:{offer_id}"
+
+OFFERS_LIST_FLIGHT_KEY = "offers:list"
+
+async def fetch_offers_pg():
+    async with database.as_user(readonly=True) as connection:
+        return [dict(row) for row in await connection.fetch(OFFERS_SQL)]
+
+async def fetch_offer_pg(offer_id):
+    async with database.as_user(readonly=True) as connection:
+        row = await connection.fetchrow(OFFER_BY_ID_SQL, offer_id)
+    return dict(row) if row else None
+
+def fetch_offers():
+    if database.uses_pool("offers"):
+        return database.run(fetch_offers_pg)
+    return read_client().table('offers').select("*").execute().data
+
+def fetch_offer(offer_id):
+    if database.uses_pool("offers"):
+        return database.run(fetch_offer_pg, offer_id)
+    return read_client().table('offers').select("*").eq('id', str(offer_id)).single().execute().data
+
 @router.get("/", response_model=List[Offer])
 def get_offers():
     """
     Récupère la liste de toutes les offres depuis la base de données Supabase.
+    Les requêtes concurrentes partagent un même appel à Supabase.
     """
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
     
     try:
-        response = supabase_client.table('offers').select("*").execute()
-        if response.data:
-            return response.data
+        offers = single_flight.do(OFFERS_LIST_FLIGHT_KEY, fetch_offers)
+        if offers:
+            return offers
         return []
+    except (SingleFlightOverloaded, SingleFlightTimeout):
+        raise HTTPException(status_code=503, detail="Service surchargé, veuillez réessayer.", headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Une erreur est survenue: {str(e)}")
 
@@ -26,15 +59,20 @@ def get_offers():
 def get_offer_by_id(offer_id: uuid.UUID):
     """
     Récupère une offre spécifique par son ID.
+    Les requêtes concurrentes pour la même offre partagent un même appel à Supabase.
     """
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
     
     try:
-        response = supabase_client.table('offers').select("*").eq('id', str(offer_id)).single().execute()
-        if response.data:
-            return response.data
+        offer = single_flight.do(offer_flight_key(offer_id), lambda: fetch_offer(offer_id))
+        if offer:
+            return offer
         raise HTTPException(status_code=404, detail="Offre non trouvée.")
+    except HTTPException:
+        raise
+    except (SingleFlightOverloaded, SingleFlightTimeout):
+        raise HTTPException(status_code=503, detail="Service surchargé, veuillez réessayer.", headers={"Retry-After": "1"})
     except Exception as e:
         # Gérer le cas où .single() ne trouve rien, ce qui peut lever une erreur
         if "PGRST116" in str(e): # Code d'erreur PostgREST pour "exact-one row expected"
@@ -1,23 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+import uuid
 from ..models.ticketing_models import Reservation
 from ..models.auth_models import User
 from ..dependencies import get_current_user
 from core.supabase_client import supabase_client
+from core.replicas import read_client
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Reservation])
-def get_user_reservations(current_user: User = Depends(get_current_user)):
+def get_user_reservations(
+    current_user: User = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[uuid.UUID] = Query(None, description="Curseur : id de la dernière réservation de la page précédente"),
+):
     """
     Récupère l'historique des réservations pour l'utilisateur connecté.
+
+    Avec `limit`, l'historique est paginé par clé : les identifiants UUID v7
+    croissent avec la date de création, la page suivante s'obtient en passant
+    l'id de la dernière réservation reçue dans `before`.
     """
     if not supabase_client:
         raise HTTPException(status_code=503, detail="Le client Supabase n'est pas initialisé.")
 
-    user_id = current_user['id']
+    user_id = str(current_user.id)
     try:
-        response = supabase_client.table('reservations').select('*, offer:offers(*)').eq('user_id', user_id).order('created_at', desc=True).execute()
+        # Juste après un checkout, l'historique est lu sur le primaire pour inclure la commande
+        query = read_client(user_id).table('reservations').select('*, offer:offers(*)').eq('user_id', user_id)
+        if limit is None:
+            query = query.order('created_at', desc=True)
+        else:
+            # Les réservations antérieures aux clés v7 (identifiants v4) ne suivent pas cet ordre
+            query = query.order('id', desc=True).limit(limit)
+            if before is not None:
+                query = query.lt('id', str(before))
+        response = query.execute()
         if response.data:
             return response.data
         return []
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from ..models.auth_models import User, UserUpdate
 from ..dependencies import get_current_user
 from core.supabase_client import supabase_client
+from core.claims import claims_revocations
+from core.replicas import write_tracker
 import uuid
 
 router = APIRouter()
@@ -26,9 +28,12 @@ def update_user_profile(user_update: UserUpdate, current_user: User = Depends(ge
         raise HTTPException(status_code=400, detail="Aucune donnée à mettre à jour.")
 
     try:
-        user_id = current_user['id']
+        user_id = str(current_user.id)
         response = supabase_client.table('users').update(update_data).eq('id', user_id).execute()
         if response.data:
+            # Le nom figure dans les claims du jeton : il sera à jour après rafraîchissement de la session
+            claims_revocations.mark(user_id)
+            write_tracker.mark(user_id)
             return response.data[0]
         raise HTTPException(status_code=404, detail="Profil utilisateur non trouvé.")
     except Exception as e:
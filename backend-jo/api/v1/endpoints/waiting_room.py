@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import logging
+
+from ..models.waiting_room_models import QueueStatus
+from ..models.auth_models import User
+from ..dependencies import get_current_user
+from core import waiting_room
+from core.config import WAITING_ROOM_POLL_INTERVAL_SECONDS
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _queue_status(token: str) -> dict:
+    if waiting_room.queue is None:
+        raise HTTPException(status_code=404, detail="Aucune file d'attente n'est active.")
+    try:
+        return waiting_room.status(token)
+    except waiting_room.InvalidQueueToken:
+        raise HTTPException(status_code=401, detail="Jeton de file d'attente invalide ou expiré.")
+
+def _event(data: dict, event: str = None) -> str:
+    """Message Server-Sent Events ; sans nom d'événement, c'est un `message`."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/join", response_model=QueueStatus)
+def join_queue(current_user: User = Depends(get_current_user)):
+    """
+    Place l'utilisateur dans la file d'attente du checkout.
+    Le jeton renvoyé sert ensuite à suivre sa position.
+    """
+    if waiting_room.queue is None:
+        raise HTTPException(status_code=404, detail="Aucune file d'attente n'est active.")
+    queue_token = waiting_room.join(str(current_user.id))
+    return {"queue_token": queue_token, **_queue_status(queue_token)}
+
+@router.get("/status", response_model=QueueStatus)
+def get_queue_status(token: str):
+    """
+    Renvoie la position d'un jeton de file. Ne nécessite ni authentification ni
+    accès à la base : la position se calcule à partir du jeton signé.
+    """
+    return _queue_status(token)
+
+@router.get("/events")
+async def stream_queue_status(token: str):
+    """
+    Flux Server-Sent Events de la position, jusqu'à l'admission.
+    Le dernier événement contient le jeton d'admission. Si le jeton expire ou
+    sort de la file pendant le flux, un événement `expired` clôt le flux ; une
+    panne du backend de la file, un événement `error`.
+    """
+    first = await run_in_threadpool(_queue_status, token)
+
+    async def events():
+        current = first
+        while True:
+            yield _event(current)
+            if current["admitted"]:
+                return
+            await asyncio.sleep(WAITING_ROOM_POLL_INTERVAL_SECONDS)
+            try:
+                current = await run_in_threadpool(waiting_room.status, token)
+            except waiting_room.InvalidQueueToken:
+                yield _event({"detail": "Jeton de file d'attente invalide ou expiré."}, "expired")
+                return
+            except Exception:
+                logger.exception("Position non relue pour le flux de la file d'attente")
+                yield _event({"detail": "File d'attente indisponible."}, "error")
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 import uuid
 
 class UserCreate(BaseModel):
@@ -29,8 +29,12 @@ class Token(BaseModel):
 class LoginResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
     user_profile: User
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class TokenData(BaseModel):
     email: Optional[str] = None
 
@@ -42,3 +46,38 @@ class AdminUserUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     is_admin: Optional[bool] = None
+
+class UserProvisioningRow(BaseModel):
+    email: EmailStr
+    first_name: str = Field(min_length=1)
+    last_name: str = Field(min_length=1)
+
+class UserProvisioningRowError(BaseModel):
+    # Ligne du fichier (données, sans l'en-tête CSV) ; absente pour les refus de l'API Auth
+    row: Optional[int] = None
+    email: Optional[str] = None
+    error: str
+
+class UserProvisioningAccepted(BaseModel):
+    job_id: uuid.UUID
+    # Lignes enregistrées, à créer par la tâche
+    accepted: int
+    # Lignes rejetées à la lecture du fichier
+    errors: List[UserProvisioningRowError] = []
+
+class UserProvisioningStatus(BaseModel):
+    job_id: uuid.UUID
+    # Statut de la tâche (pending, running, completed, dead)
+    status: str
+    pending: int = 0
+    created: int = 0
+    existing: int = 0
+    failed: int = 0
+    last_error: Optional[str] = None
+    # Lignes refusées par l'API Auth
+    failures: List[UserProvisioningRowError] = []
+
+class UserErasureAccepted(BaseModel):
+    job_id: uuid.UUID
+    user_id: uuid.UUID
+    mode: str
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+import uuid
+
+class Job(BaseModel):
+    id: uuid.UUID
+    kind: str
+    payload: Dict[str, Any]
+    user_id: Optional[uuid.UUID] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    locked_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
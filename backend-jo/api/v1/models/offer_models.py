@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 import uuid
 
@@ -32,6 +32,30 @@ class Offer(BaseModel):
     features: Optional[List[str]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Date d'annulation : l'offre n'est plus en vente et ses billets sont annulés
+    cancelled_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+class OfferBulkRow(OfferCreate):
+    # Avec un id, la ligne crée ou remplace cette offre ; sans id, elle crée une nouvelle offre
+    id: Optional[uuid.UUID] = None
+
+class OfferBulkRowResult(BaseModel):
+    # Numéro de la ligne de données dans le fichier (à partir de 1, en-tête CSV exclu)
+    row: int
+    status: Literal['created', 'updated', 'error']
+    id: Optional[uuid.UUID] = None
+    error: Optional[str] = None
+
+class OfferBulkReport(BaseModel):
+    created: int
+    updated: int
+    errors: int
+    rows: List[OfferBulkRowResult]
+
+class OfferCancellationAccepted(BaseModel):
+    job_id: uuid.UUID
+    offer_id: uuid.UUID
+    cancelled_at: datetime
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, computed_field
 from typing import Optional, List
 import uuid
 from datetime import datetime
@@ -18,18 +18,35 @@ class Reservation(BaseModel):
     quantity: int
     transaction_id: uuid.UUID
     created_at: datetime
+    refunded_at: Optional[datetime] = None
+    refund_amount: Optional[float] = None
     offer: Optional[Offer] = None
 
     class Config:
         from_attributes = True
 
+# Même format que la fonction SQL `qr_code_url(e_tickets)`
+QR_CODE_URL_TEMPLATE = "https://api.qrserver.com/v1/create-qr-code/?data={token}&size=100x100"
+
 class ETicket(BaseModel):
     id: uuid.UUID
     reservation_id: uuid.UUID
-    qr_code_url: str
+    qr_token: Optional[uuid.UUID] = None
+    # URL d'origine des billets pas encore migrés vers `qr_token`
+    legacy_qr_code_url: Optional[str] = Field(None, exclude=True)
     is_used: bool
     used_at: Optional[datetime] = None
+    # Billet annulé (offre annulée) : refusé au contrôle d'accès
+    voided_at: Optional[datetime] = None
     created_at: datetime
 
+    @computed_field
+    @property
+    def qr_code_url(self) -> str:
+        """URL du QR code, reconstruite à partir du jeton."""
+        if self.legacy_qr_code_url:
+            return self.legacy_qr_code_url
+        return QR_CODE_URL_TEMPLATE.format(token=self.qr_token)
+
     class Config:
         from_attributes = True
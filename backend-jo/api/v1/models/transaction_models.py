@@ -0,0 +1,37 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+import uuid
+
+class TransactionUser(BaseModel):
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+
+class TransactionOffer(BaseModel):
+    name: str
+    type: str
+
+class TransactionReservation(BaseModel):
+    quantity: int
+    offers: Optional[TransactionOffer] = None
+
+class AdminTransaction(BaseModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    amount: float
+    status: str
+    payment_method: Optional[str] = None
+    created_at: Optional[datetime] = None
+    users: Optional[TransactionUser] = None
+    reservations: List[TransactionReservation] = []
+
+    class Config:
+        from_attributes = True
+
+class TransactionPage(BaseModel):
+    items: List[AdminTransaction]
+    # Curseur de la page suivante, None sur la dernière page
+    next_cursor: Optional[str] = None
+    # Nombre de transactions correspondant aux filtres (paramètre `count`)
+    count: Optional[int] = None
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class QueueStatus(BaseModel):
+    queue_token: Optional[str] = None
+    position: int
+    estimated_wait_seconds: int
+    admitted: bool
+    admission_token: Optional[str] = None
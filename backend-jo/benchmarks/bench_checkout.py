@@ -0,0 +1,36 @@
+"""
+Boucles de calcul du montant total et de construction des e-billets du checkout.
+"""
+import uuid
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from api.v1.endpoints.checkout import build_e_tickets, compute_total_amount
+from api.v1.models.ticketing_models import CheckoutItem
+
+from conftest import make_offer_row
+
+
+@pytest.fixture
+def checkout_items(size):
+    return [
+        CheckoutItem(offer_id=make_offer_row(i)["id"], quantity=1 + i % 4)
+        for i in range(size)
+    ]
+
+
+def bench_compute_total_amount(benchmark, checkout_items):
+    offers_map = {str(item.offer_id): 99.0 for item in checkout_items}
+    total = benchmark(compute_total_amount, checkout_items, offers_map)
+    assert total > 0
+
+
+def bench_build_e_tickets(benchmark, checkout_items):
+    created_reservations = [
+        {"id": str(uuid.uuid4()), "offer_id": str(item.offer_id)}
+        for item in checkout_items
+    ]
+    tickets = benchmark(build_e_tickets, created_reservations, checkout_items)
+    assert len(tickets) == sum(item.quantity for item in checkout_items)
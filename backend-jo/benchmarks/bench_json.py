@@ -0,0 +1,31 @@
+"""
+Coût de l'encodage JSON des réponses : chemin générique de FastAPI
+(`jsonable_encoder` + `json.dumps`) comparé à la sérialisation native Pydantic.
+"""
+import json
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+pytest.importorskip("pytest_benchmark")
+
+from api.v1.models.ticketing_models import Reservation
+
+reservations_adapter = TypeAdapter(List[Reservation])
+
+
+@pytest.fixture
+def reservations(reservation_rows):
+    return reservations_adapter.validate_python(reservation_rows)
+
+
+def bench_jsonable_encoder_dumps(benchmark, reservations):
+    body = benchmark(lambda: json.dumps(jsonable_encoder(reservations)))
+    assert body.startswith("[")
+
+
+def bench_pydantic_dump_json(benchmark, reservations):
+    body = benchmark(reservations_adapter.dump_json, reservations)
+    assert body.startswith(b"[")
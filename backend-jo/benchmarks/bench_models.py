@@ -0,0 +1,46 @@
+"""
+Coût de construction des modèles Pydantic à partir des dictionnaires PostgREST,
+puis de la revalidation effectuée par FastAPI via `response_model`.
+"""
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+pytest.importorskip("pytest_benchmark")
+
+from api.v1.models.auth_models import User
+from api.v1.models.offer_models import Offer
+from api.v1.models.ticketing_models import Reservation
+
+users_adapter = TypeAdapter(List[User])
+offers_adapter = TypeAdapter(List[Offer])
+reservations_adapter = TypeAdapter(List[Reservation])
+
+
+def bench_user_from_rows(benchmark, user_rows):
+    result = benchmark(lambda: [User(**row) for row in user_rows])
+    assert len(result) == len(user_rows)
+
+
+def bench_offer_from_rows(benchmark, offer_rows):
+    result = benchmark(offers_adapter.validate_python, offer_rows)
+    assert len(result) == len(offer_rows)
+
+
+def bench_reservation_with_nested_offer(benchmark, reservation_rows):
+    result = benchmark(reservations_adapter.validate_python, reservation_rows)
+    assert result[0].offer is not None
+
+
+def bench_response_model_revalidation(benchmark, reservation_rows):
+    """Reproduit la double validation : modèles déjà construits, repassés dans `response_model`."""
+    models = reservations_adapter.validate_python(reservation_rows)
+
+    def revalidate():
+        return reservations_adapter.validate_python(
+            [m.model_dump() for m in models]
+        )
+
+    result = benchmark(revalidate)
+    assert len(result) == len(models)
@@ -0,0 +1,72 @@
+"""
+Coût par requête des endpoints de lecture, de la réception HTTP à l'encodage
+de la réponse. Supabase est remplacé par un faux client qui renvoie des lignes
+déjà en mémoire : seul le travail fait par FastAPI et Pydantic est mesuré.
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fastapi.testclient import TestClient
+
+from api.v1.dependencies import get_current_user
+from api.v1.endpoints import offers, reservations
+from api.v1.models.auth_models import User
+from main import app
+
+from conftest import make_user_row
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Imite la chaîne de méthodes de postgrest-py et renvoie des lignes fixes."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return FakeResponse(self.rows)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeQuery(self.rows)
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: User(**make_user_row(1))
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def use_fake_supabase(monkeypatch, module, rows):
+    fake = FakeSupabase(rows)
+    monkeypatch.setattr(module, "supabase_client", fake)
+    # Les lectures passent par `read_client` (primaire ou réplica)
+    monkeypatch.setattr(module, "read_client", lambda user_id=None: fake)
+
+
+def bench_get_offers_request(benchmark, client, offer_rows, monkeypatch):
+    use_fake_supabase(monkeypatch, offers, offer_rows)
+    response = benchmark(client.get, "/api/v1/offers/")
+    assert response.status_code == 200
+    assert len(response.json()) == len(offer_rows)
+
+
+def bench_get_reservations_request(benchmark, client, reservation_rows, monkeypatch):
+    use_fake_supabase(monkeypatch, reservations, reservation_rows)
+    response = benchmark(client.get, "/api/v1/reservations/")
+    assert response.status_code == 200
+    assert len(response.json()) == len(reservation_rows)
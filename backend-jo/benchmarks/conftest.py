@@ -0,0 +1,81 @@
+"""
+Données de test partagées par les micro-benchmarks.
+
+Les lignes produites imitent ce que PostgREST renvoie (UUID et dates sous forme
+de chaînes) afin de mesurer le vrai coût de conversion vers les modèles Pydantic.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+SIZES = [1, 100, 10_000]
+
+_EPOCH = datetime(2024, 7, 26, 8, 0, tzinfo=timezone.utc)
+
+
+def _uuid(namespace, i):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{namespace}/{i}"))
+
+
+def make_user_row(i):
+    return {
+        "id": _uuid("users", i),
+        "email": f"spectateur{i}@paris2024.fr",
+        "first_name": "Marie",
+        "last_name": f"Dupont{i}",
+        "is_admin": i == 0,
+        "user_key": _uuid("user_key", i),
+        "mfa_enabled": False,
+        "mfa_secret": None,
+        "created_at": (_EPOCH + timedelta(minutes=i)).isoformat(),
+    }
+
+
+def make_offer_row(i):
+    return {
+        "id": _uuid("offers", i),
+        "name": f"Pass Solo Découverte #{i}",
+        "description": "Accès pour une personne à une journée complète d'événements olympiques",
+        "price": 99.0 + (i % 3) * 100,
+        "type": ("solo", "duo", "family")[i % 3],
+        "image_url": "https://images.pexels.com/photos/2788488/pexels-photo-2788488.jpeg",
+        "max_attendees": (1, 2, 4)[i % 3],
+        "features": ["Accès à tous les événements du jour", "Programme officiel inclus"],
+        "created_at": (_EPOCH + timedelta(hours=i)).isoformat(),
+        "updated_at": (_EPOCH + timedelta(hours=i)).isoformat(),
+    }
+
+
+def make_reservation_row(i, with_offer=True):
+    row = {
+        "id": _uuid("reservations", i),
+        "user_id": _uuid("users", 1),
+        "offer_id": _uuid("offers", i % 3),
+        "quantity": 1 + i % 4,
+        "transaction_id": _uuid("transactions", i // 2),
+        "created_at": (_EPOCH + timedelta(seconds=i)).isoformat(),
+    }
+    if with_offer:
+        row["offer"] = make_offer_row(i % 3)
+    return row
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"n={n}")
+def size(request):
+    return request.param
+
+
+@pytest.fixture
+def user_rows(size):
+    return [make_user_row(i) for i in range(size)]
+
+
+@pytest.fixture
+def offer_rows(size):
+    return [make_offer_row(i) for i in range(size)]
+
+
+@pytest.fixture
+def reservation_rows(size):
+    return [make_reservation_row(i) for i in range(size)]
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from jose import JWTError, jwt
+
+from .config import (
+    SUPABASE_JWT_SECRET,
+    SUPABASE_JWT_AUDIENCE,
+    SUPABASE_JWT_EXPIRY_SECONDS,
+    CLAIMS_REVOCATION_REFRESH_SECONDS,
+)
+from .supabase_client import supabase_client, service_client
+
+logger = logging.getLogger(__name__)
+
+# Claims ajoutés par le hook `custom_access_token_hook`
+PROFILE_CLAIMS = ("is_admin", "user_profile")
+
+
+class StaleClaims(Exception):
+    """Le jeton a été émis avant une modification du rôle ou du profil de l'utilisateur."""
+
+
+def decode_access_token(token: str):
+    """
+    Vérifie localement la signature et l'expiration d'un jeton Supabase.
+    Renvoie None si la vérification locale n'est pas configurée ou si le jeton
+    ne contient pas les claims du hook (jeton émis avant son activation).
+    """
+    if not SUPABASE_JWT_SECRET:
+        return None
+    claims = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=SUPABASE_JWT_AUDIENCE)
+    if not all(name in claims for name in PROFILE_CLAIMS):
+        return None
+    return claims
+
+
+def verified_subject(request):
+    """
+    Identifiant utilisateur (`sub`) du jeton Bearer d'une requête, après
+    vérification de sa signature, de son expiration et de son audience ; None
+    sans jeton valide ou sans SUPABASE_JWT_SECRET. Pour les traitements qui
+    précèdent ou suivent l'authentification faite par `get_current_user`.
+    """
+    if not SUPABASE_JWT_SECRET:
+        return None
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=SUPABASE_JWT_AUDIENCE).get("sub")
+    except JWTError:
+        return None
+
+
+class ClaimsRevocations:
+    """
+    Dates de dernière modification des claims (colonne `users.claims_updated_at`),
+    pour refuser les jetons émis avant un changement de rôle.
+
+    Seules les modifications plus récentes que la durée de vie d'un jeton sont
+    utiles : la liste est courte et relue au plus toutes les
+    CLAIMS_REVOCATION_REFRESH_SECONDS, jamais à chaque requête.
+
+    Une seule requête relit la liste, hors du verrou ; les autres continuent
+    avec la liste courante. Si la lecture échoue, cette liste est conservée et
+    la lecture suivante attend un intervalle complet : une panne de Supabase
+    retarde la prise en compte des révocations sans bloquer l'authentification.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._updated_at = {}
+        self._loaded_at = 0.0
+        self._refreshing = False
+
+    def _fetch(self, since):
+        client = service_client or supabase_client
+        response = client.table('users').select('id, claims_updated_at').gt('claims_updated_at', since.isoformat()).execute()
+        return response.data or []
+
+    def _refresh(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._loaded_at <= CLAIMS_REVOCATION_REFRESH_SECONDS:
+                return
+            self._refreshing = True
+        since = datetime.now(timezone.utc) - timedelta(seconds=SUPABASE_JWT_EXPIRY_SECONDS)
+        try:
+            rows = self._fetch(since)
+        except Exception:
+            logger.warning("Révocations des claims non relues, liste précédente conservée", exc_info=True)
+            rows = None
+        with self._lock:
+            if rows is not None:
+                # Fusion sous le verrou : les `mark` faits pendant la lecture sont conservés
+                local = {
+                    user_id: updated_at for user_id, updated_at in self._updated_at.items()
+                    if updated_at > since.timestamp()
+                }
+                for row in rows:
+                    updated_at = datetime.fromisoformat(row['claims_updated_at']).timestamp()
+                    local[row['id']] = max(updated_at, local.get(row['id'], 0))
+                self._updated_at = local
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+
+    def mark(self, user_id):
+        """Enregistre immédiatement un changement fait par ce worker."""
+        with self._lock:
+            self._updated_at[str(user_id)] = time.time()
+
+    def check(self, claims: dict):
+        if time.monotonic() - self._loaded_at > CLAIMS_REVOCATION_REFRESH_SECONDS:
+            self._refresh()
+        updated_at = self._updated_at.get(claims["sub"])
+        # `iat` est arrondi à la seconde : un jeton émis dans la même seconde que la modification est accepté
+        if updated_at is not None and claims.get("iat", 0) < int(updated_at):
+            raise StaleClaims(claims["sub"])
+
+
+claims_revocations = ClaimsRevocations()
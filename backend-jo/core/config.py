@@ -6,3 +6,141 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# Idempotence du checkout (en-tête Idempotency-Key)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+# Coalescence des lectures concurrentes identiques (single-flight)
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv("SINGLEFLIGHT_MAX_WAITERS", "1000"))
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SECONDS", "5"))
+
+# Clé service_role : réservée aux opérations internes du backend (jamais exposée au frontend)
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+# Nombre de processus qui servent l'application (variable lue par uvicorn et
+# gunicorn pour leur nombre de workers par défaut ; à renseigner si `--workers`
+# est passé explicitement)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Limitation de débit (token bucket). Les limites s'écrivent "requêtes/secondes", ex : "10/60".
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" : seaux propres à chaque processus, chaque worker appliquant la limite
+# complète ; refusé si WEB_CONCURRENCY > 1. "postgres" : seaux partagés
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+# Seaux indisponibles (erreur Postgres/PostgREST) : "true" admet les requêtes sans
+# limite, le temps de la panne ; "false" les refuse en 503
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"
+# Seau global partagé par toutes les routes, exprimé en unités de coût (≈ appels Supabase)
+RATE_LIMIT_GLOBAL = os.getenv("RATE_LIMIT_GLOBAL", "300/1")
+RATE_LIMIT_ROUTES = {
+    "login": {
+        "cost": float(os.getenv("RATE_LIMIT_LOGIN_COST", "2")),
+        "per_ip": os.getenv("RATE_LIMIT_LOGIN_PER_IP", "10/60"),
+        "per_user": None,
+    },
+    "checkout": {
+        "cost": float(os.getenv("RATE_LIMIT_CHECKOUT_COST", "5")),
+        "per_ip": os.getenv("RATE_LIMIT_CHECKOUT_PER_IP", "30/60"),
+        # Par utilisateur du jeton vérifié : sans SUPABASE_JWT_SECRET, ignorée (avertissement au démarrage)
+        "per_user": os.getenv("RATE_LIMIT_CHECKOUT_PER_USER", "5/60"),
+    },
+}
+
+# File d'attente virtuelle devant le checkout
+WAITING_ROOM_ENABLED = os.getenv("WAITING_ROOM_ENABLED", "false").lower() == "true"
+# "memory" : file propre à chaque processus ; refusé si WEB_CONCURRENCY > 1. "postgres" : file partagée
+WAITING_ROOM_BACKEND = os.getenv("WAITING_ROOM_BACKEND", "memory")
+WAITING_ROOM_SECRET = os.getenv("WAITING_ROOM_SECRET")
+WAITING_ROOM_ADMIT_PER_SECOND = float(os.getenv("WAITING_ROOM_ADMIT_PER_SECOND", "50"))
+WAITING_ROOM_QUEUE_TOKEN_TTL_SECONDS = int(os.getenv("WAITING_ROOM_QUEUE_TOKEN_TTL_SECONDS", "86400"))
+WAITING_ROOM_ADMISSION_TTL_SECONDS = int(os.getenv("WAITING_ROOM_ADMISSION_TTL_SECONDS", "600"))
+WAITING_ROOM_POLL_INTERVAL_SECONDS = float(os.getenv("WAITING_ROOM_POLL_INTERVAL_SECONDS", "2"))
+
+# Vérification locale des JWT Supabase (secret HS256 du projet). Si elle est
+# définie, l'utilisateur courant est construit à partir des claims du jeton.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+# Durée de vie maximale d'un jeton d'accès (jwt_expiry du projet Supabase)
+SUPABASE_JWT_EXPIRY_SECONDS = int(os.getenv("SUPABASE_JWT_EXPIRY_SECONDS", "3600"))
+CLAIMS_REVOCATION_REFRESH_SECONDS = float(os.getenv("CLAIMS_REVOCATION_REFRESH_SECONDS", "5"))
+
+# Accès direct à Postgres (pool asyncpg) pour les opérations les plus sollicitées.
+# DATABASE_URL doit viser la connexion directe ou le pooler en mode session : le
+# mode transaction ne conserve pas les requêtes préparées d'une transaction à l'autre.
+DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "256"))
+# Backend d'accès aux données, "postgrest" ou "asyncpg", par défaut et par opération
+# (checkout, scan, offers, profile, export, transactions), ex : DATA_BACKEND_OPERATIONS="checkout=asyncpg,offers=asyncpg"
+DATA_BACKEND = os.getenv("DATA_BACKEND", "postgrest")
+DATA_BACKEND_OPERATIONS = dict(
+    entry.split("=", 1) for entry in os.getenv("DATA_BACKEND_OPERATIONS", "").replace(" ", "").split(",") if entry
+)
+
+# Réplicas en lecture. Les GET y sont envoyés ; les écritures et les lectures d'un
+# utilisateur qui vient d'écrire restent sur le primaire.
+SUPABASE_READ_URLS = [url for url in os.getenv("SUPABASE_READ_URLS", "").replace(" ", "").split(",") if url]
+DATABASE_READ_URLS = [url for url in os.getenv("DATABASE_READ_URLS", "").replace(" ", "").split(",") if url]
+# Durée pendant laquelle les lectures d'un utilisateur suivent le primaire après
+# une écriture (à choisir au-dessus du retard de réplication observé)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# La dernière écriture est aussi renvoyée au client dans un cookie signé, pour que la
+# requête suivante la retrouve sur n'importe quel worker ou instance (nécessite
+# SUPABASE_JWT_SECRET ; sans lui, le suivi reste propre à chaque processus)
+READ_YOUR_WRITES_COOKIE = os.getenv("READ_YOUR_WRITES_COOKIE", "jo_last_write")
+
+# Listes admin avec count=estimated : en dessous de ce nombre de lignes estimé,
+# le décompte exact est assez rapide pour être renvoyé à la place de l'estimation
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", "10000"))
+
+# Import groupé des offres (POST /admin/offers/bulk) : lignes écrites par requête
+OFFERS_BULK_BATCH_SIZE = int(os.getenv("OFFERS_BULK_BATCH_SIZE", "500"))
+
+# Création de comptes en masse (POST /admin/users/provisioning) : appels simultanés
+# à l'API admin Auth, et lignes traitées (profils écrits, avancement publié) par lot
+USER_PROVISIONING_CONCURRENCY = int(os.getenv("USER_PROVISIONING_CONCURRENCY", "8"))
+USER_PROVISIONING_CHUNK_SIZE = int(os.getenv("USER_PROVISIONING_CHUNK_SIZE", "500"))
+
+# Suppression d'un utilisateur en tâche de fond (DELETE /admin/users/{id}) : réservations
+# (avec leurs e-tickets) ou transactions supprimées par transaction
+USER_ERASURE_CHUNK_SIZE = int(os.getenv("USER_ERASURE_CHUNK_SIZE", "1000"))
+
+# Annulation d'une offre en tâche de fond (POST /admin/offers/{id}/cancel) : réservations
+# remboursées (avec leurs e-tickets et transactions) par transaction
+OFFER_CANCELLATION_CHUNK_SIZE = int(os.getenv("OFFER_CANCELLATION_CHUNK_SIZE", "1000"))
+
+# Exports admin (NDJSON / CSV) : lignes lues et envoyées par paquet
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "5000"))
+
+# Regroupement des checkouts concurrents en une seule transaction (backend asyncpg)
+CHECKOUT_BATCHING_ENABLED = os.getenv("CHECKOUT_BATCHING_ENABLED", "false").lower() == "true"
+# Attente maximale ajoutée à un checkout pour former un lot, et taille maximale d'un lot
+CHECKOUT_BATCH_MAX_DELAY_MS = float(os.getenv("CHECKOUT_BATCH_MAX_DELAY_MS", "5"))
+CHECKOUT_BATCH_MAX_SIZE = int(os.getenv("CHECKOUT_BATCH_MAX_SIZE", "100"))
+
+# File de tâches en arrière-plan (table public.jobs). Les workers tournent sur la
+# boucle d'événements de l'application, lorsque le pool asyncpg est disponible.
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_POLL_INTERVAL_SECONDS = float(os.getenv("JOBS_POLL_INTERVAL_SECONDS", "1"))
+# Une tâche dont le worker ne donne plus signe de vie au-delà de ce délai est remise en file
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+# Délai avant un nouvel essai : base × 2^(essai - 1), plafonné
+JOBS_BACKOFF_BASE_SECONDS = float(os.getenv("JOBS_BACKOFF_BASE_SECONDS", "2"))
+JOBS_BACKOFF_MAX_SECONDS = float(os.getenv("JOBS_BACKOFF_MAX_SECONDS", "600"))
+JOBS_RETENTION_DAYS = int(os.getenv("JOBS_RETENTION_DAYS", "7"))
+
+# Relais de l'outbox des événements de commande (table public.outbox) vers les
+# sinks listés, ex : OUTBOX_SINKS="jsonl,webhook". Sans sink, le relais ne tourne pas.
+OUTBOX_SINKS = [name for name in os.getenv("OUTBOX_SINKS", "").replace(" ", "").split(",") if name]
+OUTBOX_JSONL_PATH = os.getenv("OUTBOX_JSONL_PATH", "outbox-events.jsonl")
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL")
+# Secret partagé pour signer les lots envoyés au webhook (en-tête X-Outbox-Signature)
+OUTBOX_WEBHOOK_SECRET = os.getenv("OUTBOX_WEBHOOK_SECRET")
+OUTBOX_WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT_SECONDS", "10"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
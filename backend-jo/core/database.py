@@ -0,0 +1,153 @@
+import itertools
+import json
+from contextlib import asynccontextmanager
+
+import anyio.from_thread
+import asyncpg
+
+from .config import (
+    DATABASE_URL,
+    DATABASE_READ_URLS,
+    DATABASE_POOL_MIN_SIZE,
+    DATABASE_POOL_MAX_SIZE,
+    DATABASE_STATEMENT_CACHE_SIZE,
+    DATA_BACKEND,
+    DATA_BACKEND_OPERATIONS,
+)
+from .replicas import write_tracker
+
+POSTGREST = "postgrest"
+ASYNCPG = "asyncpg"
+
+# Rôle et claims posés pour la durée de la transaction, comme le fait PostgREST :
+# les politiques RLS (auth.uid(), is_admin()) s'appliquent à l'identique.
+SET_REQUEST_ROLE_SQL = "SELECT set_config('role', $1, true), set_config('request.jwt.claims', $2, true)"
+# Position du WAL après commit d'une écriture, et rattrapage d'un réplica
+CURRENT_LSN_SQL = "SELECT pg_current_wal_lsn()"
+REPLICA_CAUGHT_UP_SQL = "SELECT coalesce(pg_last_wal_replay_lsn() >= $1::pg_lsn, true)"
+
+
+class Database:
+    """
+    Pool de connexions asyncpg ouvert au démarrage de l'application.
+
+    asyncpg prépare chaque requête paramétrée et garde la requête préparée dans un
+    cache propre à chaque connexion : les requêtes des endpoints sont des constantes,
+    elles ne sont donc analysées qu'une fois par connexion.
+
+    Les transactions en lecture seule sont réparties sur les réplicas (`read_dsns`)
+    lorsqu'il y en a.
+    """
+
+    def __init__(self, dsn, min_size: int, max_size: int, statement_cache_size: int, read_dsns=()):
+        self.dsn = dsn
+        self.read_dsns = list(read_dsns)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.pool = None
+        self.read_pools = []
+        self._next_read_pool = None
+
+    def _create_pool(self, dsn):
+        return asyncpg.create_pool(
+            dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+        )
+
+    async def connect(self):
+        if self.dsn and self.pool is None:
+            self.pool = await self._create_pool(self.dsn)
+            self.read_pools = [await self._create_pool(dsn) for dsn in self.read_dsns]
+            self._next_read_pool = itertools.cycle(self.read_pools)
+
+    async def disconnect(self):
+        for pool in [self.pool, *self.read_pools]:
+            if pool is not None:
+                await pool.close()
+        self.pool = None
+        self.read_pools = []
+
+    async def _pool_for(self, user_id, readonly: bool):
+        """Primaire pour les écritures ; réplica pour les lectures s'il a rejoué la dernière écriture de l'utilisateur."""
+        if not readonly or not self.read_pools:
+            return self.pool
+        replica = next(self._next_read_pool)
+        write = write_tracker.last_write(user_id)
+        if write is None:
+            return replica
+        _, lsn = write
+        if lsn is None:
+            return self.pool
+        return replica if await replica.fetchval(REPLICA_CAUGHT_UP_SQL, lsn) else self.pool
+
+    @asynccontextmanager
+    async def as_user(self, user_id=None, readonly: bool = False):
+        """
+        Transaction exécutée avec les droits de `user_id` (rôle authenticated),
+        ou du rôle anon si aucun utilisateur n'est donné.
+
+        Une transaction `readonly` peut être servie par un réplica. Après une
+        transaction d'écriture, le LSN du primaire est retenu pour l'utilisateur.
+        """
+        if self.pool is None:
+            raise RuntimeError("Le pool Postgres n'est pas initialisé.")
+        role = "authenticated" if user_id else "anon"
+        claims = {"role": role}
+        if user_id:
+            claims["sub"] = str(user_id)
+        pool = await self._pool_for(user_id, readonly)
+        async with pool.acquire() as connection:
+            async with connection.transaction(readonly=readonly):
+                await connection.execute(SET_REQUEST_ROLE_SQL, role, json.dumps(claims))
+                yield connection
+            if user_id and not readonly:
+                write_tracker.mark(user_id, await connection.fetchval(CURRENT_LSN_SQL))
+
+    @asynccontextmanager
+    async def as_service(self, on_behalf_of=(), readonly: bool = False):
+        """
+        Transaction avec le rôle service_role, qui contourne la RLS : réservée aux
+        écritures groupées de plusieurs utilisateurs dont le backend a lui-même
+        fixé le propriétaire, et aux lectures admin dont l'endpoint a déjà vérifié
+        les droits. Les utilisateurs `on_behalf_of` sont considérés comme ayant
+        écrit (lecture de leurs propres écritures). Une transaction `readonly` peut
+        être servie par un réplica.
+        """
+        if self.pool is None:
+            raise RuntimeError("Le pool Postgres n'est pas initialisé.")
+        pool = await self._pool_for(None, readonly)
+        async with pool.acquire() as connection:
+            async with connection.transaction(readonly=readonly):
+                await connection.execute(SET_REQUEST_ROLE_SQL, "service_role", json.dumps({"role": "service_role"}))
+                yield connection
+            if readonly:
+                return
+            lsn = await connection.fetchval(CURRENT_LSN_SQL)
+        for user_id in on_behalf_of:
+            write_tracker.mark(user_id, lsn)
+
+    def uses_pool(self, operation: str) -> bool:
+        """Indique si `operation` doit passer par le pool plutôt que par PostgREST."""
+        return self.pool is not None and DATA_BACKEND_OPERATIONS.get(operation, DATA_BACKEND) == ASYNCPG
+
+    def run(self, fn, *args):
+        """
+        Exécute la coroutine `fn(*args)` sur la boucle d'événements de l'application
+        depuis un endpoint synchrone (qui tourne dans le pool de threads).
+        """
+        return anyio.from_thread.run(fn, *args)
+
+
+for _backend in {DATA_BACKEND, *DATA_BACKEND_OPERATIONS.values()}:
+    if _backend not in (POSTGREST, ASYNCPG):
+        raise ValueError(f"Backend d'accès aux données inconnu : {_backend}")
+
+if ASYNCPG in {DATA_BACKEND, *DATA_BACKEND_OPERATIONS.values()} and not DATABASE_URL:
+    print("Erreur: DATABASE_URL doit être défini pour utiliser le backend asyncpg, PostgREST sera utilisé")
+
+database = Database(
+    DATABASE_URL, DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE, DATABASE_STATEMENT_CACHE_SIZE, DATABASE_READ_URLS
+)
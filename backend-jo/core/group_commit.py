@@ -0,0 +1,56 @@
+import asyncio
+
+
+class GroupCommit:
+    """
+    Regroupe les appels concurrents : le premier élément ouvre un lot, qui est
+    écrit au plus tard `max_delay` secondes après, ou dès qu'il contient
+    `max_size` éléments. Tout se passe sur la boucle d'événements.
+
+    `write_batch(items)` est une coroutine qui renvoie une liste de même longueur
+    que `items` : le résultat ou l'exception propre à chaque élément. Chaque
+    appelant reçoit uniquement le sien.
+    """
+
+    def __init__(self, write_batch, max_delay: float, max_size: int):
+        self.write_batch = write_batch
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._pending = []  # (élément, future)
+        self._timer = None
+        self._writes = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Référence conservée : la boucle ne garde qu'une référence faible aux tâches
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch):
+        try:
+            results = await self.write_batch([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # L'appelant a pu être annulé entre-temps
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from .config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+# Tentatives d'enregistrement de la réponse, la commande étant déjà écrite
+COMPLETE_ATTEMPTS = 3
+
+
+def request_fingerprint(payload) -> str:
+    """Empreinte stable du corps d'une requête, pour détecter la réutilisation d'une clé."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _claim(client, key, fingerprint):
+    response = client.rpc('claim_idempotency_key', {
+        'p_key': key,
+        'p_request_hash': fingerprint,
+        'p_ttl_seconds': IDEMPOTENCY_TTL_SECONDS,
+        'p_lock_seconds': IDEMPOTENCY_LOCK_SECONDS,
+    }).execute()
+    return response.data[0]
+
+
+def _replay(claim):
+    return JSONResponse(
+        status_code=claim['response_status'],
+        content=claim['response_body'],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _complete(client, key, lease_id, status_code, body):
+    """
+    Enregistre la réponse. Un échec n'est pas remonté au client : sa commande
+    est écrite, et la tentative suivante la retrouvera par `order_key`.
+    """
+    delay = 0.1
+    for attempt in range(1, COMPLETE_ATTEMPTS + 1):
+        try:
+            completed = client.rpc('complete_idempotency_key', {
+                'p_key': key,
+                'p_lease_id': lease_id,
+                'p_response_status': status_code,
+                'p_response_body': body,
+            }).execute().data
+        except Exception:
+            if attempt == COMPLETE_ATTEMPTS:
+                logger.exception("Réponse non enregistrée pour la clé d'idempotence %r", key)
+                return
+            time.sleep(delay)
+            delay *= 2
+            continue
+        if not completed:
+            logger.warning("Clé d'idempotence %r reprise par une autre requête avant son enregistrement", key)
+        return
+
+
+def _release(client, key, lease_id, error):
+    # Une requête refusée (4xx) n'a rien écrit : la clé est oubliée. Sinon seul le bail
+    # est libéré, pour que la tentative suivante retrouve ce qui a pu être écrit
+    forget = isinstance(error, HTTPException) and error.status_code < 500
+    try:
+        client.rpc('release_idempotency_key', {'p_key': key, 'p_lease_id': lease_id, 'p_forget': forget}).execute()
+    except Exception:
+        logger.exception("Clé d'idempotence %r non libérée ; elle le sera à l'expiration du bail", key)
+
+
+def run_idempotent(client, key: str, fingerprint: str, handler, status_code: int, recover=None) -> JSONResponse:
+    """
+    Exécute `handler` au plus une fois par clé d'idempotence.
+
+    `client` doit être authentifié avec le jeton de l'utilisateur : les clés sont
+    propres à chaque utilisateur. La première requête réserve la clé, exécute
+    `handler(order_key)` (qui renvoie un corps déjà sérialisable en JSON) et
+    enregistre la réponse ; les requêtes suivantes reçoivent cette réponse telle
+    quelle. Une requête concurrente portant la même clé attend la fin de la
+    première au lieu de relancer le traitement.
+
+    `order_key` est propre à la clé et stable d'une tentative à l'autre : le
+    handler l'attache à ce qu'il écrit. Quand une requête reprend une clé dont
+    le détenteur a échoué ou disparu, `recover(order_key)` renvoie le corps de
+    la réponse si l'écriture avait eu lieu (None sinon), et `handler` n'est pas
+    relancé.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="En-tête Idempotency-Key invalide.")
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        claim = _claim(client, key, fingerprint)
+        outcome = claim['outcome']
+        if outcome == 'started':
+            break
+        if outcome == 'completed':
+            return _replay(claim)
+        if outcome == 'mismatch':
+            raise HTTPException(
+                status_code=422,
+                detail="Cette clé d'idempotence a déjà été utilisée pour une requête différente.",
+            )
+        # 'in_progress' : la requête d'origine est en cours, on attend son résultat
+        if time.monotonic() + delay > deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="Une requête avec cette clé d'idempotence est déjà en cours.",
+                headers={"Retry-After": "1"},
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+    lease_id, order_key = claim['lease_id'], claim['order_key']
+    try:
+        body = recover(order_key) if claim['taken_over'] and recover is not None else None
+        if body is None:
+            body = handler(order_key)
+    except BaseException as e:
+        _release(client, key, lease_id, e)
+        raise
+
+    _complete(client, key, lease_id, status_code, body)
+    return JSONResponse(status_code=status_code, content=body)
@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    UUID version 7 (RFC 9562) : 48 bits d'horodatage Unix en millisecondes, puis
+    74 bits aléatoires. Les identifiants sont croissants dans le temps, ce qui
+    garde les insertions groupées en fin d'index B-tree.
+
+    Dans une même milliseconde, les 12 bits `rand_a` servent de compteur pour
+    que les identifiants générés par ce processus restent strictement croissants.
+    """
+    global _last_ms, _counter
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = random_bits >> 68  # 12 bits aléatoires pour démarrer
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Compteur épuisé : on emprunte la milliseconde suivante
+                _last_ms += 1
+                _counter = 0
+            ms = _last_ms
+        counter = _counter
+    value = (ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= random_bits & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+
+def uuid7_datetime(value: uuid.UUID) -> datetime:
+    """Instant de création encodé dans un UUID v7."""
+    return datetime.fromtimestamp((value.int >> 80) / 1000, timezone.utc)
+
+
+def uuid7_lower_bound(moment: datetime) -> uuid.UUID:
+    """Plus petit UUID v7 possible à `moment` : borne de curseur pour une date."""
+    ms = int(moment.timestamp() * 1000)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (0b10 << 62))
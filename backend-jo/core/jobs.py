@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+
+import asyncpg
+
+from .config import (
+    JOBS_WORKERS,
+    JOBS_POLL_INTERVAL_SECONDS,
+    JOBS_LEASE_SECONDS,
+    JOBS_BACKOFF_BASE_SECONDS,
+    JOBS_BACKOFF_MAX_SECONDS,
+    JOBS_RETENTION_DAYS,
+)
+from .database import database
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Inscription par un utilisateur (rôle authenticated) : la fonction fixe user_id = auth.uid()
+ENQUEUE_JOB_SQL = "SELECT public.enqueue_job($1, $2::jsonb)"
+# Inscription groupée par le backend (service_role), pour le compte de plusieurs utilisateurs
+INSERT_JOBS_SQL = """
+    INSERT INTO public.jobs (kind, payload, user_id)
+    SELECT $1, payload, user_id FROM unnest($2::jsonb[], $3::uuid[]) AS job(payload, user_id)
+    RETURNING id
+"""
+CLAIM_JOB_SQL = """
+    UPDATE public.jobs
+    SET status = 'running', attempts = attempts + 1, locked_at = now(), locked_by = $1, updated_at = now()
+    WHERE id = (
+        SELECT id FROM public.jobs
+        WHERE status = 'pending' AND run_at <= now()
+        ORDER BY run_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, user_id, attempts, max_attempts, run_at
+"""
+COMPLETE_JOB_SQL = """
+    UPDATE public.jobs
+    SET status = 'completed', completed_at = now(), updated_at = now(), locked_at = NULL, locked_by = NULL
+    WHERE id = $1 AND locked_by = $2
+"""
+# Statut administrateur de l'auteur d'une tâche, relu à l'exécution
+ENQUEUER_IS_ADMIN_SQL = "SELECT is_admin FROM public.users WHERE id = $1"
+# Échec : nouvel essai différé, ou file des tâches mortes une fois les essais épuisés
+FAIL_JOB_SQL = """
+    UPDATE public.jobs
+    SET status = CASE WHEN $3 OR attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+        run_at = now() + make_interval(secs => $4),
+        last_error = $5,
+        locked_at = NULL, locked_by = NULL, updated_at = now()
+    WHERE id = $1 AND locked_by = $2
+    RETURNING status
+"""
+# Arrêt du worker pendant l'exécution : la tâche est rendue sans compter d'essai
+RELEASE_JOB_SQL = """
+    UPDATE public.jobs
+    SET status = 'pending', attempts = attempts - 1, locked_at = NULL, locked_by = NULL, updated_at = now()
+    WHERE id = $1 AND locked_by = $2
+"""
+PROGRESS_JOB_SQL = """
+    UPDATE public.jobs SET progress = $3::jsonb, locked_at = now(), updated_at = now()
+    WHERE id = $1 AND locked_by = $2
+"""
+# Tâches dont le worker a disparu (processus tué) : remises en file à l'expiration du bail
+REQUEUE_STALE_JOBS_SQL = """
+    UPDATE public.jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+        last_error = 'Bail expiré : le worker ne répond plus.',
+        locked_at = NULL, locked_by = NULL, updated_at = now()
+    WHERE status = 'running' AND locked_at < now() - make_interval(secs => $1)
+"""
+PURGE_COMPLETED_JOBS_SQL = """
+    DELETE FROM public.jobs WHERE status = 'completed' AND completed_at < now() - make_interval(days => $1)
+"""
+QUEUE_STATS_SQL = """
+    SELECT kind, status, count(*) AS jobs,
+           coalesce(extract(epoch FROM now() - min(run_at) FILTER (WHERE status = 'pending' AND run_at <= now())), 0) AS lag
+    FROM public.jobs
+    WHERE status <> 'completed'
+    GROUP BY kind, status
+"""
+
+jobs_processed = metrics.counter("jobs_processed_total", "Tâches exécutées, par type et par issue (completed, retried, dead).")
+jobs_duration = metrics.counter("jobs_duration_seconds_total", "Durée cumulée d'exécution des tâches, par type.")
+jobs_depth = metrics.gauge("jobs_queue_depth", "Tâches en file, par type et par statut (pending, running, dead).")
+jobs_lag = metrics.gauge("jobs_queue_lag_seconds", "Attente de la plus ancienne tâche prête et non démarrée, par type.")
+
+
+class PermanentJobError(Exception):
+    """Échec qu'un nouvel essai ne corrigera pas : la tâche passe directement en file morte."""
+
+
+class Job:
+    """Tâche réservée par un worker, transmise à son handler."""
+
+    def __init__(self, row, worker_id: str):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.payload = json.loads(row["payload"])
+        self.user_id = row["user_id"]
+        self.attempts = row["attempts"]
+        self.max_attempts = row["max_attempts"]
+        self.run_at = row["run_at"]
+        self.worker_id = worker_id
+
+    async def report_progress(self, **progress):
+        """Publie l'avancement d'une tâche longue ; prolonge aussi son bail."""
+        async with database.as_service() as connection:
+            await connection.execute(PROGRESS_JOB_SQL, self.id, self.worker_id, json.dumps(progress, default=str))
+
+    async def require_admin(self):
+        """
+        Vérifie, au moment de l'exécution, que la tâche a été inscrite par un
+        administrateur : une tâche réservée aux administrateurs ne se fie pas au
+        seul contrôle fait à l'inscription (droit retiré entre-temps, tâche écrite
+        par un autre chemin que l'endpoint d'administration).
+        """
+        async with database.as_service(readonly=True) as connection:
+            is_admin = self.user_id is not None and await connection.fetchval(ENQUEUER_IS_ADMIN_SQL, self.user_id)
+        if not is_admin:
+            raise PermanentJobError(f"Tâche {self.kind} inscrite par {self.user_id}, qui n'est pas administrateur")
+
+
+class JobQueue:
+    """
+    File de tâches durable dans la table `public.jobs`, traitée par `workers`
+    coroutines sur la boucle d'événements de l'application.
+
+    Chaque worker réserve une tâche (`FOR UPDATE SKIP LOCKED`), exécute le handler
+    enregistré pour son type, puis la marque terminée. Un échec est réessayé après
+    un délai exponentiel (avec gigue) jusqu'à `max_attempts`, puis la tâche passe
+    en statut `dead`. Les workers sont réveillés par `NOTIFY jobs` et, à défaut,
+    sondent la table toutes les `poll_interval` secondes.
+
+    Les handlers peuvent être exécutés plus d'une fois (bail expiré, arrêt brutal) :
+    ils doivent être idempotents.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        poll_interval: float,
+        lease: float,
+        backoff_base: float,
+        backoff_max: float,
+        retention_days: int,
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention_days = retention_days
+        self.handlers = {}
+        self._tasks = []
+        self._listener = None
+        self._wakeup = None
+
+    def handler(self, kind: str):
+        """Décorateur : enregistre la coroutine `fn(job)` qui traite les tâches `kind`."""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    async def enqueue(self, connection, kind: str, payload: dict):
+        """Inscrit une tâche dans la transaction en cours de `connection` (rôle authenticated)."""
+        return await connection.fetchval(ENQUEUE_JOB_SQL, kind, json.dumps(payload, default=str))
+
+    async def enqueue_many(self, connection, kind: str, payloads, user_ids):
+        """Inscrit plusieurs tâches dans la transaction en cours (rôle service_role) ; renvoie leurs identifiants."""
+        rows = await connection.fetch(
+            INSERT_JOBS_SQL, kind, [json.dumps(payload, default=str) for payload in payloads], list(user_ids)
+        )
+        return [row["id"] for row in rows]
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1)
+
+    async def start(self):
+        if database.pool is None:
+            logger.warning("File de tâches inactive : DATABASE_URL n'est pas défini, aucune tâche n'est inscrite ni traitée.")
+            return
+        if self.workers <= 0:
+            logger.info("JOBS_WORKERS=0 : les tâches inscrites par cette instance sont traitées par d'autres instances.")
+            return
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        # Connexion dédiée, hors du pool : elle reste ouverte tant que l'application tourne
+        self._listener = await asyncpg.connect(database.dsn)
+        await self._listener.add_listener("jobs", self._notified)
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._work(f"{prefix}:{index}")) for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    def _notified(self, connection, pid, channel, payload):
+        self._wakeup.set()
+
+    async def _work(self, worker_id: str):
+        while True:
+            # Effacé avant la réservation : une notification reçue entre-temps n'est pas perdue
+            self._wakeup.clear()
+            try:
+                async with database.as_service() as connection:
+                    row = await connection.fetchrow(CLAIM_JOB_SQL, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Réservation d'une tâche impossible")
+                row = None
+            if row is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(Job(row, worker_id))
+
+    async def _run(self, job: Job):
+        started = time.monotonic()
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise PermanentJobError(f"Aucun handler pour le type de tâche {job.kind}")
+            await handler(job)
+        except asyncio.CancelledError:
+            # Arrêt de l'application : la tâche est rendue à la file pour un autre worker
+            await self._finish(RELEASE_JOB_SQL, job.id, job.worker_id)
+            raise
+        except Exception as e:
+            logger.exception("Échec de la tâche %s (%s), essai %s/%s", job.id, job.kind, job.attempts, job.max_attempts)
+            status = await self._finish(
+                FAIL_JOB_SQL,
+                job.id,
+                job.worker_id,
+                isinstance(e, PermanentJobError),
+                self.backoff(job.attempts),
+                f"{type(e).__name__}: {e}",
+            )
+            jobs_processed.inc(kind=job.kind, outcome="dead" if status == "dead" else "retried")
+        else:
+            await self._finish(COMPLETE_JOB_SQL, job.id, job.worker_id)
+            jobs_processed.inc(kind=job.kind, outcome="completed")
+        finally:
+            jobs_duration.inc(time.monotonic() - started, kind=job.kind)
+
+    async def _finish(self, query: str, *args):
+        async with database.as_service() as connection:
+            return await connection.fetchval(query, *args)
+
+    async def _maintain(self):
+        """Remise en file des bails expirés et purge des tâches terminées anciennes."""
+        while True:
+            try:
+                async with database.as_service() as connection:
+                    await connection.execute(REQUEUE_STALE_JOBS_SQL, self.lease)
+                    await connection.execute(PURGE_COMPLETED_JOBS_SQL, self.retention_days)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Maintenance de la file de tâches impossible")
+            await asyncio.sleep(min(self.lease, 60))
+
+    async def collect_metrics(self):
+        """Met à jour les jauges de profondeur et de retard de la file (appelé à chaque lecture de /metrics)."""
+        async with database.as_service() as connection:
+            rows = await connection.fetch(QUEUE_STATS_SQL)
+        jobs_depth.clear()
+        jobs_lag.clear()
+        for row in rows:
+            jobs_depth.set(row["jobs"], kind=row["kind"], status=row["status"])
+            if row["status"] == "pending":
+                jobs_lag.set(float(row["lag"]), kind=row["kind"])
+
+
+job_queue = JobQueue(
+    JOBS_WORKERS,
+    JOBS_POLL_INTERVAL_SECONDS,
+    JOBS_LEASE_SECONDS,
+    JOBS_BACKOFF_BASE_SECONDS,
+    JOBS_BACKOFF_MAX_SECONDS,
+    JOBS_RETENTION_DAYS,
+)
@@ -0,0 +1,71 @@
+import threading
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """
+    Compteur ou jauge, avec une valeur par combinaison d'étiquettes.
+    Les endpoints synchrones l'alimentent depuis le pool de threads : les mises à
+    jour sont protégées par un verrou.
+    """
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Registry:
+    """Métriques de l'application, exposées au format texte de Prometheus sur /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, name: str, kind: str, help: str) -> Metric:
+        if name not in self._metrics:
+            self._metrics[name] = Metric(name, kind, help)
+        return self._metrics[name]
+
+    def counter(self, name: str, help: str) -> Metric:
+        return self._register(name, "counter", help)
+
+    def gauge(self, name: str, help: str) -> Metric:
+        return self._register(name, "gauge", help)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.samples():
+                if labels:
+                    formatted = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                    lines.append(f"{metric.name}{{{formatted}}} {value}")
+                else:
+                    lines.append(f"{metric.name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Registry()
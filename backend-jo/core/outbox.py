@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+
+import asyncpg
+import httpx
+
+from .config import (
+    OUTBOX_SINKS,
+    OUTBOX_JSONL_PATH,
+    OUTBOX_WEBHOOK_URL,
+    OUTBOX_WEBHOOK_SECRET,
+    OUTBOX_WEBHOOK_TIMEOUT_SECONDS,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_INTERVAL_SECONDS,
+    OUTBOX_RETENTION_DAYS,
+)
+from .database import database
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lot d'événements en attente, dans l'ordre. SKIP LOCKED : plusieurs instances du
+# backend peuvent relayer en parallèle sans se bloquer ; l'ordre n'est alors
+# garanti qu'à l'intérieur d'un lot.
+CLAIM_OUTBOX_SQL = """
+    SELECT id, event_type, aggregate_id, payload, created_at
+    FROM public.outbox
+    WHERE delivered_at IS NULL
+    ORDER BY id
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+"""
+MARK_DELIVERED_SQL = "UPDATE public.outbox SET delivered_at = now() WHERE id = ANY($1::uuid[])"
+PURGE_DELIVERED_SQL = """
+    DELETE FROM public.outbox WHERE delivered_at IS NOT NULL AND delivered_at < now() - make_interval(days => $1)
+"""
+OUTBOX_STATS_SQL = """
+    SELECT count(*) AS pending, coalesce(extract(epoch FROM now() - min(created_at)), 0) AS lag
+    FROM public.outbox
+    WHERE delivered_at IS NULL
+"""
+
+outbox_published = metrics.counter("outbox_events_published_total", "Événements publiés, par sink.")
+outbox_failures = metrics.counter("outbox_publish_failures_total", "Échecs de publication d'un lot, par sink.")
+outbox_pending = metrics.gauge("outbox_pending_events", "Événements en attente de publication.")
+outbox_lag = metrics.gauge("outbox_lag_seconds", "Âge du plus ancien événement en attente de publication.")
+
+
+def serialize_event(row) -> dict:
+    return {
+        "id": str(row["id"]),
+        "type": row["event_type"],
+        "aggregate_id": str(row["aggregate_id"]),
+        "occurred_at": row["created_at"].isoformat(),
+        "data": json.loads(row["payload"]),
+    }
+
+
+class JsonlSink:
+    """Ajoute chaque événement, sur une ligne JSON, au fichier `path`."""
+
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            # Le lot n'est marqué livré qu'une fois sur disque
+            os.fsync(f.fileno())
+
+    async def publish(self, events):
+        lines = [json.dumps(event, ensure_ascii=False) + "\n" for event in events]
+        await asyncio.to_thread(self._write, lines)
+
+    async def close(self):
+        pass
+
+
+class WebhookSink:
+    """
+    Envoie chaque lot en une requête POST (tableau JSON d'événements). Avec un
+    secret, le corps est signé (HMAC-SHA256) dans l'en-tête X-Outbox-Signature.
+    Toute réponse hors 2xx fait échouer le lot, qui sera renvoyé.
+    """
+
+    name = "webhook"
+
+    def __init__(self, url: str, secret=None, timeout: float = 10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.client = None
+
+    async def publish(self, events):
+        body = json.dumps(events, ensure_ascii=False).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Outbox-Signature"] = f"sha256={signature}"
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self.client.post(self.url, content=body, headers=headers)
+        response.raise_for_status()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class OutboxRelay:
+    """
+    Relais de la table `public.outbox` vers les sinks, sur la boucle d'événements
+    de l'application.
+
+    Les événements sont lus par lots de `batch_size`, publiés sur chaque sink, puis
+    marqués livrés dans la même transaction. Tant que les lots sont pleins, le
+    relais enchaîne sans attendre ; sinon il attend `NOTIFY outbox` ou, à défaut,
+    `poll_interval` secondes. Un sink en échec bloque la file (l'ordre est
+    conservé) et le lot est retenté avec un délai croissant.
+
+    La livraison est « au moins une fois » : un lot publié sur un sink puis
+    retenté (échec d'un autre sink, arrêt) est publié à nouveau. Les
+    consommateurs dédoublonnent sur `id`.
+    """
+
+    def __init__(self, sinks, batch_size: int, poll_interval: float, retention_days: int, max_backoff: float = 30):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.max_backoff = max_backoff
+        self._tasks = []
+        self._listener = None
+        self._wakeup = None
+
+    async def start(self):
+        if not self.sinks or database.pool is None or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._listener = await asyncpg.connect(database.dsn)
+        await self._listener.add_listener("outbox", self._notified)
+        self._tasks = [asyncio.create_task(self._relay()), asyncio.create_task(self._maintain())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        for sink in self.sinks:
+            await sink.close()
+
+    def _notified(self, connection, pid, channel, payload):
+        self._wakeup.set()
+
+    async def relay_batch(self) -> int:
+        """Publie un lot d'événements en attente ; renvoie le nombre d'événements publiés."""
+        async with database.as_service() as connection:
+            rows = await connection.fetch(CLAIM_OUTBOX_SQL, self.batch_size)
+            if not rows:
+                return 0
+            events = [serialize_event(row) for row in rows]
+            for sink in self.sinks:
+                try:
+                    await sink.publish(events)
+                except Exception:
+                    outbox_failures.inc(sink=sink.name)
+                    raise
+                outbox_published.inc(len(events), sink=sink.name)
+            await connection.execute(MARK_DELIVERED_SQL, [row["id"] for row in rows])
+        return len(rows)
+
+    async def _relay(self):
+        failures = 0
+        while True:
+            # Effacé avant la lecture : une notification reçue entre-temps n'est pas perdue
+            self._wakeup.clear()
+            try:
+                published = await self.relay_batch()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failures += 1
+                logger.exception("Publication des événements de l'outbox impossible (échec %s)", failures)
+                await asyncio.sleep(min(self.max_backoff, 0.5 * 2 ** failures))
+                continue
+            if published < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _maintain(self):
+        """Purge des événements livrés anciens."""
+        while True:
+            try:
+                async with database.as_service() as connection:
+                    await connection.execute(PURGE_DELIVERED_SQL, self.retention_days)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Purge de l'outbox impossible")
+            await asyncio.sleep(3600)
+
+    async def collect_metrics(self):
+        """Met à jour les jauges d'attente et de retard de l'outbox (appelé à chaque lecture de /metrics)."""
+        async with database.as_service() as connection:
+            row = await connection.fetchrow(OUTBOX_STATS_SQL)
+        outbox_pending.set(row["pending"])
+        outbox_lag.set(float(row["lag"]))
+
+
+def create_sinks(names):
+    sinks = []
+    for name in names:
+        if name == JsonlSink.name:
+            sinks.append(JsonlSink(OUTBOX_JSONL_PATH))
+        elif name == WebhookSink.name:
+            if not OUTBOX_WEBHOOK_URL:
+                raise ValueError("OUTBOX_WEBHOOK_URL doit être défini pour le sink webhook")
+            sinks.append(WebhookSink(OUTBOX_WEBHOOK_URL, OUTBOX_WEBHOOK_SECRET, OUTBOX_WEBHOOK_TIMEOUT_SECONDS))
+        else:
+            raise ValueError(f"Sink d'outbox inconnu : {name}")
+    return sinks
+
+
+outbox_relay = OutboxRelay(
+    create_sinks(OUTBOX_SINKS), OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL_SECONDS, OUTBOX_RETENTION_DAYS
+)
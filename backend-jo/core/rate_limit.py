@@ -0,0 +1,165 @@
+import logging
+import math
+import threading
+import time
+
+from fastapi import HTTPException, Request
+
+from .config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_TRUST_FORWARDED_FOR,
+    RATE_LIMIT_GLOBAL,
+    RATE_LIMIT_ROUTES,
+    RATE_LIMIT_FAIL_OPEN,
+    SUPABASE_JWT_SECRET,
+    WEB_CONCURRENCY,
+)
+from .claims import verified_subject
+from .supabase_client import service_client
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(rate: str):
+    """Convertit "10/60" en (capacité, jetons rechargés par seconde)."""
+    count, seconds = rate.split("/")
+    capacity = float(count)
+    return capacity, capacity / float(seconds)
+
+
+class MemoryBackend:
+    """Seaux de jetons en mémoire, propres à chaque processus."""
+
+    SWEEP_EVERY = 10_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # clé -> [jetons, horodatage, capacité, débit]
+        self._takes = 0
+
+    def take(self, buckets):
+        """
+        Prélève `cost` jetons dans chaque seau (clé, capacité, débit, coût), tout ou rien.
+        Renvoie 0 si la requête est admise, sinon le nombre de secondes à attendre.
+        """
+        now = time.monotonic()
+        with self._lock:
+            retry_after = 0.0
+            states = []
+            for key, capacity, refill_rate, cost in buckets:
+                state = self._buckets.get(key)
+                if state is None:
+                    state = self._buckets[key] = [capacity, now, capacity, refill_rate]
+                state[0] = min(capacity, state[0] + (now - state[1]) * refill_rate)
+                state[1] = now
+                if state[0] < cost:
+                    retry_after = max(retry_after, (cost - state[0]) / refill_rate)
+                states.append((state, cost))
+            if retry_after == 0:
+                for state, cost in states:
+                    state[0] -= cost
+            self._takes += 1
+            if self._takes % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+        return retry_after
+
+    def _sweep(self, now):
+        # Un seau qui s'est entièrement rechargé équivaut à un seau absent
+        self._buckets = {
+            key: state for key, state in self._buckets.items()
+            if state[0] + (now - state[1]) * state[3] < state[2]
+        }
+
+
+class PostgresBackend:
+    """Seaux partagés entre les workers, stockés dans la table `rate_limit_buckets`."""
+
+    def take(self, buckets):
+        keys, capacities, refill_rates, costs = (list(column) for column in zip(*buckets))
+        response = service_client.rpc('rate_limit_take', {
+            'p_keys': keys,
+            'p_capacities': capacities,
+            'p_refill_rates': refill_rates,
+            'p_costs': costs,
+        }).execute()
+        return float(response.data or 0)
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "postgres":
+        if service_client is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=postgres nécessite SUPABASE_SERVICE_ROLE_KEY.")
+        return PostgresBackend()
+    if WEB_CONCURRENCY > 1:
+        # Un seau par processus multiplierait chaque limite par le nombre de workers
+        raise RuntimeError("RATE_LIMIT_BACKEND=memory ne fonctionne qu'avec un seul worker : utilisez RATE_LIMIT_BACKEND=postgres.")
+    return MemoryBackend()
+
+
+backend = _create_backend()
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(route: str):
+    """
+    Dépendance FastAPI appliquant les limites configurées pour `route` : seaux par
+    IP, par utilisateur et global. Déclarée dans `dependencies=[...]` du décorateur,
+    elle s'exécute avant l'authentification pour rejeter les abus au plus tôt.
+    """
+    rule = RATE_LIMIT_ROUTES[route]
+    cost = rule["cost"]
+    global_capacity, global_rate = parse_rate(RATE_LIMIT_GLOBAL)
+    per_ip = parse_rate(rule["per_ip"]) if rule.get("per_ip") else None
+    per_user = parse_rate(rule["per_user"]) if rule.get("per_user") else None
+    if per_user and RATE_LIMIT_ENABLED and not SUPABASE_JWT_SECRET:
+        # Sans secret, aucun jeton ne peut être vérifié : la règle par utilisateur ne s'appliquerait jamais
+        logger.warning(
+            "Limite par utilisateur de la route %s ignorée : SUPABASE_JWT_SECRET n'est pas défini, "
+            "seuls les seaux par IP et global s'appliquent.",
+            route,
+        )
+
+    def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        # Les seaux par IP et par utilisateur comptent des requêtes ; le seau global
+        # compte le coût pondéré de la route.
+        buckets = [("global", global_capacity, global_rate, cost)]
+        if per_ip:
+            buckets.append((f"{route}:ip:{client_ip(request)}", per_ip[0], per_ip[1], 1.0))
+        if per_user:
+            # Jeton vérifié : un jeton forgé au nom d'un autre utilisateur ne vide pas son
+            # seau ; sans jeton valide, seuls les seaux par IP et global s'appliquent
+            subject = verified_subject(request)
+            if subject:
+                buckets.append((f"{route}:user:{subject}", per_user[0], per_user[1], 1.0))
+
+        try:
+            retry_after = backend.take(buckets)
+        except Exception:
+            # Stockage des seaux indisponible : RATE_LIMIT_FAIL_OPEN choisit entre
+            # admettre la requête sans limite et la refuser
+            logger.exception("Limitation de débit indisponible pour %s", route)
+            if RATE_LIMIT_FAIL_OPEN:
+                return
+            raise HTTPException(
+                status_code=503,
+                detail="Service momentanément indisponible, veuillez réessayer plus tard.",
+                headers={"Retry-After": "1"},
+            )
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Trop de requêtes, veuillez réessayer plus tard.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return dependency
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import contextvars
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+
+from supabase import create_client, Client
+
+from .claims import verified_subject
+from .config import (
+    SUPABASE_READ_URLS,
+    SUPABASE_KEY,
+    SUPABASE_JWT_SECRET,
+    READ_YOUR_WRITES_SECONDS,
+    READ_YOUR_WRITES_COOKIE,
+)
+from .supabase_client import supabase_client
+
+# Écritures de la requête en cours : user_id -> (horodatage Unix, lsn ou None).
+# Renseigné par `WriteTracker.mark`, renvoyé au client par `read_your_writes_middleware`
+_request_writes = contextvars.ContextVar("request_writes", default=None)
+
+
+class WriteTracker:
+    """
+    Dernière écriture de chaque utilisateur, propre au processus : horodatage et,
+    pour les écritures passées par le pool asyncpg, LSN du primaire après commit.
+
+    Tant que l'écriture date de moins de `window` secondes, les lectures de cet
+    utilisateur ne vont sur un réplica que si celui-ci a rejoué ce LSN ; sans LSN
+    (écriture via PostgREST), elles restent sur le primaire.
+
+    Le suivi en mémoire ne voit que les écritures de ce processus : les autres
+    workers et instances les apprennent par le cookie que pose
+    `read_your_writes_middleware`, rechargé ici par `restore`.
+    """
+
+    SWEEP_EVERY = 10_000
+
+    def __init__(self, window: float):
+        self.window = window
+        self._lock = threading.Lock()
+        self._writes = {}  # user_id -> (horodatage, lsn ou None)
+        self._marks = 0
+
+    def mark(self, user_id, lsn=None):
+        now = time.monotonic()
+        request_writes = _request_writes.get()
+        if request_writes is not None:
+            request_writes[str(user_id)] = (time.time(), lsn)
+        with self._lock:
+            self._writes[str(user_id)] = (now, lsn)
+            self._marks += 1
+            if self._marks % self.SWEEP_EVERY == 0:
+                self._writes = {
+                    key: write for key, write in self._writes.items() if now - write[0] < self.window
+                }
+
+    def propagate(self, user_id):
+        """
+        Ajoute au cookie de la requête en cours l'écriture récente de l'utilisateur
+        enregistrée par ce processus hors de son contexte (lot écrit par un autre appelant).
+        """
+        request_writes = _request_writes.get()
+        write = self.last_write(user_id)
+        if request_writes is not None and write is not None:
+            request_writes[str(user_id)] = (time.time() - (time.monotonic() - write[0]), write[1])
+
+    def restore(self, user_id, written_at: float, lsn=None):
+        """Reprend une écriture faite par un autre processus, datée par son horodatage Unix."""
+        age = time.time() - written_at
+        if not 0 <= age < self.window:
+            return
+        written = time.monotonic() - age
+        with self._lock:
+            current = self._writes.get(str(user_id))
+            if current is None or current[0] < written:
+                self._writes[str(user_id)] = (written, lsn)
+
+    def last_write(self, user_id):
+        """(horodatage, lsn) de l'écriture récente de l'utilisateur, ou None."""
+        if user_id is None:
+            return None
+        write = self._writes.get(str(user_id))
+        if write is None or time.monotonic() - write[0] >= self.window:
+            return None
+        return write
+
+
+write_tracker = WriteTracker(READ_YOUR_WRITES_SECONDS)
+
+read_clients: list[Client] = [create_client(url, SUPABASE_KEY) for url in SUPABASE_READ_URLS] if SUPABASE_KEY else []
+_next_read_client = itertools.cycle(read_clients)
+
+
+def read_client(user_id=None) -> Client | None:
+    """
+    Client PostgREST pour une lecture : un réplica à tour de rôle, ou le primaire
+    si aucun réplica n'est configuré ou si l'utilisateur vient d'écrire.
+    """
+    if not read_clients or write_tracker.last_write(user_id) is not None:
+        return supabase_client
+    return next(_next_read_client)
+
+
+def _sign(payload: str) -> str:
+    key = hashlib.sha256(b"read-your-writes:" + SUPABASE_JWT_SECRET.encode()).digest()
+    return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def encode_write_position(user_id, written_at: float, lsn=None) -> str:
+    """Valeur du cookie : dernière écriture de l'utilisateur, encodée puis signée."""
+    document = json.dumps([str(user_id), written_at, lsn], separators=(",", ":"))
+    # Sans le remplissage `=`, que le cookie devrait mettre entre guillemets
+    payload = base64.urlsafe_b64encode(document.encode()).decode().rstrip("=")
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_write_position(value: str):
+    """(user_id, horodatage Unix, lsn) d'un cookie dont la signature est valide, sinon None."""
+    payload, _, signature = value.rpartition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        user_id, written_at, lsn = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return str(user_id), float(written_at), lsn
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+async def read_your_writes_middleware(request, call_next):
+    """
+    Transmet la dernière écriture de l'utilisateur d'une requête à l'autre, quel
+    que soit le worker ou l'instance qui les sert. Le cookie reçu est rechargé
+    dans le suivi local ; une requête au cours de laquelle l'utilisateur du
+    jeton a écrit renvoie un cookie à jour, valable `window` secondes.
+
+    Le cookie est signé et ne porte que l'écriture de l'utilisateur authentifié
+    (pas celles des autres commandes d'un même lot). Actif seulement si
+    SUPABASE_JWT_SECRET est défini ; sinon le suivi reste propre à chaque processus.
+    """
+    if not SUPABASE_JWT_SECRET:
+        return await call_next(request)
+    received = decode_write_position(request.cookies.get(READ_YOUR_WRITES_COOKIE, ""))
+    if received is not None:
+        write_tracker.restore(*received)
+
+    request_writes = {}
+    token = _request_writes.set(request_writes)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_writes.reset(token)
+    user_id = verified_subject(request) if request_writes else None
+    if user_id in request_writes:
+        written_at, lsn = request_writes[user_id]
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            encode_write_position(user_id, written_at, lsn),
+            max_age=int(write_tracker.window) + 1,
+            httponly=True,
+            secure=True,
+            samesite="none",
+        )
+    return response
@@ -0,0 +1,79 @@
+import threading
+
+from .config import SINGLEFLIGHT_MAX_WAITERS, SINGLEFLIGHT_TIMEOUT_SECONDS
+
+
+class SingleFlightOverloaded(Exception):
+    """Trop de requêtes attendent déjà le résultat de cet appel."""
+
+
+class SingleFlightTimeout(Exception):
+    """Le résultat de l'appel en cours n'est pas arrivé à temps."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents identiques en un seul appel amont.
+
+    Le premier appelant d'une clé exécute la fonction ; ceux qui arrivent pendant
+    son exécution attendent et reçoivent le même résultat (ou la même exception).
+    Rien n'est conservé une fois l'appel terminé : ce n'est pas un cache.
+
+    Les endpoints synchrones de FastAPI s'exécutant dans un pool de threads, la
+    synchronisation repose sur `threading`.
+    """
+
+    def __init__(self, max_waiters: int = SINGLEFLIGHT_MAX_WAITERS, timeout: float = SINGLEFLIGHT_TIMEOUT_SECONDS):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            elif call.waiters >= self.max_waiters:
+                raise SingleFlightOverloaded(key)
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(self.timeout):
+            raise SingleFlightTimeout(key)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def forget(self, key):
+        """Détache l'appel en cours : les appelants suivants relanceront une requête amont."""
+        with self._lock:
+            self._calls.pop(key, None)
+
+
+# Instance partagée par les lectures de l'API ; les clés sont préfixées par ressource.
+single_flight = SingleFlight()
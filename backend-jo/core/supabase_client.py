@@ -1,5 +1,5 @@
 from supabase import create_client, Client
-from .config import SUPABASE_URL, SUPABASE_KEY
+from .config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_ROLE_KEY
 
 supabase_client: Client | None = None
 
@@ -7,3 +7,9 @@ if SUPABASE_URL and SUPABASE_KEY:
     supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
 else:
     print("Erreur: SUPABASE_URL et SUPABASE_KEY doivent être définis dans le fichier .env")
+
+# Client service_role pour les opérations internes (limitation de débit partagée, etc.)
+service_client: Client | None = None
+
+if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
+    service_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
@@ -0,0 +1,89 @@
+import codecs
+import csv
+import json
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+UPLOAD_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def upload_format(request: Request, format=None) -> str:
+    """Format d'un envoi : paramètre `format` explicite, sinon déduit du Content-Type."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    format = format or UPLOAD_CONTENT_TYPES.get(content_type)
+    if format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Format non reconnu : envoyez du CSV (text/csv) ou du NDJSON (application/x-ndjson).",
+        )
+    return format
+
+
+async def upload_lines(request: Request):
+    """Lignes du corps de la requête, décodées au fil de la réception."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def csv_records(lines):
+    """
+    Dictionnaires colonne -> valeur d'un CSV dont la première ligne nomme les
+    colonnes ; les cellules vides sont omises. Une ligne mal formée donne une
+    ValueError à la place de son dictionnaire.
+    """
+    header = None
+    buffer = ""
+    async for line in lines:
+        buffer += line
+        # Un nombre impair de guillemets : champ entre guillemets qui continue sur la ligne suivante
+        if buffer.count('"') % 2:
+            continue
+        record = next(csv.reader([buffer]), [])
+        buffer = ""
+        if not any(field.strip() for field in record):
+            continue
+        if header is None:
+            header = [field.strip() for field in record]
+            continue
+        if len(record) != len(header):
+            yield ValueError(f"{len(record)} colonnes au lieu de {len(header)}")
+            continue
+        yield {key: value for key, value in zip(header, record) if value != ""}
+
+
+async def ndjson_records(lines):
+    """Un objet JSON par ligne ; une ligne invalide donne une ValueError à la place de l'objet."""
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"JSON invalide : {e.msg}")
+            continue
+        yield record if isinstance(record, dict) else ValueError("La ligne doit être un objet JSON.")
+
+
+def upload_records(request: Request, format: str):
+    """Lignes de données d'un envoi CSV ou NDJSON, lues au fil de la réception."""
+    records = csv_records if format == "csv" else ndjson_records
+    return records(upload_lines(request))
+
+
+def validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'ligne'} : {e['msg']}" for e in error.errors())
+    return str(error)
@@ -0,0 +1,154 @@
+import math
+import threading
+import time
+
+from jose import JWTError, jwt
+
+from .config import (
+    WAITING_ROOM_ENABLED,
+    WAITING_ROOM_BACKEND,
+    WAITING_ROOM_SECRET,
+    WAITING_ROOM_ADMIT_PER_SECOND,
+    WAITING_ROOM_QUEUE_TOKEN_TTL_SECONDS,
+    WAITING_ROOM_ADMISSION_TTL_SECONDS,
+    WEB_CONCURRENCY,
+)
+from .supabase_client import service_client
+
+ALGORITHM = "HS256"
+
+
+class InvalidQueueToken(Exception):
+    """Jeton de file d'attente ou d'admission absent, invalide ou expiré."""
+
+
+class MemoryQueue:
+    """
+    File d'attente propre au processus. Chaque client reçoit un numéro croissant et
+    le front d'admission avance au débit configuré, sans jamais dépasser le
+    dernier numéro attribué. Aucun état n'est conservé par client.
+    """
+
+    def __init__(self, admit_per_second: float):
+        self.admit_per_second = admit_per_second
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._admitted = 0.0
+        self._anchored_at = time.monotonic()
+
+    def _advance(self, now):
+        self._admitted = min(self._issued, self._admitted + (now - self._anchored_at) * self.admit_per_second)
+        self._anchored_at = now
+
+    def join(self) -> int:
+        with self._lock:
+            self._advance(time.monotonic())
+            self._issued += 1
+            return self._issued
+
+    def frontier(self) -> float:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._admitted
+
+
+class PostgresQueue:
+    """
+    File partagée entre les workers (séquence et table `waiting_room_state`).
+    Le front est lu au plus une fois par seconde et par worker, puis extrapolé
+    localement : les sondages de position ne sollicitent pas la base.
+    """
+
+    SNAPSHOT_TTL = 1.0
+
+    def __init__(self, admit_per_second: float):
+        self.admit_per_second = admit_per_second
+        self._lock = threading.Lock()
+        self._snapshot = None  # (dernier numéro, front, instant de lecture)
+
+    def _refresh(self):
+        response = service_client.rpc('waiting_room_frontier', {
+            'p_admit_per_second': self.admit_per_second,
+        }).execute()
+        row = response.data[0]
+        self._snapshot = (row['issued'], row['admitted'], time.monotonic())
+
+    def join(self) -> int:
+        # Rafraîchir le front avant d'attribuer un numéro ré-ancre l'état partagé
+        # après une période calme : la vague suivante ne passe pas d'un coup.
+        self.frontier()
+        return service_client.rpc('waiting_room_join', {}).execute().data
+
+    def frontier(self) -> float:
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._snapshot[2] > self.SNAPSHOT_TTL:
+                self._refresh()
+            issued, admitted, read_at = self._snapshot
+        # Les numéros attribués depuis la lecture ne sont pas connus ici : le front
+        # extrapolé est plafonné par `issued` au prochain rafraîchissement.
+        return admitted + (time.monotonic() - read_at) * self.admit_per_second
+
+
+def _create_queue():
+    if not WAITING_ROOM_ENABLED:
+        return None
+    if not WAITING_ROOM_SECRET:
+        raise RuntimeError("WAITING_ROOM_ENABLED=true nécessite WAITING_ROOM_SECRET.")
+    if WAITING_ROOM_BACKEND == "postgres":
+        if service_client is None:
+            raise RuntimeError("WAITING_ROOM_BACKEND=postgres nécessite SUPABASE_SERVICE_ROLE_KEY.")
+        return PostgresQueue(WAITING_ROOM_ADMIT_PER_SECOND)
+    if WEB_CONCURRENCY > 1:
+        # Chaque processus aurait sa propre file et sa propre frontière d'admission
+        raise RuntimeError("WAITING_ROOM_BACKEND=memory ne fonctionne qu'avec un seul worker : utilisez WAITING_ROOM_BACKEND=postgres.")
+    return MemoryQueue(WAITING_ROOM_ADMIT_PER_SECOND)
+
+
+queue = _create_queue()
+
+
+def _encode(claims: dict, ttl_seconds: int) -> str:
+    now = int(time.time())
+    return jwt.encode({**claims, "iat": now, "exp": now + ttl_seconds}, WAITING_ROOM_SECRET, algorithm=ALGORITHM)
+
+
+def _decode(token: str, expected_type: str) -> dict:
+    try:
+        claims = jwt.decode(token, WAITING_ROOM_SECRET, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise InvalidQueueToken(str(e))
+    if claims.get("typ") != expected_type:
+        raise InvalidQueueToken("Type de jeton inattendu.")
+    return claims
+
+
+def join(user_id: str) -> str:
+    """Place l'utilisateur dans la file et renvoie son jeton de position signé."""
+    number = queue.join()
+    return _encode({"typ": "queue", "sub": user_id, "n": number}, WAITING_ROOM_QUEUE_TOKEN_TTL_SECONDS)
+
+
+def status(queue_token: str) -> dict:
+    """
+    Position courante d'un jeton de file. Une fois le client admis, la réponse
+    contient un jeton d'admission à présenter au checkout.
+    """
+    claims = _decode(queue_token, "queue")
+    position = max(0, claims["n"] - math.floor(queue.frontier()))
+    result = {
+        "position": position,
+        "estimated_wait_seconds": math.ceil(position / WAITING_ROOM_ADMIT_PER_SECOND),
+        "admitted": position == 0,
+        "admission_token": None,
+    }
+    if position == 0:
+        result["admission_token"] = _encode(
+            {"typ": "admission", "sub": claims["sub"]}, WAITING_ROOM_ADMISSION_TTL_SECONDS
+        )
+    return result
+
+
+def verify_admission(admission_token: str, user_id: str) -> None:
+    claims = _decode(admission_token, "admission")
+    if claims.get("sub") != user_id:
+        raise InvalidQueueToken("Jeton d'admission émis pour un autre utilisateur.")
@@ -1,11 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from api.v1.api import api_router as api_router_v1
+from core.database import database
+from core.jobs import job_queue
+from core.outbox import outbox_relay
+from core.metrics import metrics
+from core.replicas import read_your_writes_middleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Le pool asyncpg n'est ouvert que si DATABASE_URL est défini
+    await database.connect()
+    # Les workers de la file de tâches et le relais de l'outbox ont besoin du pool
+    await job_queue.start()
+    await outbox_relay.start()
+    yield
+    await outbox_relay.stop()
+    await job_queue.stop()
+    await database.disconnect()
 
 app = FastAPI(
     title="Paris JO 2024 API",
     description="API pour la gestion des billets des Jeux Olympiques de Paris 2024",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configuration CORS
@@ -15,6 +35,9 @@ origins = [
     "https://projet-jo-2024.netlify.app", # URL du frontend déployé
 ]
 
+# Lecture de ses propres écritures sur tous les workers (cookie de dernière écriture)
+app.middleware("http")(read_your_writes_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -30,5 +53,16 @@ def read_root():
     """
     return {"message": "Bienvenue sur l'API des JO 2024"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """
+    Métriques au format texte de Prometheus (file de tâches et outbox :
+    profondeur, retard, éléments traités).
+    """
+    if database.pool is not None:
+        database.run(job_queue.collect_metrics)
+        database.run(outbox_relay.collect_metrics)
+    return metrics.render()
+
 # Inclure le routeur de l'API v1
 app.include_router(api_router_v1, prefix="/api/v1")
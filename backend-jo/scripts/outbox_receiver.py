@@ -0,0 +1,88 @@
+"""
+Récepteur local des événements de l'outbox, pour le développement et les tests
+de charge du relais (sink `webhook`).
+
+Vérifie la signature X-Outbox-Signature si un secret est donné, écarte les
+événements déjà reçus (livraison « au moins une fois ») et écrit les autres, un
+par ligne JSON, sur la sortie standard ou dans un fichier. `--fail-rate` fait
+échouer une partie des requêtes pour observer les nouvelles tentatives.
+
+Exemple (depuis `backend-jo/`) :
+
+    python scripts/outbox_receiver.py --port 8787 --secret dev-secret --out /tmp/outbox-received.jsonl
+    OUTBOX_SINKS=webhook OUTBOX_WEBHOOK_URL=http://127.0.0.1:8787/events OUTBOX_WEBHOOK_SECRET=dev-secret uvicorn main:app
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--secret", help="secret partagé (OUTBOX_WEBHOOK_SECRET) ; sans lui, la signature n'est pas vérifiée")
+    parser.add_argument("--out", help="fichier JSONL de sortie (sortie standard par défaut)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="proportion de requêtes refusées avec un 503")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+    seen = set()
+    stats = {"received": 0, "duplicates": 0, "started": time.monotonic()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if args.secret:
+                expected = "sha256=" + hmac.new(args.secret.encode(), body, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, self.headers.get("X-Outbox-Signature", "")):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+            if random.random() < args.fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            events = json.loads(body)
+            for event in events:
+                if event["id"] in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(event["id"])
+                out.write(json.dumps(event, ensure_ascii=False) + "\n")
+            out.flush()
+            stats["received"] += len(events)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *log_args):
+            elapsed = time.monotonic() - stats["started"]
+            print(
+                f"{self.command} {self.path} {log_args[1]} - {stats['received']} événements reçus "
+                f"({stats['received'] / elapsed:.0f}/s), {stats['duplicates']} doublons",
+                file=sys.stderr,
+            )
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Récepteur d'outbox sur http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
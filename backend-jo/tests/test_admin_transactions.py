@@ -0,0 +1,61 @@
+"""
+Curseurs de pagination de la liste admin des transactions.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from api.v1.endpoints.admin.transactions import decode_cursor, encode_cursor
+
+TRANSACTION_ID = uuid.UUID("01920000-0000-7000-8000-000000000001")
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2026, 10, 19, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    # Valeur renvoyée telle quelle par PostgREST
+    "2026-10-19T12:30:15.123456+00:00",
+])
+def test_created_at_cursor_round_trip(created_at):
+    cursor = encode_cursor(created_at, TRANSACTION_ID)
+    assert decode_cursor(cursor, "created_at") == (
+        datetime(2026, 10, 19, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        TRANSACTION_ID,
+    )
+
+
+@pytest.mark.parametrize("amount", [Decimal("149.90"), 149.9, "149.90"])
+def test_amount_cursor_round_trip(amount):
+    value, transaction_id = decode_cursor(encode_cursor(amount, TRANSACTION_ID), "amount")
+    assert value == Decimal("149.90")
+    assert transaction_id == TRANSACTION_ID
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("2026-10-19T12:30:15+00:00", str(TRANSACTION_ID))
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor, column", [
+    ("pas un curseur!", "created_at"),
+    (base64.urlsafe_b64encode(b"\xff\xfe").decode(), "created_at"),
+    (raw_cursor(["2026-10-19T12:30:15+00:00"]), "created_at"),
+    (raw_cursor({"value": "1", "id": str(TRANSACTION_ID)}), "amount"),
+    (raw_cursor(42), "amount"),
+    (raw_cursor(["hier", str(TRANSACTION_ID)]), "created_at"),
+    (raw_cursor(["beaucoup", str(TRANSACTION_ID)]), "amount"),
+    (raw_cursor(["149.90", "pas-un-uuid"]), "amount"),
+    (raw_cursor([None, str(TRANSACTION_ID)]), "created_at"),
+])
+def test_invalid_cursor_is_a_400(cursor, column):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, column)
+    assert error.value.status_code == 400
@@ -0,0 +1,205 @@
+"""
+Reprise d'une commande par sa clé d'idempotence sur le chemin PostgREST, dont
+les écritures (transaction, réservations, e-billets) ne sont pas atomiques.
+
+PostgREST et les fonctions `*_idempotency_key` sont simulés en mémoire.
+"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from api.v1.endpoints import checkout
+from api.v1.models.auth_models import User
+from api.v1.models.ticketing_models import CheckoutRequest
+
+OFFERS = [
+    {"id": "01920000-0000-7000-8000-0000000000a1", "price": 50.0, "cancelled_at": None},
+    {"id": "01920000-0000-7000-8000-0000000000a2", "price": 120.0, "cancelled_at": None},
+]
+BUYER = User(id=uuid.UUID("01920000-0000-7000-8000-0000000000b1"), email="ana@jo-staff.fr", first_name="Ana", last_name="Lopez")
+
+
+class Query:
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self.filters = []
+        self.rows = None
+
+    def select(self, columns="*", count=None):
+        return self
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def in_(self, column, values):
+        values = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in values)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def execute(self):
+        if self.rows is None:
+            return Response([dict(row) for row in self.store.tables[self.table] if all(f(row) for f in self.filters)])
+        if self.table in self.store.fail_inserts:
+            self.store.fail_inserts.remove(self.table)
+            raise ConnectionError(f"insertion dans {self.table} interrompue")
+        created = []
+        for row in self.rows:
+            row = {"id": str(uuid.uuid4()), **row}
+            if self.table == "reservations":
+                row["created_at"] = datetime.now(timezone.utc).isoformat()
+            self.store.tables[self.table].append(row)
+            created.append(dict(row))
+        return Response(created)
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class Rpc:
+    def __init__(self, store, name, params):
+        self.store = store
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        return Response(getattr(self.store, self.name)(**self.params))
+
+
+class FakePostgrest:
+    """Tables PostgREST en mémoire et fonctions d'idempotence, pour un seul utilisateur."""
+
+    def __init__(self):
+        self.tables = {"offers": [dict(offer) for offer in OFFERS], "transactions": [], "reservations": [], "e_tickets": []}
+        self.keys = {}
+        self.fail_inserts = set()
+        self.postgrest = self
+
+    def auth(self, token):
+        return self
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, name, params):
+        return Rpc(self, name, params)
+
+    def claim_idempotency_key(self, p_key, p_request_hash, p_ttl_seconds, p_lock_seconds):
+        key = self.keys.get(p_key)
+        lease_id = str(uuid.uuid4())
+        if key is None:
+            key = self.keys[p_key] = {"hash": p_request_hash, "status": "in_progress", "order_key": str(uuid.uuid4())}
+            taken_over = False
+        elif key["hash"] != p_request_hash:
+            return [{"outcome": "mismatch"}]
+        elif key["status"] == "completed":
+            return [{"outcome": "completed", "response_status": key["response_status"], "response_body": key["response_body"]}]
+        elif key["lease_id"] is None:
+            taken_over = True
+        else:
+            return [{"outcome": "in_progress"}]
+        key["lease_id"] = lease_id
+        return [{"outcome": "started", "lease_id": lease_id, "order_key": key["order_key"], "taken_over": taken_over}]
+
+    def complete_idempotency_key(self, p_key, p_lease_id, p_response_status, p_response_body):
+        key = self.keys[p_key]
+        if key["lease_id"] != p_lease_id:
+            return False
+        key.update(status="completed", lease_id=None, response_status=p_response_status, response_body=p_response_body)
+        return True
+
+    def release_idempotency_key(self, p_key, p_lease_id, p_forget=False):
+        if self.keys[p_key]["lease_id"] == p_lease_id:
+            if p_forget:
+                del self.keys[p_key]
+            else:
+                self.keys[p_key]["lease_id"] = None
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    fake = FakePostgrest()
+    monkeypatch.setattr(checkout, "supabase_client", fake)
+    monkeypatch.setattr(checkout.database, "pool", None)
+    return fake
+
+
+def checkout_request():
+    return CheckoutRequest(items=[
+        {"offer_id": OFFERS[0]["id"], "quantity": 2},
+        {"offer_id": OFFERS[1]["id"], "quantity": 1},
+    ])
+
+
+def process(key="cle-1"):
+    return checkout.process_checkout(checkout_request(), current_user=BUYER, token="jeton", idempotency_key=key)
+
+
+def tickets_by_reservation(postgrest):
+    return sorted(
+        (reservation["quantity"], sum(t["reservation_id"] == reservation["id"] for t in postgrest.tables["e_tickets"]))
+        for reservation in postgrest.tables["reservations"]
+    )
+
+
+@pytest.mark.parametrize("failed_table", ["reservations", "e_tickets"])
+def test_retry_completes_an_interrupted_order(postgrest, failed_table):
+    postgrest.fail_inserts.add(failed_table)
+    with pytest.raises(HTTPException) as error:
+        process()
+    assert error.value.status_code == 500
+    assert len(postgrest.tables["transactions"]) == 1
+    assert postgrest.keys["cle-1"]["status"] == "in_progress"
+
+    response = process()
+    assert response.status_code == 201
+    # Une seule commande, complète : 2 e-billets pour la première offre, 1 pour la seconde
+    assert len(postgrest.tables["transactions"]) == 1
+    assert tickets_by_reservation(postgrest) == [(1, 1), (2, 2)]
+    assert postgrest.keys["cle-1"]["status"] == "completed"
+    body = postgrest.keys["cle-1"]["response_body"]
+    assert sorted(r["id"] for r in body) == sorted(r["id"] for r in postgrest.tables["reservations"])
+
+    replay = process()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert len(postgrest.tables["e_tickets"]) == 3
+
+
+def test_failed_resume_does_not_complete_the_key(postgrest):
+    postgrest.fail_inserts.add("reservations")
+    with pytest.raises(HTTPException):
+        process()
+    postgrest.fail_inserts.add("reservations")
+    with pytest.raises(HTTPException) as error:
+        process()
+    assert error.value.status_code == 500
+    assert postgrest.keys["cle-1"]["status"] == "in_progress"
+
+    assert process().status_code == 201
+    assert tickets_by_reservation(postgrest) == [(1, 1), (2, 2)]
+
+
+def test_takeover_of_a_complete_order_writes_nothing(postgrest, monkeypatch):
+    process()
+    # La réponse n'a pas pu être enregistrée : la clé est reprise par la tentative suivante
+    postgrest.keys["cle-1"].update(status="in_progress", lease_id=None)
+    monkeypatch.setattr(checkout, "create_order", lambda *args: pytest.fail("commande recréée"))
+    assert process().status_code == 201
+    assert len(postgrest.tables["reservations"]) == 2
+    assert len(postgrest.tables["e_tickets"]) == 3
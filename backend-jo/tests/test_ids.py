@@ -0,0 +1,53 @@
+"""
+Identifiants UUID v7 : ordre, horodatage encodé et bornes de curseur.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from core import ids
+from core.ids import uuid7, uuid7_datetime, uuid7_lower_bound
+
+
+def test_uuid7_version_and_variant():
+    value = uuid7()
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+
+
+def test_uuid7_strictly_increasing():
+    values = [uuid7() for _ in range(10_000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_uuid7_counter_overflow_borrows_next_millisecond(monkeypatch):
+    now_ns = 1_800_000_000_000 * 1_000_000
+    monkeypatch.setattr(ids.time, "time_ns", lambda: now_ns)
+    monkeypatch.setattr(ids, "_last_ms", 0)
+    values = [uuid7() for _ in range(0x1001 + 1)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+    assert uuid7_datetime(values[-1]) > uuid7_datetime(values[0])
+
+
+def test_uuid7_datetime_round_trip():
+    before = datetime.now(timezone.utc) - timedelta(milliseconds=1)
+    value = uuid7()
+    after = datetime.now(timezone.utc) + timedelta(milliseconds=1)
+    assert before <= uuid7_datetime(value) <= after
+
+
+def test_uuid7_lower_bound():
+    moment = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    bound = uuid7_lower_bound(moment)
+    assert bound.version == 7
+    assert uuid7_datetime(bound) == moment
+    assert uuid7_lower_bound(moment - timedelta(milliseconds=1)) < bound < uuid7_lower_bound(moment + timedelta(milliseconds=1))
+
+
+def test_uuid7_lower_bound_precedes_ids_of_the_same_millisecond(monkeypatch):
+    moment = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    monkeypatch.setattr(ids.time, "time_ns", lambda: int(moment.timestamp()) * 1_000_000_000)
+    monkeypatch.setattr(ids, "_last_ms", 0)
+    value = uuid7()
+    assert uuid7_lower_bound(moment) <= value < uuid7_lower_bound(moment + timedelta(milliseconds=1))
@@ -0,0 +1,68 @@
+"""
+Seaux de jetons du backend mémoire : consommation, recharge et prélèvement tout ou rien.
+"""
+import pytest
+
+from core import rate_limit
+from core.rate_limit import MemoryBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_starts_full_then_refuses(clock):
+    backend = MemoryBackend()
+    bucket = ("login:ip:1.2.3.4", 3, 0.5, 1)
+    assert [backend.take([bucket]) for _ in range(3)] == [0, 0, 0]
+    assert backend.take([bucket]) == pytest.approx(2.0)
+
+
+def test_bucket_refills_at_its_rate(clock):
+    backend = MemoryBackend()
+    bucket = ("login:ip:1.2.3.4", 2, 0.5, 1)
+    backend.take([bucket])
+    backend.take([bucket])
+    clock[0] += 1.0
+    assert backend.take([bucket]) == pytest.approx(1.0)
+    clock[0] += 1.0
+    assert backend.take([bucket]) == 0
+    assert backend.take([bucket]) == pytest.approx(2.0)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    backend = MemoryBackend()
+    bucket = ("checkout:user:1", 2, 1.0, 1)
+    backend.take([bucket])
+    clock[0] += 3600
+    assert [backend.take([bucket]) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+
+def test_refused_request_takes_nothing(clock):
+    backend = MemoryBackend()
+    wide = ("checkout:ip:1.2.3.4", 10, 1.0, 1)
+    narrow = ("checkout:user:1", 1, 0.1, 1)
+    assert backend.take([wide, narrow]) == 0
+    # Le seau étroit est vide : le seau large n'est pas entamé pour autant
+    assert backend.take([wide, narrow]) == pytest.approx(10.0)
+    assert [backend.take([wide]) for _ in range(9)] == [0] * 9
+    assert backend.take([wide]) == pytest.approx(1.0)
+
+
+def test_cost_above_one(clock):
+    backend = MemoryBackend()
+    bucket = ("checkout:user:1", 5, 1.0, 3)
+    assert backend.take([bucket]) == 0
+    assert backend.take([bucket]) == pytest.approx(1.0)
+
+
+def test_sweep_drops_only_full_buckets(clock):
+    backend = MemoryBackend()
+    backend.take([("a", 2, 1.0, 1)])
+    backend.take([("b", 2, 0.001, 1)])
+    clock[0] += 5
+    backend._sweep(clock[0])
+    assert set(backend._buckets) == {"b"}
@@ -0,0 +1,131 @@
+"""
+Regroupement des appels concurrents : résultat partagé, délai d'attente et limite d'attente.
+"""
+import threading
+import time
+
+import pytest
+
+from core.singleflight import SingleFlight, SingleFlightOverloaded, SingleFlightTimeout
+
+
+def start_leader(flight, key, release, result="résultat"):
+    """Lance l'appel amont d'une clé dans un thread, bloqué jusqu'à `release`."""
+    started = threading.Event()
+    outcome = {}
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return result
+
+    def run():
+        outcome["result"] = flight.do(key, fn)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, outcome
+
+
+def wait_for_waiters(flight, key, count):
+    deadline = time.monotonic() + 5
+    while flight._calls[key].waiters < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(max_waiters=10, timeout=5)
+    release = threading.Event()
+    leader, outcome = start_leader(flight, "offres", release)
+    results = []
+    waiters = [
+        threading.Thread(target=lambda: results.append(flight.do("offres", lambda: pytest.fail("second appel amont"))))
+        for _ in range(3)
+    ]
+    for thread in waiters:
+        thread.start()
+    wait_for_waiters(flight, "offres", 3)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+    assert outcome["result"] == "résultat"
+    assert results == ["résultat"] * 3
+    assert flight._calls == {}
+
+
+def test_leader_error_is_raised_to_waiters():
+    flight = SingleFlight(max_waiters=10, timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("amont indisponible")
+
+    errors = []
+
+    def call(fn):
+        try:
+            flight.do("offres", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=(fail,))
+    leader.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=call, args=(lambda: None,))
+    waiter.start()
+    wait_for_waiters(flight, "offres", 1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_waiter_times_out():
+    flight = SingleFlight(max_waiters=10, timeout=0.05)
+    release = threading.Event()
+    leader, outcome = start_leader(flight, "offres", release)
+    try:
+        with pytest.raises(SingleFlightTimeout):
+            flight.do("offres", lambda: pytest.fail("second appel amont"))
+    finally:
+        release.set()
+        leader.join(5)
+    assert outcome["result"] == "résultat"
+
+
+def test_waiters_beyond_limit_are_refused():
+    flight = SingleFlight(max_waiters=2, timeout=5)
+    release = threading.Event()
+    leader, _ = start_leader(flight, "offres", release)
+    waiters = [threading.Thread(target=flight.do, args=("offres", lambda: None)) for _ in range(2)]
+    for thread in waiters:
+        thread.start()
+    try:
+        wait_for_waiters(flight, "offres", 2)
+        with pytest.raises(SingleFlightOverloaded):
+            flight.do("offres", lambda: None)
+        # La limite est propre à chaque clé
+        assert flight.do("offre:1", lambda: "autre") == "autre"
+    finally:
+        release.set()
+        for thread in [leader, *waiters]:
+            thread.join(5)
+
+
+def test_forget_detaches_the_running_call():
+    flight = SingleFlight(max_waiters=10, timeout=5)
+    release = threading.Event()
+    leader, outcome = start_leader(flight, "offres", release, result="ancien")
+    try:
+        flight.forget("offres")
+        assert flight.do("offres", lambda: "nouveau") == "nouveau"
+    finally:
+        release.set()
+        leader.join(5)
+    assert outcome["result"] == "ancien"
+    assert flight._calls == {}
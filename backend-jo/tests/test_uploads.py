@@ -0,0 +1,100 @@
+"""
+Lecture des envois CSV / NDJSON : découpage en lignes au fil des paquets, BOM,
+champs sur plusieurs lignes et lignes mal formées.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from core.uploads import upload_format, upload_records
+
+
+class FakeRequest:
+    """Requête dont le corps arrive dans les paquets donnés."""
+
+    def __init__(self, chunks, content_type="text/csv"):
+        self.chunks = chunks
+        self.headers = {"content-type": content_type}
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def read(chunks, format):
+    async def collect():
+        return [record async for record in upload_records(FakeRequest(chunks), format)]
+    return asyncio.run(collect())
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+CSV = "email,first_name,last_name\nana@jo-staff.fr,Ana,Lopez\nléo@jo-staff.fr,Léo,\n".encode()
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, len(CSV)])
+def test_csv_records_across_chunks(size):
+    assert read(split(CSV, size), "csv") == [
+        {"email": "ana@jo-staff.fr", "first_name": "Ana", "last_name": "Lopez"},
+        # Cellule vide omise
+        {"email": "léo@jo-staff.fr", "first_name": "Léo"},
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 2, len(CSV)])
+def test_csv_byte_order_mark_is_dropped(size):
+    records = read(split(b"\xef\xbb\xbf" + CSV, size), "csv")
+    assert records[0]["email"] == "ana@jo-staff.fr"
+
+
+def test_csv_quoted_newline_and_quotes():
+    data = b'email,first_name,last_name\nana@jo-staff.fr,"Ana\nMaria","Lopez ""la Grande"""\nbob@jo-staff.fr,Bob,Martin\n'
+    assert read(split(data, 5), "csv") == [
+        {"email": "ana@jo-staff.fr", "first_name": "Ana\nMaria", "last_name": 'Lopez "la Grande"'},
+        {"email": "bob@jo-staff.fr", "first_name": "Bob", "last_name": "Martin"},
+    ]
+
+
+def test_csv_column_count_error_does_not_stop_the_upload():
+    data = b"email,first_name,last_name\nana@jo-staff.fr,Ana\nbob@jo-staff.fr,Bob,Martin,extra\ncleo@jo-staff.fr,Cleo,Dupont\n"
+    records = read([data], "csv")
+    assert [str(record) for record in records[:2]] == ["2 colonnes au lieu de 3", "4 colonnes au lieu de 3"]
+    assert all(isinstance(record, ValueError) for record in records[:2])
+    assert records[2] == {"email": "cleo@jo-staff.fr", "first_name": "Cleo", "last_name": "Dupont"}
+
+
+def test_csv_blank_lines_crlf_and_missing_final_newline():
+    data = b"\r\n email , first_name \r\n\r\nana@jo-staff.fr,Ana\r\n,\r\nbob@jo-staff.fr,Bob"
+    assert read([data], "csv") == [
+        {"email": "ana@jo-staff.fr", "first_name": "Ana"},
+        {"email": "bob@jo-staff.fr", "first_name": "Bob"},
+    ]
+
+
+def test_ndjson_records():
+    data = '{"email": "ana@jo-staff.fr"}\n\n[1, 2]\n{"email": \n{"email": "léo@jo-staff.fr"}'.encode()
+    records = read(split(b"\xef\xbb\xbf" + data, 3), "ndjson")
+    assert records[0] == {"email": "ana@jo-staff.fr"}
+    assert str(records[1]) == "La ligne doit être un objet JSON."
+    assert isinstance(records[2], ValueError) and str(records[2]).startswith("JSON invalide")
+    assert records[3] == {"email": "léo@jo-staff.fr"}
+    assert len(records) == 4
+
+
+@pytest.mark.parametrize("content_type, format, expected", [
+    ("text/csv; charset=utf-8", None, "csv"),
+    ("application/x-ndjson", None, "ndjson"),
+    ("Application/JSONL", None, "ndjson"),
+    ("application/json", "csv", "csv"),
+])
+def test_upload_format(content_type, format, expected):
+    assert upload_format(FakeRequest([], content_type), format) == expected
+
+
+def test_upload_format_unknown_is_a_415():
+    with pytest.raises(HTTPException) as error:
+        upload_format(FakeRequest([], "application/json"))
+    assert error.value.status_code == 415
@@ -0,0 +1,55 @@
+"""
+Flux SSE de la file d'attente : fin propre quand le jeton expire ou que la file est en panne.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.v1.endpoints import waiting_room as endpoint
+from core import waiting_room
+
+WAITING = {"position": 3, "admitted": False, "admission_token": None, "retry_after": 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(waiting_room, "queue", object())
+    monkeypatch.setattr(endpoint, "WAITING_ROOM_POLL_INTERVAL_SECONDS", 0)
+    app = FastAPI()
+    app.include_router(endpoint.router)
+    return TestClient(app)
+
+
+def statuses(monkeypatch, *outcomes):
+    """`waiting_room.status` renvoie (ou lève) successivement `outcomes`."""
+    outcomes = list(outcomes)
+
+    def status(token):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(waiting_room, "status", status)
+
+
+def test_stream_ends_with_expired_event(client, monkeypatch):
+    statuses(monkeypatch, WAITING, WAITING, waiting_room.InvalidQueueToken())
+    response = client.get("/events", params={"token": "jeton"})
+    assert response.status_code == 200
+    messages = response.text.strip().split("\n\n")
+    assert len(messages) == 3
+    assert messages[-1].startswith("event: expired\ndata: ")
+
+
+def test_stream_ends_with_error_event(client, monkeypatch):
+    statuses(monkeypatch, WAITING, ConnectionError("file indisponible"))
+    response = client.get("/events", params={"token": "jeton"})
+    messages = response.text.strip().split("\n\n")
+    assert messages[0].startswith("data: ")
+    assert messages[-1].startswith("event: error\ndata: ")
+
+
+def test_invalid_token_before_the_stream_is_a_401(client, monkeypatch):
+    statuses(monkeypatch, waiting_room.InvalidQueueToken())
+    assert client.get("/events", params={"token": "jeton"}).status_code == 401
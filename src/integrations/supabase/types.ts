@@ -14,7 +14,8 @@ export type Database = {
           created_at: string | null
           id: string
           is_used: boolean | null
-          qr_code_url: string
+          legacy_qr_code_url: string | null
+          qr_token: string | null
           reservation_id: string
           used_at: string | null
         }
@@ -22,7 +23,8 @@ export type Database = {
           created_at?: string | null
           id?: string
           is_used?: boolean | null
-          qr_code_url: string
+          legacy_qr_code_url?: string | null
+          qr_token?: string | null
           reservation_id: string
           used_at?: string | null
         }
@@ -30,7 +32,8 @@ export type Database = {
           created_at?: string | null
           id?: string
           is_used?: boolean | null
-          qr_code_url?: string
+          legacy_qr_code_url?: string | null
+          qr_token?: string | null
           reservation_id?: string
           used_at?: string | null
         }
@@ -215,6 +218,10 @@ export type Database = {
         Args: Record<PropertyKey, never>
         Returns: boolean
       }
+      qr_code_url: {
+        Args: { "": Database["public"]["Tables"]["e_tickets"]["Row"] }
+        Returns: string
+      }
     }
     Enums: {
       [_ in never]: never
@@ -0,0 +1,110 @@
+/*
+  # Benchmark : politiques RLS par ligne vs InitPlan
+
+  Compare, sur un jeu de données généré, les plans et les temps des parcours admin
+  et utilisateur de `e_tickets` et `reservations` :
+    - avant : politiques telles que définies jusqu'à 20250620064548 (`is_admin()` et
+      sous-requêtes corrélées évaluées pour chaque ligne)
+    - après : politiques de 20261019094000_rls_initplan_policies.sql
+
+  Tout s'exécute dans une transaction annulée à la fin : la base n'est pas modifiée.
+  À lancer sur une base locale où les migrations sont appliquées :
+
+    psql "$DATABASE_URL" -v rows=200000 -f supabase/benchmarks/rls_admin_policies.sql
+*/
+
+\set ON_ERROR_STOP on
+\if :{?rows}
+\else
+  \set rows 200000
+\endif
+\timing off
+
+BEGIN;
+
+-- Jeu de données : 1 admin, 1 000 acheteurs, :rows réservations avec un e-billet chacune
+INSERT INTO public.users (id, email, first_name, last_name, user_key, is_admin)
+SELECT
+  ('00000000-0000-4000-8000-' || lpad(to_hex(g), 12, '0'))::uuid,
+  'bench' || g || '@rls.test', 'Bench', 'User', gen_random_uuid(), g = 0
+FROM generate_series(0, 1000) g;
+
+INSERT INTO public.offers (id, name, description, price, type)
+VALUES ('00000000-0000-4000-9000-000000000001', 'Bench', 'Offre de benchmark', 10, 'solo');
+
+INSERT INTO public.transactions (id, user_id, amount, status, transaction_key)
+SELECT
+  ('00000000-0000-4000-a000-' || lpad(to_hex(g), 12, '0'))::uuid,
+  ('00000000-0000-4000-8000-' || lpad(to_hex(1 + g % 1000), 12, '0'))::uuid,
+  10, 'completed', gen_random_uuid()
+FROM generate_series(1, :rows) g;
+
+INSERT INTO public.reservations (id, user_id, offer_id, quantity, transaction_id)
+SELECT
+  ('00000000-0000-4000-b000-' || lpad(to_hex(g), 12, '0'))::uuid,
+  ('00000000-0000-4000-8000-' || lpad(to_hex(1 + g % 1000), 12, '0'))::uuid,
+  '00000000-0000-4000-9000-000000000001', 1,
+  ('00000000-0000-4000-a000-' || lpad(to_hex(g), 12, '0'))::uuid
+FROM generate_series(1, :rows) g;
+
+INSERT INTO public.e_tickets (reservation_id)
+SELECT ('00000000-0000-4000-b000-' || lpad(to_hex(g), 12, '0'))::uuid
+FROM generate_series(1, :rows) g;
+
+ANALYZE public.users;
+ANALYZE public.reservations;
+ANALYZE public.e_tickets;
+
+-- Politiques « avant » (état antérieur à 20261019094000)
+SAVEPOINT new_policies;
+
+CREATE OR REPLACE FUNCTION public.is_admin()
+RETURNS BOOLEAN AS $$
+BEGIN
+  RETURN EXISTS (SELECT 1 FROM public.users WHERE id = auth.uid() AND is_admin = true);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER STABLE;
+
+DROP POLICY "Users can view own tickets" ON public.e_tickets;
+DROP POLICY "Users can view own reservations" ON public.reservations;
+
+CREATE POLICY "Admins can view all e-tickets" ON public.e_tickets FOR SELECT TO authenticated
+USING (EXISTS (SELECT 1 FROM public.users WHERE users.id = auth.uid() AND users.is_admin = true));
+CREATE POLICY "Users can view their own e-tickets" ON public.e_tickets FOR SELECT TO authenticated
+USING (EXISTS (SELECT 1 FROM public.reservations WHERE reservations.id = e_tickets.reservation_id AND reservations.user_id = auth.uid()));
+CREATE POLICY "Users can view own tickets (old)" ON public.e_tickets FOR SELECT TO authenticated
+USING (auth.uid() = (SELECT user_id FROM public.reservations WHERE id = reservation_id) OR public.is_admin());
+
+CREATE POLICY "Admins can view all reservations" ON public.reservations FOR SELECT TO authenticated
+USING (EXISTS (SELECT 1 FROM public.users WHERE users.id = auth.uid() AND users.is_admin = true));
+CREATE POLICY "Users can view their own reservations" ON public.reservations FOR SELECT TO authenticated
+USING (user_id = auth.uid());
+CREATE POLICY "Users can view own reservations (old)" ON public.reservations FOR SELECT TO authenticated
+USING (auth.uid() = user_id OR public.is_admin());
+
+\echo '=================== AVANT : admin, count(*) e_tickets ==================='
+SET LOCAL ROLE authenticated;
+SELECT set_config('request.jwt.claims', '{"sub": "00000000-0000-4000-8000-000000000000", "role": "authenticated"}', true) \gset
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.e_tickets;
+\echo '=================== AVANT : admin, count(*) reservations ==================='
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.reservations;
+\echo '=================== AVANT : acheteur, ses e-billets ==================='
+SELECT set_config('request.jwt.claims', '{"sub": "00000000-0000-4000-8000-000000000001", "role": "authenticated"}', true) \gset
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.e_tickets;
+RESET ROLE;
+
+-- Politiques « après » : celles de la migration
+ROLLBACK TO SAVEPOINT new_policies;
+
+\echo '=================== APRÈS : admin, count(*) e_tickets ==================='
+SET LOCAL ROLE authenticated;
+SELECT set_config('request.jwt.claims', '{"sub": "00000000-0000-4000-8000-000000000000", "role": "authenticated"}', true) \gset
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.e_tickets;
+\echo '=================== APRÈS : admin, count(*) reservations ==================='
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.reservations;
+\echo '=================== APRÈS : acheteur, ses e-billets ==================='
+SELECT set_config('request.jwt.claims', '{"sub": "00000000-0000-4000-8000-000000000001", "role": "authenticated"}', true) \gset
+EXPLAIN (ANALYZE, COSTS OFF, SUMMARY ON) SELECT count(*) FROM public.e_tickets;
+RESET ROLE;
+
+ROLLBACK;
@@ -0,0 +1,65 @@
+/*
+  # Benchmark : clés primaires UUID v4 vs v7
+
+  Insère le même nombre de lignes dans deux tables identiques, l'une avec
+  `gen_random_uuid()` (v4), l'autre avec `uuid_generate_v7()`, puis compare :
+    - le temps d'un chargement initial de :rows lignes ;
+    - le temps d'insertions continues (lots de 1 000 lignes) sur l'index déjà rempli ;
+    - la taille finale de l'index de clé primaire.
+
+  Avec des clés aléatoires, chaque insertion peut scinder une page quelconque de
+  l'index (remplie à ~70 %) ; avec des clés v7, les insertions se font en fin
+  d'index (pages remplies à ~90 %). L'écart de temps se creuse dès que l'index ne
+  tient plus dans shared_buffers.
+
+  Les tables sont créées dans le schéma `bench` et supprimées à la fin :
+
+    psql "$DATABASE_URL" -v rows=2000000 -f supabase/benchmarks/uuid_v7_inserts.sql
+*/
+
+\set ON_ERROR_STOP on
+\if :{?rows}
+\else
+  \set rows 2000000
+\endif
+
+CREATE SCHEMA IF NOT EXISTS bench;
+DROP TABLE IF EXISTS bench.keys_v4, bench.keys_v7;
+CREATE TABLE bench.keys_v4 (id uuid PRIMARY KEY DEFAULT gen_random_uuid(), created_at timestamptz DEFAULT now());
+CREATE TABLE bench.keys_v7 (id uuid PRIMARY KEY DEFAULT public.uuid_generate_v7(), created_at timestamptz DEFAULT now());
+
+\echo '--- Chargement initial :' :rows 'lignes'
+\timing on
+INSERT INTO bench.keys_v4 (created_at) SELECT now() FROM generate_series(1, :rows);
+INSERT INTO bench.keys_v7 (created_at) SELECT now() FROM generate_series(1, :rows);
+\timing off
+
+\echo '--- Insertions continues : lots de 1 000 lignes, :rows / 10 au total'
+SELECT set_config('bench.batches', greatest(:rows / 10000, 1)::text, false) \gset
+\timing on
+DO $$
+BEGIN
+  FOR i IN 1 .. current_setting('bench.batches')::int LOOP
+    INSERT INTO bench.keys_v4 (created_at) SELECT now() FROM generate_series(1, 1000);
+  END LOOP;
+END $$;
+DO $$
+BEGIN
+  FOR i IN 1 .. current_setting('bench.batches')::int LOOP
+    INSERT INTO bench.keys_v7 (created_at) SELECT now() FROM generate_series(1, 1000);
+  END LOOP;
+END $$;
+\timing off
+
+\echo '--- Index de clé primaire'
+SELECT
+  c.relname AS index,
+  pg_size_pretty(pg_relation_size(c.oid)) AS taille,
+  round(pg_relation_size(c.oid)::numeric / (SELECT count(*) FROM bench.keys_v4), 1) AS octets_par_ligne
+FROM pg_class c
+JOIN pg_index i ON i.indexrelid = c.oid
+JOIN pg_class t ON t.oid = i.indrelid
+WHERE t.relnamespace = 'bench'::regnamespace AND i.indisprimary
+ORDER BY c.relname;
+
+DROP SCHEMA bench CASCADE;
@@ -0,0 +1,128 @@
+/*
+  # Clés d'idempotence pour le checkout
+
+  1. Table `idempotency_keys`
+    - Une ligne par couple (utilisateur, clé `Idempotency-Key`)
+    - `request_hash` : empreinte du corps de la première requête
+    - `status` : `in_progress` tant que la première requête s'exécute, puis `completed`
+    - `response_status` / `response_body` : réponse rejouée telle quelle aux requêtes suivantes
+    - `locked_until` : bail de la requête en cours ; passé ce délai, une nouvelle requête peut reprendre la clé
+    - `expires_at` : au-delà, la clé est oubliée et peut être réutilisée
+
+  2. Fonctions (SECURITY DEFINER, limitées à `auth.uid()`)
+    - `claim_idempotency_key` : réserve la clé ou renvoie l'état de la requête existante
+    - `complete_idempotency_key` : enregistre la réponse
+    - `release_idempotency_key` : libère une clé dont la requête a échoué
+    - `purge_expired_idempotency_keys` : nettoyage périodique
+
+  3. Security
+    - RLS activé sans politique : la table n'est accessible qu'à travers les fonctions
+*/
+
+CREATE TABLE IF NOT EXISTS public.idempotency_keys (
+  user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+  idempotency_key TEXT NOT NULL CHECK (char_length(idempotency_key) BETWEEN 1 AND 255),
+  request_hash TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'in_progress' CHECK (status IN ('in_progress', 'completed')),
+  response_status INTEGER,
+  response_body JSONB,
+  locked_until TIMESTAMPTZ NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  expires_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx ON public.idempotency_keys (expires_at);
+
+ALTER TABLE public.idempotency_keys ENABLE ROW LEVEL SECURITY;
+
+-- Réserve une clé. Renvoie l'une des issues suivantes :
+--   'started'     : la clé est réservée pour cette requête, qui doit s'exécuter
+--   'in_progress' : une autre requête avec la même clé est en cours
+--   'completed'   : la réponse enregistrée est renvoyée
+--   'mismatch'    : la clé a déjà servi pour un corps de requête différent
+CREATE OR REPLACE FUNCTION public.claim_idempotency_key(
+  p_key TEXT,
+  p_request_hash TEXT,
+  p_ttl_seconds INTEGER DEFAULT 86400,
+  p_lock_seconds INTEGER DEFAULT 30
+)
+RETURNS TABLE (outcome TEXT, response_status INTEGER, response_body JSONB) AS $$
+DECLARE
+  v_user_id UUID := auth.uid();
+  v_row public.idempotency_keys%ROWTYPE;
+BEGIN
+  IF v_user_id IS NULL THEN
+    RAISE EXCEPTION 'Authentification requise' USING ERRCODE = '42501';
+  END IF;
+
+  DELETE FROM public.idempotency_keys k
+  WHERE k.user_id = v_user_id AND k.idempotency_key = p_key AND k.expires_at < now();
+
+  INSERT INTO public.idempotency_keys (user_id, idempotency_key, request_hash, locked_until, expires_at)
+  VALUES (
+    v_user_id, p_key, p_request_hash,
+    now() + make_interval(secs => p_lock_seconds),
+    now() + make_interval(secs => p_ttl_seconds)
+  )
+  ON CONFLICT ON CONSTRAINT idempotency_keys_pkey DO NOTHING;
+
+  IF FOUND THEN
+    RETURN QUERY SELECT 'started'::TEXT, NULL::INTEGER, NULL::JSONB;
+    RETURN;
+  END IF;
+
+  SELECT * INTO v_row FROM public.idempotency_keys k
+  WHERE k.user_id = v_user_id AND k.idempotency_key = p_key
+  FOR UPDATE;
+
+  IF v_row.request_hash <> p_request_hash THEN
+    RETURN QUERY SELECT 'mismatch'::TEXT, NULL::INTEGER, NULL::JSONB;
+  ELSIF v_row.status = 'completed' THEN
+    RETURN QUERY SELECT 'completed'::TEXT, v_row.response_status, v_row.response_body;
+  ELSIF v_row.locked_until < now() THEN
+    -- La requête précédente a disparu sans terminer (worker arrêté) : on reprend la clé
+    UPDATE public.idempotency_keys k
+    SET locked_until = now() + make_interval(secs => p_lock_seconds)
+    WHERE k.user_id = v_user_id AND k.idempotency_key = p_key;
+    RETURN QUERY SELECT 'started'::TEXT, NULL::INTEGER, NULL::JSONB;
+  ELSE
+    RETURN QUERY SELECT 'in_progress'::TEXT, NULL::INTEGER, NULL::JSONB;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.complete_idempotency_key(
+  p_key TEXT,
+  p_response_status INTEGER,
+  p_response_body JSONB
+)
+RETURNS VOID AS $$
+  UPDATE public.idempotency_keys
+  SET status = 'completed',
+      response_status = p_response_status,
+      response_body = p_response_body
+  WHERE user_id = auth.uid() AND idempotency_key = p_key;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.release_idempotency_key(p_key TEXT)
+RETURNS VOID AS $$
+  DELETE FROM public.idempotency_keys
+  WHERE user_id = auth.uid() AND idempotency_key = p_key AND status = 'in_progress';
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.purge_expired_idempotency_keys()
+RETURNS INTEGER AS $$
+  WITH deleted AS (
+    DELETE FROM public.idempotency_keys WHERE expires_at < now() RETURNING 1
+  )
+  SELECT count(*)::INTEGER FROM deleted;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.claim_idempotency_key(TEXT, TEXT, INTEGER, INTEGER) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION public.complete_idempotency_key(TEXT, INTEGER, JSONB) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION public.release_idempotency_key(TEXT) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION public.purge_expired_idempotency_keys() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_idempotency_key(TEXT, TEXT, INTEGER, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.complete_idempotency_key(TEXT, INTEGER, JSONB) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.release_idempotency_key(TEXT) TO authenticated;
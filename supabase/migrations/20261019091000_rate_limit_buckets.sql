@@ -0,0 +1,87 @@
+/*
+  # Limitation de débit partagée entre les workers (token bucket)
+
+  1. Table `rate_limit_buckets`
+    - Un seau de jetons par clé (ex : `checkout:user:<id>`, `login:ip:<adresse>`, `global`)
+    - `tokens` : jetons disponibles au moment de `updated_at`
+
+  2. Fonctions
+    - `rate_limit_take` : prélève des jetons dans plusieurs seaux de façon atomique
+      (tout ou rien) et renvoie 0 si la requête est admise, sinon le délai d'attente en secondes
+    - `purge_rate_limit_buckets` : supprime les seaux inactifs
+
+  3. Security
+    - RLS activé sans politique ; fonctions réservées au rôle `service_role`
+      (le backend), pour qu'un client ne puisse pas vider les seaux des autres
+*/
+
+CREATE TABLE IF NOT EXISTS public.rate_limit_buckets (
+  key TEXT PRIMARY KEY,
+  tokens DOUBLE PRECISION NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+ALTER TABLE public.rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.rate_limit_take(
+  p_keys TEXT[],
+  p_capacities DOUBLE PRECISION[],
+  p_refill_rates DOUBLE PRECISION[],
+  p_costs DOUBLE PRECISION[]
+)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+  v_now TIMESTAMPTZ := clock_timestamp();
+  v_retry_after DOUBLE PRECISION := 0;
+  v_available DOUBLE PRECISION;
+  v_bucket RECORD;
+BEGIN
+  INSERT INTO public.rate_limit_buckets (key, tokens, updated_at)
+  SELECT k, c, v_now FROM unnest(p_keys, p_capacities) AS t(k, c)
+  ON CONFLICT (key) DO NOTHING;
+
+  -- Verrouillage dans un ordre stable pour éviter les interblocages entre requêtes
+  FOR v_bucket IN
+    SELECT b.key, b.tokens, b.updated_at, t.capacity, t.refill_rate, t.cost
+    FROM unnest(p_keys, p_capacities, p_refill_rates, p_costs) AS t(key, capacity, refill_rate, cost)
+    JOIN public.rate_limit_buckets b ON b.key = t.key
+    ORDER BY b.key
+    FOR UPDATE OF b
+  LOOP
+    v_available := least(
+      v_bucket.capacity,
+      v_bucket.tokens + extract(epoch FROM v_now - v_bucket.updated_at) * v_bucket.refill_rate
+    );
+    IF v_available < v_bucket.cost THEN
+      v_retry_after := greatest(v_retry_after, (v_bucket.cost - v_available) / v_bucket.refill_rate);
+    END IF;
+  END LOOP;
+
+  IF v_retry_after > 0 THEN
+    RETURN v_retry_after;
+  END IF;
+
+  UPDATE public.rate_limit_buckets b
+  SET tokens = least(t.capacity, b.tokens + extract(epoch FROM v_now - b.updated_at) * t.refill_rate) - t.cost,
+      updated_at = v_now
+  FROM unnest(p_keys, p_capacities, p_refill_rates, p_costs) AS t(key, capacity, refill_rate, cost)
+  WHERE b.key = t.key;
+
+  RETURN 0;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.purge_rate_limit_buckets(p_idle_seconds INTEGER DEFAULT 3600)
+RETURNS INTEGER AS $$
+  WITH deleted AS (
+    DELETE FROM public.rate_limit_buckets
+    WHERE updated_at < clock_timestamp() - make_interval(secs => p_idle_seconds)
+    RETURNING 1
+  )
+  SELECT count(*)::INTEGER FROM deleted;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.rate_limit_take(TEXT[], DOUBLE PRECISION[], DOUBLE PRECISION[], DOUBLE PRECISION[]) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.purge_rate_limit_buckets(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.rate_limit_take(TEXT[], DOUBLE PRECISION[], DOUBLE PRECISION[], DOUBLE PRECISION[]) TO service_role;
+GRANT EXECUTE ON FUNCTION public.purge_rate_limit_buckets(INTEGER) TO service_role;
@@ -0,0 +1,71 @@
+/*
+  # File d'attente virtuelle du checkout
+
+  1. Numérotation
+    - Séquence `waiting_room_numbers` : chaque client qui rejoint la file reçoit le numéro suivant
+      (une séquence n'est pas transactionnelle et ne crée pas de contention sur une ligne)
+
+  2. Table `waiting_room_state` (une seule ligne)
+    - `admitted` : front d'admission (tous les numéros <= admitted peuvent passer au checkout)
+    - `anchored_at` : instant où `admitted` a été calculé ; le front avance ensuite au débit configuré
+
+  3. Fonctions (réservées à `service_role`)
+    - `waiting_room_join` : attribue un numéro
+    - `waiting_room_frontier` : renvoie le dernier numéro attribué et le front d'admission courant.
+      Le front n'est réécrit qu'au plus une fois par seconde, pour que les sondages
+      de position restent des lectures.
+
+  La position d'un client se calcule en O(1) : numéro - front, sans stockage par client.
+*/
+
+CREATE SEQUENCE IF NOT EXISTS public.waiting_room_numbers;
+
+CREATE TABLE IF NOT EXISTS public.waiting_room_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  admitted DOUBLE PRECISION NOT NULL DEFAULT 0,
+  anchored_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+INSERT INTO public.waiting_room_state (id) VALUES (true) ON CONFLICT DO NOTHING;
+
+ALTER TABLE public.waiting_room_state ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.waiting_room_join()
+RETURNS BIGINT AS $$
+  SELECT nextval('public.waiting_room_numbers');
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.waiting_room_frontier(p_admit_per_second DOUBLE PRECISION)
+RETURNS TABLE (issued BIGINT, admitted DOUBLE PRECISION) AS $$
+DECLARE
+  v_now TIMESTAMPTZ := clock_timestamp();
+  v_issued BIGINT;
+  v_state public.waiting_room_state%ROWTYPE;
+  v_admitted DOUBLE PRECISION;
+BEGIN
+  SELECT CASE WHEN s.is_called THEN s.last_value ELSE 0 END INTO v_issued
+  FROM public.waiting_room_numbers s;
+
+  SELECT * INTO v_state FROM public.waiting_room_state WHERE id;
+
+  -- Le front ne dépasse jamais le dernier numéro attribué : une file vide
+  -- n'accumule pas de crédit qui laisserait passer d'un coup la vague suivante.
+  v_admitted := least(
+    v_issued::DOUBLE PRECISION,
+    v_state.admitted + extract(epoch FROM v_now - v_state.anchored_at) * p_admit_per_second
+  );
+
+  IF v_now - v_state.anchored_at > interval '1 second' THEN
+    UPDATE public.waiting_room_state w
+    SET admitted = v_admitted, anchored_at = v_now
+    WHERE w.id AND w.anchored_at = v_state.anchored_at;
+  END IF;
+
+  RETURN QUERY SELECT v_issued, v_admitted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.waiting_room_join() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.waiting_room_frontier(DOUBLE PRECISION) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.waiting_room_join() TO service_role;
+GRANT EXECUTE ON FUNCTION public.waiting_room_frontier(DOUBLE PRECISION) TO service_role;
@@ -0,0 +1,82 @@
+/*
+  # Claims personnalisés dans le JWT Supabase
+
+  1. Hook `custom_access_token_hook`
+    - Ajoute au JWT les claims `is_admin` et `user_profile` (prénom, nom) lus dans `public.users`
+    - Le backend autorise alors les routes admin et construit l'utilisateur courant
+      sans requête sur la table `users`
+    - À activer dans `supabase/config.toml` (local) ou dans Authentication > Hooks (hébergé)
+
+  2. Colonne `users.claims_updated_at`
+    - Mise à jour par trigger quand `is_admin`, `first_name`, `last_name` ou `email` changent
+    - Un jeton émis avant cette date porte des claims périmés : le backend le refuse
+      et le client doit rafraîchir sa session pour obtenir les nouveaux claims
+
+  3. Security
+    - Seul `supabase_auth_admin` peut exécuter le hook et lire `users` à cette fin
+*/
+
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS claims_updated_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS users_claims_updated_at_idx
+  ON public.users (claims_updated_at)
+  WHERE claims_updated_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.touch_claims_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.claims_updated_at := now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_claims_updated_at ON public.users;
+CREATE TRIGGER users_claims_updated_at
+  BEFORE UPDATE OF is_admin, first_name, last_name, email ON public.users
+  FOR EACH ROW
+  WHEN (
+    OLD.is_admin IS DISTINCT FROM NEW.is_admin
+    OR OLD.first_name IS DISTINCT FROM NEW.first_name
+    OR OLD.last_name IS DISTINCT FROM NEW.last_name
+    OR OLD.email IS DISTINCT FROM NEW.email
+  )
+  EXECUTE FUNCTION public.touch_claims_updated_at();
+
+CREATE OR REPLACE FUNCTION public.custom_access_token_hook(event JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_claims JSONB := event -> 'claims';
+  v_profile RECORD;
+BEGIN
+  SELECT u.is_admin, u.first_name, u.last_name
+  INTO v_profile
+  FROM public.users u
+  WHERE u.id = (event ->> 'user_id')::UUID;
+
+  IF FOUND THEN
+    v_claims := v_claims
+      || jsonb_build_object('is_admin', coalesce(v_profile.is_admin, false))
+      || jsonb_build_object('user_profile', jsonb_build_object(
+           'first_name', v_profile.first_name,
+           'last_name', v_profile.last_name
+         ));
+  ELSE
+    v_claims := v_claims || jsonb_build_object('is_admin', false);
+  END IF;
+
+  RETURN jsonb_set(event, '{claims}', v_claims);
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT USAGE ON SCHEMA public TO supabase_auth_admin;
+GRANT EXECUTE ON FUNCTION public.custom_access_token_hook(JSONB) TO supabase_auth_admin;
+REVOKE EXECUTE ON FUNCTION public.custom_access_token_hook(JSONB) FROM authenticated, anon, PUBLIC;
+
+GRANT SELECT ON TABLE public.users TO supabase_auth_admin;
+
+DROP POLICY IF EXISTS "Auth admin can read user profiles for token claims" ON public.users;
+CREATE POLICY "Auth admin can read user profiles for token claims"
+ON public.users
+FOR SELECT
+TO supabase_auth_admin
+USING (true);
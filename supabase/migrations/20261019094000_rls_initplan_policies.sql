@@ -0,0 +1,132 @@
+/*
+  # Politiques RLS évaluées une fois par requête au lieu d'une fois par ligne
+
+  1. Problème
+    - `public.is_admin()` et `auth.uid()` appelés directement dans une politique sont
+      réévalués pour chaque ligne lue : un parcours admin de `e_tickets` ou
+      `reservations` exécute une requête sur `users` par ligne
+    - Les politiques de `e_tickets` retrouvent le propriétaire par une sous-requête
+      corrélée sur `reservations`, elle aussi exécutée pour chaque ligne
+    - Plusieurs politiques SELECT redondantes s'accumulaient sur la même table,
+      et toutes sont évaluées (elles sont combinées par OR)
+
+  2. Changes
+    - `(SELECT public.is_admin())` et `(SELECT auth.uid())` : Postgres les calcule une
+      seule fois par requête (InitPlan)
+    - Propriété des e-billets : `reservation_id IN (SELECT id FROM reservations WHERE user_id = ...)`,
+      évalué une fois sous forme de sous-plan haché
+    - Une seule politique SELECT par table
+    - Les politiques admin de `users` et `offers` testaient `auth.jwt() ->> 'role' = 'admin'`,
+      qui ne vaut jamais 'admin' (le claim `role` est le rôle Postgres) ; elles utilisent
+      désormais `is_admin()`
+    - `is_admin()` devient une fonction SQL (plus légère que plpgsql)
+
+  3. Mesure
+    - `supabase/benchmarks/rls_admin_policies.sql` compare plans et temps avant/après
+*/
+
+CREATE OR REPLACE FUNCTION public.is_admin()
+RETURNS BOOLEAN AS $$
+  SELECT EXISTS (
+    SELECT 1 FROM public.users
+    WHERE id = auth.uid() AND is_admin = true
+  );
+$$ LANGUAGE sql SECURITY DEFINER STABLE SET search_path = public;
+
+-- e_tickets
+DROP POLICY IF EXISTS "Admins can view all e-tickets" ON public.e_tickets;
+DROP POLICY IF EXISTS "Users can view their own e-tickets" ON public.e_tickets;
+DROP POLICY IF EXISTS "Users can view own tickets" ON public.e_tickets;
+DROP POLICY IF EXISTS "Users can create own tickets" ON public.e_tickets;
+
+CREATE POLICY "Users can view own tickets"
+ON public.e_tickets
+FOR SELECT
+TO authenticated
+USING (
+  (SELECT public.is_admin())
+  OR reservation_id IN (
+    SELECT id FROM public.reservations WHERE user_id = (SELECT auth.uid())
+  )
+);
+
+CREATE POLICY "Users can create own tickets"
+ON public.e_tickets
+FOR INSERT
+TO authenticated
+WITH CHECK (
+  (SELECT public.is_admin())
+  OR reservation_id IN (
+    SELECT id FROM public.reservations WHERE user_id = (SELECT auth.uid())
+  )
+);
+
+-- reservations
+DROP POLICY IF EXISTS "Admins can view all reservations" ON public.reservations;
+DROP POLICY IF EXISTS "Users can view their own reservations" ON public.reservations;
+DROP POLICY IF EXISTS "Users can view own reservations" ON public.reservations;
+DROP POLICY IF EXISTS "Users can create own reservations" ON public.reservations;
+
+CREATE POLICY "Users can view own reservations"
+ON public.reservations
+FOR SELECT
+TO authenticated
+USING ((SELECT public.is_admin()) OR user_id = (SELECT auth.uid()));
+
+CREATE POLICY "Users can create own reservations"
+ON public.reservations
+FOR INSERT
+TO authenticated
+WITH CHECK (user_id = (SELECT auth.uid()));
+
+-- transactions
+DROP POLICY IF EXISTS "Admins can view all transactions" ON public.transactions;
+DROP POLICY IF EXISTS "Users can view their own transactions" ON public.transactions;
+DROP POLICY IF EXISTS "Users can view own transactions" ON public.transactions;
+DROP POLICY IF EXISTS "Users can create own transactions" ON public.transactions;
+
+CREATE POLICY "Users can view own transactions"
+ON public.transactions
+FOR SELECT
+TO authenticated
+USING ((SELECT public.is_admin()) OR user_id = (SELECT auth.uid()));
+
+CREATE POLICY "Users can create own transactions"
+ON public.transactions
+FOR INSERT
+TO authenticated
+WITH CHECK (user_id = (SELECT auth.uid()));
+
+-- users
+DROP POLICY IF EXISTS "Admins can view all users" ON public.users;
+DROP POLICY IF EXISTS "Users can view their own data" ON public.users;
+DROP POLICY IF EXISTS "Users can update their own data" ON public.users;
+DROP POLICY IF EXISTS "Users can create their own profile" ON public.users;
+
+CREATE POLICY "Users can view their own data"
+ON public.users
+FOR SELECT
+TO authenticated
+USING ((SELECT public.is_admin()) OR id = (SELECT auth.uid()));
+
+CREATE POLICY "Users can update their own data"
+ON public.users
+FOR UPDATE
+TO authenticated
+USING (id = (SELECT auth.uid()));
+
+CREATE POLICY "Users can create their own profile"
+ON public.users
+FOR INSERT
+TO authenticated
+WITH CHECK (id = (SELECT auth.uid()));
+
+-- offers
+DROP POLICY IF EXISTS "Admins can manage offers" ON public.offers;
+
+CREATE POLICY "Admins can manage offers"
+ON public.offers
+FOR ALL
+TO authenticated
+USING ((SELECT public.is_admin()))
+WITH CHECK ((SELECT public.is_admin()));
@@ -0,0 +1,48 @@
+/*
+  # Index sur les clés étrangères et les filtres des endpoints
+
+  Aucune migration n'indexait les colonnes sur lesquelles filtrent les endpoints et
+  les politiques RLS : chaque requête parcourait la table entière.
+
+  1. reservations
+    - (user_id, created_at DESC) : historique d'un utilisateur (`GET /reservations`), politique RLS
+    - (transaction_id) : réservations d'une transaction
+    - (offer_id) : ventes par offre, suppression d'une offre
+
+  2. e_tickets
+    - (reservation_id) : billets d'une réservation, politique RLS, vérification de propriété
+    - (reservation_id) WHERE is_used = false : billets encore valides d'une réservation
+
+  3. transactions
+    - (user_id, created_at DESC) : historique des paiements d'un utilisateur
+    - (created_at DESC) : listes admin triées par date
+    - (status, created_at DESC) : listes admin filtrées par statut
+
+  La suite `backend-jo/tests/test_query_plans.py` vérifie que ces requêtes
+  n'effectuent plus de parcours séquentiel sur les grandes tables.
+*/
+
+CREATE INDEX IF NOT EXISTS reservations_user_id_created_at_idx
+  ON public.reservations (user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS reservations_transaction_id_idx
+  ON public.reservations (transaction_id);
+
+CREATE INDEX IF NOT EXISTS reservations_offer_id_idx
+  ON public.reservations (offer_id);
+
+CREATE INDEX IF NOT EXISTS e_tickets_reservation_id_idx
+  ON public.e_tickets (reservation_id);
+
+CREATE INDEX IF NOT EXISTS e_tickets_unused_reservation_id_idx
+  ON public.e_tickets (reservation_id)
+  WHERE is_used = false;
+
+CREATE INDEX IF NOT EXISTS transactions_user_id_created_at_idx
+  ON public.transactions (user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS transactions_created_at_idx
+  ON public.transactions (created_at DESC);
+
+CREATE INDEX IF NOT EXISTS transactions_status_created_at_idx
+  ON public.transactions (status, created_at DESC);
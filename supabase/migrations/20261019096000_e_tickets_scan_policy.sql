@@ -0,0 +1,18 @@
+/*
+  # Scan des e-billets par les administrateurs
+
+  Le contrôle d'accès (POST /etickets/{id}/scan) marque un billet comme utilisé
+  avec le jeton de l'administrateur, que la requête passe par PostgREST ou par le
+  pool asyncpg du backend. Aucune politique UPDATE n'existait sur e_tickets.
+
+  1. Politiques
+    - "Admins can scan tickets" : UPDATE réservé aux administrateurs
+*/
+
+DROP POLICY IF EXISTS "Admins can scan tickets" ON public.e_tickets;
+CREATE POLICY "Admins can scan tickets"
+  ON public.e_tickets
+  FOR UPDATE
+  TO authenticated
+  USING ((SELECT public.is_admin()))
+  WITH CHECK ((SELECT public.is_admin()));
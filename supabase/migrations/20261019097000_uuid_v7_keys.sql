@@ -0,0 +1,80 @@
+/*
+  # Clés UUID v7 pour les tables à fort volume d'insertion
+
+  Les clés v4 de `transactions`, `reservations` et `e_tickets` sont aléatoires :
+  chaque insertion touche une page quelconque de l'index de clé primaire, qui se
+  fragmente et ne tient plus en cache. Une clé v7 commence par l'horodatage en
+  millisecondes : les insertions se font en fin d'index, et l'ordre des clés
+  suit l'ordre de création (curseur de pagination).
+
+  Les lignes existantes gardent leur clé v4.
+
+  1. Fonctions
+    - `uuid_generate_v7()` : UUID v7 (RFC 9562) à partir de `clock_timestamp()`,
+      croissant à la fraction de milliseconde près
+    - `uuid_v7_to_timestamptz(uuid)` : instant encodé dans une clé v7
+    - `uuid_v7_lower_bound(timestamptz)` : plus petite clé v7 à un instant donné
+
+  2. Valeurs par défaut
+    - `id` de `transactions`, `reservations` et `e_tickets`
+
+  3. Index
+    - reservations (user_id, id) : historique paginé par clé (GET /reservations?limit=&before=)
+
+  Voir supabase/benchmarks/uuid_v7_inserts.sql pour la comparaison avec v4.
+*/
+
+CREATE OR REPLACE FUNCTION public.uuid_generate_v7()
+RETURNS uuid
+LANGUAGE plpgsql
+VOLATILE
+PARALLEL SAFE
+AS $$
+DECLARE
+  -- Arithmétique en double précision : bien plus rapide que le numeric d'extract()
+  v_ms double precision := date_part('epoch', clock_timestamp()) * 1000;
+  v_whole_ms bigint := floor(v_ms);
+BEGIN
+  -- Les 8 premiers octets d'un UUID v4 sont remplacés par l'horodatage en
+  -- millisecondes (48 bits), la version 7 et la fraction de milliseconde sur
+  -- 12 bits (RFC 9562, méthode 3) : les clés générées successivement restent
+  -- croissantes, y compris au sein d'une même milliseconde.
+  RETURN encode(
+    overlay(
+      uuid_send(gen_random_uuid())
+      PLACING substring(int8send(v_whole_ms) FROM 3)
+        || int2send((x'7000'::int | floor((v_ms - v_whole_ms) * 4096)::int)::smallint)
+      FROM 1 FOR 8
+    ),
+    'hex'
+  )::uuid;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.uuid_v7_to_timestamptz(p_id uuid)
+RETURNS timestamptz
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT to_timestamp(('x' || substr(replace(p_id::text, '-', ''), 1, 12))::bit(48)::bigint / 1000.0);
+$$;
+
+CREATE OR REPLACE FUNCTION public.uuid_v7_lower_bound(p_at timestamptz)
+RETURNS uuid
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT (
+    lpad(to_hex(floor(extract(epoch FROM p_at) * 1000)::bigint), 12, '0')
+    || '70008000000000000000'
+  )::uuid;
+$$;
+
+ALTER TABLE public.transactions ALTER COLUMN id SET DEFAULT public.uuid_generate_v7();
+ALTER TABLE public.reservations ALTER COLUMN id SET DEFAULT public.uuid_generate_v7();
+ALTER TABLE public.e_tickets ALTER COLUMN id SET DEFAULT public.uuid_generate_v7();
+
+CREATE INDEX IF NOT EXISTS reservations_user_id_id_idx
+  ON public.reservations (user_id, id);
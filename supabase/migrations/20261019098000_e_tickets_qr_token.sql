@@ -0,0 +1,93 @@
+/*
+  # E-billets : jeton QR compact, URL dérivée à la lecture
+
+  Chaque ligne de `e_tickets` stockait une URL de ~90 octets
+  (https://api.qrserver.com/v1/create-qr-code/?data=<uuid>&size=100x100) dont
+  seul l'UUID compte. Le billet ne stocke plus que ce jeton (uuid, 16 octets) ;
+  l'URL est reconstruite à la lecture.
+
+  1. Colonnes
+    - `qr_token` (uuid) : jeton du QR code, généré à l'insertion
+    - `qr_code_url` renommée en `legacy_qr_code_url`, désormais facultative :
+      seules les lignes pas encore migrées la renseignent
+
+  2. Fonctions
+    - `qr_code_url(e_tickets)` : champ calculé PostgREST qui rend l'URL (jeton, ou
+      URL d'origine si la ligne n'est pas migrée). Les `select=qr_code_url` des
+      clients existants continuent de fonctionner.
+    - procédure `backfill_e_ticket_qr_tokens(batch_size, pause)` : migre les
+      lignes existantes par lots, une transaction par lot, pour ne jamais
+      verrouiller la table longtemps. À lancer après le déploiement :
+
+        CALL public.backfill_e_ticket_qr_tokens(10000);
+
+      Elle peut être interrompue et relancée. Les URL qui ne contiennent pas
+      d'UUID (données de test) restent dans `legacy_qr_code_url`.
+
+  Le backend qui n'écrit plus `qr_code_url` doit être déployé avec cette migration.
+*/
+
+ALTER TABLE public.e_tickets RENAME COLUMN qr_code_url TO legacy_qr_code_url;
+ALTER TABLE public.e_tickets ALTER COLUMN legacy_qr_code_url DROP NOT NULL;
+
+-- Sans valeur par défaut à l'ajout (pas de réécriture de la table), puis défaut
+-- pour les nouvelles lignes uniquement
+ALTER TABLE public.e_tickets ADD COLUMN IF NOT EXISTS qr_token uuid;
+ALTER TABLE public.e_tickets ALTER COLUMN qr_token SET DEFAULT gen_random_uuid();
+
+CREATE OR REPLACE FUNCTION public.qr_code_url(public.e_tickets)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT coalesce(
+    $1.legacy_qr_code_url,
+    'https://api.qrserver.com/v1/create-qr-code/?data=' || $1.qr_token || '&size=100x100'
+  );
+$$;
+
+CREATE OR REPLACE PROCEDURE public.backfill_e_ticket_qr_tokens(
+  p_batch_size integer DEFAULT 10000,
+  p_pause interval DEFAULT '0 seconds'
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_last uuid := '00000000-0000-0000-0000-000000000000';
+  v_next uuid;
+  v_migrated bigint := 0;
+  v_rows bigint;
+BEGIN
+  LOOP
+    -- Parcours par clé : chaque lot est une plage d'id, relue depuis l'index
+    SELECT id INTO v_next
+    FROM (
+      SELECT id FROM public.e_tickets
+      WHERE id > v_last
+      ORDER BY id
+      LIMIT p_batch_size
+    ) batch
+    ORDER BY id DESC
+    LIMIT 1;
+    EXIT WHEN v_next IS NULL;
+
+    UPDATE public.e_tickets
+    SET qr_token = substring(legacy_qr_code_url FROM 'data=([0-9a-fA-F-]{36})')::uuid,
+        legacy_qr_code_url = NULL
+    WHERE id > v_last
+      AND id <= v_next
+      AND legacy_qr_code_url ~ 'data=[0-9a-fA-F-]{36}';
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    v_migrated := v_migrated + v_rows;
+
+    v_last := v_next;
+    COMMIT;
+    IF p_pause > interval '0' THEN
+      PERFORM pg_sleep(extract(epoch FROM p_pause));
+    END IF;
+  END LOOP;
+  RAISE NOTICE 'backfill_e_ticket_qr_tokens : % billets migrés', v_migrated;
+END;
+$$;
+
+REVOKE ALL ON PROCEDURE public.backfill_e_ticket_qr_tokens(integer, interval) FROM PUBLIC, anon, authenticated;
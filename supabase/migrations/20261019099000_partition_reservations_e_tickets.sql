@@ -0,0 +1,444 @@
+/*
+  # Partitionnement de `reservations` et `e_tickets` par mois de création
+
+  Les deux plus grosses tables sont partitionnées par plage de clé primaire.
+  Depuis 20261019097000, les clés sont des UUID v7 qui commencent par leur
+  horodatage : un mois de création correspond exactement à une plage d'id
+  [uuid_v7_lower_bound(début du mois), uuid_v7_lower_bound(mois suivant)).
+
+  Partitionner sur l'id garde les clés primaires et la clé étrangère
+  e_tickets → reservations telles quelles, et permet l'élagage des partitions :
+    - lecture d'un billet par id (GET /etickets/{id}, scan) : une seule partition ;
+    - historique paginé (GET /reservations?limit=&before=) : parcours ordonné des
+      partitions, les plus récentes d'abord, arrêté dès que la page est remplie.
+  Les lignes à clé v4 (antérieures aux clés v7) vont dans la partition par défaut.
+
+  1. Tables (ombres partitionnées, remplacent les tables actuelles au basculement)
+    - `reservations_partitioned`, `e_tickets_partitioned` : mêmes colonnes,
+      index et clés étrangères ; partitions `<table>_yAAAAmMM` et `<table>_default`
+
+  2. Maintenance
+    - `create_monthly_partitions(parent, premier_mois, nb_mois)` : crée les
+      partitions manquantes (en y déplaçant les lignes de la partition par défaut
+      qui leur reviennent)
+    - `maintain_partitions(mois_d_avance)` : partitions du mois courant et des
+      suivants pour toutes les tables partitionnées par id ; planifiée chaque
+      nuit avec pg_cron lorsque l'extension est installée
+
+  3. Migration en ligne des données existantes
+    - triggers de synchronisation : toute écriture sur les tables actuelles est
+      reportée sur les ombres pendant la copie
+    - `CALL public.partition_migration_copy(10000);` copie l'existant par lots,
+      une transaction par lot (interruptible, relançable)
+    - `CALL public.partition_migration_swap();` bascule en une transaction courte :
+      vérification des volumes, renommage (anciennes tables conservées en
+      `*_unpartitioned`), report des politiques RLS, triggers, droits et champs
+      calculés, rechargement du cache de schéma PostgREST.
+      Les anciennes tables se suppriment ensuite à la main une fois la bascule validée.
+*/
+
+-- Partitions --------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.create_monthly_partitions(
+  p_parent regclass,
+  p_from date,
+  p_months integer
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_parent text := p_parent::text;
+  v_default regclass := to_regclass(p_parent::text || '_default');
+  v_month date := date_trunc('month', p_from)::date;
+  v_partition text;
+  v_lower uuid;
+  v_upper uuid;
+  v_columns text;
+  v_created integer := 0;
+BEGIN
+  SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_columns
+  FROM pg_attribute
+  WHERE attrelid = p_parent AND attnum > 0 AND NOT attisdropped;
+
+  FOR i IN 1 .. p_months LOOP
+    v_partition := format('%s_y%sm%s', v_parent, to_char(v_month, 'YYYY'), to_char(v_month, 'MM'));
+    IF to_regclass(v_partition) IS NULL THEN
+      v_lower := public.uuid_v7_lower_bound(v_month);
+      v_upper := public.uuid_v7_lower_bound((v_month + interval '1 month')::date);
+      EXECUTE format('CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_partition, v_parent);
+
+      -- Les lignes de la partition par défaut qui tombent dans la nouvelle plage
+      -- (clés v4 aléatoires, ou mois créé en retard) doivent la quitter avant le
+      -- rattachement. Le verrou empêche d'en insérer d'autres entre-temps.
+      IF v_default IS NOT NULL THEN
+        EXECUTE format('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE', v_default);
+        EXECUTE format(
+          'WITH moved AS (DELETE FROM %1$s WHERE id >= %3$L AND id < %4$L RETURNING %5$s) '
+          'INSERT INTO %2$s (%5$s) SELECT %5$s FROM moved',
+          v_default, v_partition, v_lower, v_upper, v_columns
+        );
+      END IF;
+
+      EXECUTE format(
+        'ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM (%L) TO (%L)',
+        v_parent, v_partition, v_lower, v_upper
+      );
+      v_created := v_created + 1;
+    END IF;
+    v_month := (v_month + interval '1 month')::date;
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.maintain_partitions(p_months_ahead integer DEFAULT 3)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_parent regclass;
+  v_created integer := 0;
+BEGIN
+  -- Toutes les tables du schéma public partitionnées par plage sur `id`
+  FOR v_parent IN
+    SELECT pt.partrelid::regclass
+    FROM pg_partitioned_table pt
+    JOIN pg_class c ON c.oid = pt.partrelid
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND pt.partstrat = 'r'
+      AND a.attname = 'id'
+  LOOP
+    v_created := v_created + public.create_monthly_partitions(v_parent, current_date, p_months_ahead + 1);
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.create_monthly_partitions(regclass, date, integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.maintain_partitions(integer) FROM PUBLIC, anon, authenticated;
+
+-- Tables partitionnées ------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS public.reservations_partitioned (
+  LIKE public.reservations INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+  PRIMARY KEY (id),
+  FOREIGN KEY (user_id) REFERENCES public.users(id),
+  FOREIGN KEY (offer_id) REFERENCES public.offers(id),
+  FOREIGN KEY (transaction_id) REFERENCES public.transactions(id)
+) PARTITION BY RANGE (id);
+
+CREATE TABLE IF NOT EXISTS public.e_tickets_partitioned (
+  LIKE public.e_tickets INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+  PRIMARY KEY (id),
+  FOREIGN KEY (reservation_id) REFERENCES public.reservations_partitioned(id)
+) PARTITION BY RANGE (id);
+
+-- Mêmes index que les tables actuelles (20261019095000, 20261019097000)
+CREATE INDEX IF NOT EXISTS reservations_partitioned_user_id_created_at_idx
+  ON public.reservations_partitioned (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS reservations_partitioned_user_id_id_idx
+  ON public.reservations_partitioned (user_id, id);
+CREATE INDEX IF NOT EXISTS reservations_partitioned_transaction_id_idx
+  ON public.reservations_partitioned (transaction_id);
+CREATE INDEX IF NOT EXISTS reservations_partitioned_offer_id_idx
+  ON public.reservations_partitioned (offer_id);
+CREATE INDEX IF NOT EXISTS e_tickets_partitioned_reservation_id_idx
+  ON public.e_tickets_partitioned (reservation_id);
+CREATE INDEX IF NOT EXISTS e_tickets_partitioned_unused_reservation_id_idx
+  ON public.e_tickets_partitioned (reservation_id)
+  WHERE is_used = false;
+
+CREATE TABLE IF NOT EXISTS public.reservations_partitioned_default
+  PARTITION OF public.reservations_partitioned DEFAULT;
+CREATE TABLE IF NOT EXISTS public.e_tickets_partitioned_default
+  PARTITION OF public.e_tickets_partitioned DEFAULT;
+
+-- Partitions couvrant les données existantes (clés v7) et les mois à venir
+DO $$
+DECLARE
+  v_first date := date_trunc('month', least(
+    current_date,
+    (SELECT min(created_at)::date FROM public.reservations),
+    (SELECT min(created_at)::date FROM public.e_tickets)
+  ))::date;
+  v_months integer := (
+    (extract(year FROM current_date) - extract(year FROM v_first)) * 12
+    + extract(month FROM current_date) - extract(month FROM v_first)
+  )::integer + 4;
+BEGIN
+  PERFORM public.create_monthly_partitions('public.reservations_partitioned', v_first, v_months);
+  PERFORM public.create_monthly_partitions('public.e_tickets_partitioned', v_first, v_months);
+END $$;
+
+-- Les ombres ne sont pas exposées avant la bascule
+REVOKE ALL ON public.reservations_partitioned, public.e_tickets_partitioned FROM anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('maintain-partitions', '15 3 * * *', 'SELECT public.maintain_partitions()');
+  END IF;
+END $$;
+
+-- Synchronisation pendant la copie -------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.partition_sync_install(p_source regclass, p_target regclass)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_function text := format('public.%s_partition_sync', (SELECT relname FROM pg_class WHERE oid = p_source));
+  v_columns text;
+  v_values text;
+  v_updates text;
+BEGIN
+  SELECT
+    string_agg(quote_ident(attname), ', ' ORDER BY attnum),
+    string_agg('NEW.' || quote_ident(attname), ', ' ORDER BY attnum),
+    string_agg(format('%1$I = EXCLUDED.%1$I', attname), ', ' ORDER BY attnum) FILTER (WHERE attname <> 'id')
+  INTO v_columns, v_values, v_updates
+  FROM pg_attribute
+  WHERE attrelid = p_target AND attnum > 0 AND NOT attisdropped;
+
+  EXECUTE format($f$
+    CREATE OR REPLACE FUNCTION %1$s()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    -- Les écritures viennent des utilisateurs (RLS), qui n'ont pas accès aux ombres
+    SECURITY DEFINER SET search_path = public
+    AS $body$
+    BEGIN
+      IF TG_OP = 'DELETE' THEN
+        DELETE FROM %2$s WHERE id = OLD.id;
+        RETURN OLD;
+      END IF;
+      BEGIN
+        INSERT INTO %2$s (%3$s) VALUES (%4$s)
+        ON CONFLICT (id) DO UPDATE SET %5$s;
+      EXCEPTION WHEN foreign_key_violation THEN
+        -- Ligne parente pas encore copiée : la copie par lots reprendra celle-ci
+        NULL;
+      END;
+      RETURN NEW;
+    END;
+    $body$
+  $f$, v_function, p_target, v_columns, v_values, v_updates);
+
+  EXECUTE format('DROP TRIGGER IF EXISTS partition_sync ON %s', p_source);
+  EXECUTE format(
+    'CREATE TRIGGER partition_sync AFTER INSERT OR UPDATE OR DELETE ON %s FOR EACH ROW EXECUTE FUNCTION %s()',
+    p_source, v_function
+  );
+END;
+$$;
+
+SELECT public.partition_sync_install('public.reservations', 'public.reservations_partitioned');
+SELECT public.partition_sync_install('public.e_tickets', 'public.e_tickets_partitioned');
+
+-- Copie par lots ---------------------------------------------------------------
+
+CREATE OR REPLACE PROCEDURE public.partition_copy(
+  p_source regclass,
+  p_target regclass,
+  p_batch_size integer DEFAULT 10000
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_last uuid := '00000000-0000-0000-0000-000000000000';
+  v_next uuid;
+  v_columns text;
+  v_copied bigint := 0;
+  v_rows bigint;
+BEGIN
+  SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_columns
+  FROM pg_attribute
+  WHERE attrelid = p_target AND attnum > 0 AND NOT attisdropped;
+
+  LOOP
+    EXECUTE format(
+      'SELECT id FROM (SELECT id FROM %s WHERE id > $1 ORDER BY id LIMIT $2) batch ORDER BY id DESC LIMIT 1',
+      p_source
+    ) INTO v_next USING v_last, p_batch_size;
+    EXIT WHEN v_next IS NULL;
+
+    -- Les lignes déjà reportées par le trigger de synchronisation sont plus
+    -- récentes que la copie : elles sont conservées
+    EXECUTE format(
+      'INSERT INTO %2$s (%3$s) SELECT %3$s FROM %1$s WHERE id > $1 AND id <= $2 ON CONFLICT (id) DO NOTHING',
+      p_source, p_target, v_columns
+    ) USING v_last, v_next;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    v_copied := v_copied + v_rows;
+
+    v_last := v_next;
+    COMMIT;
+  END LOOP;
+  RAISE NOTICE 'partition_copy % -> % : % lignes copiées', p_source, p_target, v_copied;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE public.partition_migration_copy(p_batch_size integer DEFAULT 10000)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- Les réservations d'abord : les billets y font référence
+  CALL public.partition_copy('public.reservations', 'public.reservations_partitioned', p_batch_size);
+  CALL public.partition_copy('public.e_tickets', 'public.e_tickets_partitioned', p_batch_size);
+END;
+$$;
+
+-- Bascule ------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.partition_rename_objects(p_table regclass, p_from text, p_to text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_object record;
+BEGIN
+  -- Partitions, index et contraintes de la table et de ses partitions dont le
+  -- nom commence par `p_from_` : le préfixe est remplacé par `p_to`
+  FOR v_object IN
+    WITH tables AS (
+      SELECT p_table AS relid
+      UNION ALL
+      SELECT inhrelid FROM pg_inherits WHERE inhparent = p_table
+    )
+    SELECT 'TABLE' AS kind, NULL::regclass AS relid, c.relname AS name
+    FROM tables t JOIN pg_class c ON c.oid = t.relid
+    WHERE t.relid <> p_table
+    UNION ALL
+    SELECT 'INDEX', NULL, c.relname
+    FROM tables t JOIN pg_index i ON i.indrelid = t.relid JOIN pg_class c ON c.oid = i.indexrelid
+    UNION ALL
+    SELECT 'CONSTRAINT', t.relid, con.conname
+    FROM tables t JOIN pg_constraint con ON con.conrelid = t.relid
+    WHERE con.conindid = 0 OR con.contype = 'f'
+  LOOP
+    CONTINUE WHEN left(v_object.name, length(p_from) + 1) <> p_from || '_';
+    IF v_object.kind = 'CONSTRAINT' THEN
+      EXECUTE format(
+        'ALTER TABLE %s RENAME CONSTRAINT %I TO %I',
+        v_object.relid, v_object.name, p_to || substr(v_object.name, length(p_from) + 1)
+      );
+    ELSE
+      EXECUTE format(
+        'ALTER %s public.%I RENAME TO %I',
+        v_object.kind, v_object.name, p_to || substr(v_object.name, length(p_from) + 1)
+      );
+    END IF;
+  END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE public.partition_migration_swap(p_verify boolean DEFAULT true)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_pair record;
+  v_statements text[] := '{}';
+  v_statement text;
+  v_old bigint;
+  v_new bigint;
+BEGIN
+  IF to_regclass('public.reservations_partitioned') IS NULL THEN
+    RAISE EXCEPTION 'Bascule déjà effectuée';
+  END IF;
+
+  LOCK TABLE public.reservations, public.e_tickets IN ACCESS EXCLUSIVE MODE;
+
+  FOR v_pair IN
+    SELECT * FROM (VALUES
+      ('public.reservations'::regclass, 'public.reservations_partitioned'::regclass, 'reservations'),
+      ('public.e_tickets'::regclass, 'public.e_tickets_partitioned'::regclass, 'e_tickets')
+    ) AS pairs(source, target, name)
+  LOOP
+    IF p_verify THEN
+      EXECUTE format('SELECT count(*) FROM %s', v_pair.source) INTO v_old;
+      EXECUTE format('SELECT count(*) FROM %s', v_pair.target) INTO v_new;
+      IF v_old <> v_new THEN
+        RAISE EXCEPTION '% : % lignes, % dans la table partitionnée (relancer partition_migration_copy)',
+          v_pair.name, v_old, v_new;
+      END IF;
+    END IF;
+
+    -- Définitions capturées avant les renommages : elles désignent les tables
+    -- par leur nom et s'appliqueront donc aux nouvelles tables.
+    SELECT v_statements || coalesce(array_agg(format(
+      'CREATE POLICY %I ON public.%I AS %s FOR %s TO %s%s%s',
+      pol.polname,
+      v_pair.name,
+      CASE WHEN pol.polpermissive THEN 'PERMISSIVE' ELSE 'RESTRICTIVE' END,
+      CASE pol.polcmd WHEN 'r' THEN 'SELECT' WHEN 'a' THEN 'INSERT' WHEN 'w' THEN 'UPDATE' WHEN 'd' THEN 'DELETE' ELSE 'ALL' END,
+      (
+        SELECT string_agg(CASE WHEN role_oid = 0 THEN 'public' ELSE quote_ident(pg_get_userbyid(role_oid)) END, ', ')
+        FROM unnest(pol.polroles) AS role_oid
+      ),
+      CASE WHEN pol.polqual IS NOT NULL THEN ' USING (' || pg_get_expr(pol.polqual, pol.polrelid) || ')' ELSE '' END,
+      CASE WHEN pol.polwithcheck IS NOT NULL THEN ' WITH CHECK (' || pg_get_expr(pol.polwithcheck, pol.polrelid) || ')' ELSE '' END
+    )), '{}')
+    INTO v_statements
+    FROM pg_policy pol
+    WHERE pol.polrelid = v_pair.source;
+
+    SELECT v_statements || coalesce(array_agg(pg_get_triggerdef(t.oid)), '{}')
+    INTO v_statements
+    FROM pg_trigger t
+    WHERE t.tgrelid = v_pair.source AND NOT t.tgisinternal AND t.tgname <> 'partition_sync';
+
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = v_pair.source) THEN
+      v_statements := v_statements || format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', v_pair.name);
+    END IF;
+    v_statements := v_statements
+      || format('GRANT ALL ON public.%I TO anon, authenticated, service_role', v_pair.name);
+
+    -- Fonctions prenant la ligne en argument (champs calculés PostgREST, ex :
+    -- qr_code_url(e_tickets)) : liées au type de l'ancienne table, recréées après
+    SELECT v_statements || coalesce(array_agg(pg_get_functiondef(p.oid)), '{}')
+    INTO v_statements
+    FROM pg_proc p
+    WHERE (SELECT reltype FROM pg_class WHERE oid = v_pair.source) = ANY(p.proargtypes);
+
+    FOR v_statement IN
+      SELECT format('DROP FUNCTION %s', p.oid::regprocedure)
+      FROM pg_proc p
+      WHERE (SELECT reltype FROM pg_class WHERE oid = v_pair.source) = ANY(p.proargtypes)
+    LOOP
+      EXECUTE v_statement;
+    END LOOP;
+
+    EXECUTE format('DROP TRIGGER partition_sync ON %s', v_pair.source);
+    EXECUTE format('DROP FUNCTION public.%I()', v_pair.name || '_partition_sync');
+  END LOOP;
+
+  ALTER TABLE public.e_tickets RENAME TO e_tickets_unpartitioned;
+  ALTER TABLE public.reservations RENAME TO reservations_unpartitioned;
+  ALTER TABLE public.reservations_partitioned RENAME TO reservations;
+  ALTER TABLE public.e_tickets_partitioned RENAME TO e_tickets;
+
+  -- Index, contraintes et partitions reprennent les noms d'origine (les noms
+  -- des clés étrangères servent aux jointures PostgREST)
+  PERFORM public.partition_rename_objects('public.e_tickets_unpartitioned', 'e_tickets', 'e_tickets_unpartitioned');
+  PERFORM public.partition_rename_objects('public.reservations_unpartitioned', 'reservations', 'reservations_unpartitioned');
+  PERFORM public.partition_rename_objects('public.reservations', 'reservations_partitioned', 'reservations');
+  PERFORM public.partition_rename_objects('public.e_tickets', 'e_tickets_partitioned', 'e_tickets');
+
+  FOREACH v_statement IN ARRAY v_statements LOOP
+    EXECUTE v_statement;
+  END LOOP;
+
+  -- Les anciennes tables restent en place pour un retour arrière, sans accès API
+  REVOKE ALL ON public.reservations_unpartitioned, public.e_tickets_unpartitioned FROM anon, authenticated;
+
+  NOTIFY pgrst, 'reload schema';
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.partition_sync_install(regclass, regclass) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.partition_rename_objects(regclass, text, text) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON PROCEDURE public.partition_copy(regclass, regclass, integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON PROCEDURE public.partition_migration_copy(integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON PROCEDURE public.partition_migration_swap(boolean) FROM PUBLIC, anon, authenticated;
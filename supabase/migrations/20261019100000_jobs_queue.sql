@@ -0,0 +1,88 @@
+/*
+  # File de tâches en arrière-plan
+
+  Le travail qui n'a pas besoin d'être terminé pour répondre (confirmation de
+  commande, e-mails, événements analytiques...) est inscrit dans `jobs` par la
+  requête, dans la même transaction que les données qu'il concerne, puis traité
+  par les workers du backend (core/jobs.py).
+
+  1. Table `jobs`
+    - `kind` / `payload` : type de tâche et paramètres
+    - `user_id` : utilisateur pour le compte duquel la tâche a été créée
+    - `status` : `pending` → `running` → `completed`, ou `dead` après
+      `max_attempts` échecs (file des tâches mortes, relancées à la main)
+    - `run_at` : date d'exécution au plus tôt, repoussée à chaque nouvel essai
+    - `locked_at` / `locked_by` : bail du worker qui exécute la tâche ; prolongé
+      par chaque mise à jour de `progress`
+    - `progress` : avancement publié par les tâches longues
+
+  2. Réservation des tâches
+    - `SELECT ... FOR UPDATE SKIP LOCKED` : plusieurs workers (et plusieurs
+      instances du backend) se partagent la file sans se bloquer
+    - chaque insertion émet `NOTIFY jobs` pour réveiller les workers sans attendre
+      le prochain sondage
+
+  3. Security
+    - RLS activé sans politique : la table n'est accessible qu'au backend
+      (service_role) et à travers `enqueue_job`
+*/
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+  id UUID PRIMARY KEY DEFAULT public.uuid_generate_v7(),
+  kind TEXT NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  user_id UUID REFERENCES public.users(id) ON DELETE SET NULL,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'dead')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 5 CHECK (max_attempts > 0),
+  run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_at TIMESTAMPTZ,
+  locked_by TEXT,
+  last_error TEXT,
+  progress JSONB,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  completed_at TIMESTAMPTZ
+);
+
+-- Les tâches terminées ne sont plus lues que par identifiant : l'index ne porte
+-- que la file active (réservation, bails expirés, profondeur de file)
+CREATE INDEX IF NOT EXISTS jobs_active_status_run_at_idx
+  ON public.jobs (status, run_at)
+  WHERE status <> 'completed';
+CREATE INDEX IF NOT EXISTS jobs_completed_at_idx
+  ON public.jobs (completed_at)
+  WHERE status = 'completed';
+CREATE INDEX IF NOT EXISTS jobs_user_id_idx ON public.jobs (user_id);
+
+ALTER TABLE public.jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.notify_jobs()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('jobs', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Une notification par instruction : une insertion groupée ne réveille les workers qu'une fois
+DROP TRIGGER IF EXISTS jobs_notify ON public.jobs;
+CREATE TRIGGER jobs_notify
+  AFTER INSERT ON public.jobs
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_jobs();
+
+-- Inscrit une tâche pour le compte de l'utilisateur authentifié. Le worker qui la
+-- traite ne doit agir que sur les données de `user_id`.
+CREATE OR REPLACE FUNCTION public.enqueue_job(
+  p_kind TEXT,
+  p_payload JSONB DEFAULT '{}'::jsonb,
+  p_run_at TIMESTAMPTZ DEFAULT now()
+)
+RETURNS UUID AS $$
+  INSERT INTO public.jobs (kind, payload, user_id, run_at)
+  VALUES (p_kind, p_payload, auth.uid(), p_run_at)
+  RETURNING id;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.enqueue_job(TEXT, JSONB, TIMESTAMPTZ) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.enqueue_job(TEXT, JSONB, TIMESTAMPTZ) TO authenticated, service_role;
@@ -0,0 +1,138 @@
+/*
+  # Outbox des événements de commande
+
+  Les événements sont écrits par des triggers, dans la transaction qui modifie
+  les données : pas d'aller-retour supplémentaire pour le backend, et aucun
+  événement perdu ou fantôme quelle que soit l'origine de l'écriture (checkout
+  via PostgREST ou asyncpg, checkouts groupés, remboursement depuis l'admin,
+  scan d'un billet). Le relais du backend (core/outbox.py) publie ensuite les
+  événements vers les sinks configurés et les marque livrés.
+
+  1. Table `outbox`
+    - `id` : UUID v7, donne l'ordre de publication
+    - `event_type` : `order.completed`, `order.refunded`, `ticket.scanned`
+    - `aggregate_id` : transaction ou billet concerné
+    - `payload` : données de l'événement
+    - `delivered_at` : date de publication, NULL tant que l'événement est en attente
+
+  2. Triggers (par instruction, avec tables de transition : un checkout groupé
+     écrit tous ses événements en un seul INSERT)
+    - insertion d'une transaction `completed`, ou passage d'une transaction à
+      `completed` / `refunded`
+    - passage d'un billet à `is_used = true`
+    - chaque insertion dans `outbox` émet `NOTIFY outbox` pour réveiller le relais
+
+  3. Security
+    - RLS activé sans politique : la table n'est accessible qu'au backend
+    - fonctions des triggers en SECURITY DEFINER : les écritures des utilisateurs
+      produisent leurs événements sans droit sur `outbox`
+*/
+
+CREATE TABLE IF NOT EXISTS public.outbox (
+  id UUID PRIMARY KEY DEFAULT public.uuid_generate_v7(),
+  event_type TEXT NOT NULL,
+  aggregate_id UUID NOT NULL,
+  payload JSONB NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  delivered_at TIMESTAMPTZ
+);
+
+-- Événements en attente, dans l'ordre de publication
+CREATE INDEX IF NOT EXISTS outbox_pending_id_idx
+  ON public.outbox (id)
+  WHERE delivered_at IS NULL;
+CREATE INDEX IF NOT EXISTS outbox_delivered_at_idx
+  ON public.outbox (delivered_at)
+  WHERE delivered_at IS NOT NULL;
+
+ALTER TABLE public.outbox ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.notify_outbox()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('outbox', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS outbox_notify ON public.outbox;
+CREATE TRIGGER outbox_notify
+  AFTER INSERT ON public.outbox
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_outbox();
+
+-- Commandes ---------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.outbox_transactions_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'order.completed', n.id, jsonb_build_object(
+    'transaction_id', n.id,
+    'user_id', n.user_id,
+    'amount', n.amount,
+    'payment_method', n.payment_method,
+    'created_at', n.created_at
+  )
+  FROM new_rows n
+  WHERE n.status = 'completed';
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.outbox_transactions_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'order.' || n.status, n.id, jsonb_build_object(
+    'transaction_id', n.id,
+    'user_id', n.user_id,
+    'amount', n.amount,
+    'previous_status', o.status,
+    'created_at', n.created_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  WHERE n.status IN ('completed', 'refunded') AND n.status IS DISTINCT FROM o.status;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS outbox_transactions_inserted ON public.transactions;
+CREATE TRIGGER outbox_transactions_inserted
+  AFTER INSERT ON public.transactions
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.outbox_transactions_inserted();
+
+DROP TRIGGER IF EXISTS outbox_transactions_updated ON public.transactions;
+CREATE TRIGGER outbox_transactions_updated
+  AFTER UPDATE ON public.transactions
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.outbox_transactions_updated();
+
+-- Billets -------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.outbox_e_tickets_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'ticket.scanned', n.id, jsonb_build_object(
+    'ticket_id', n.id,
+    'reservation_id', n.reservation_id,
+    'user_id', r.user_id,
+    'offer_id', r.offer_id,
+    'used_at', n.used_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  JOIN public.reservations r ON r.id = n.reservation_id
+  WHERE n.is_used AND NOT coalesce(o.is_used, false);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recréé sur la table partitionnée par partition_migration_swap (20261019099000)
+DROP TRIGGER IF EXISTS outbox_e_tickets_updated ON public.e_tickets;
+CREATE TRIGGER outbox_e_tickets_updated
+  AFTER UPDATE ON public.e_tickets
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.outbox_e_tickets_updated();
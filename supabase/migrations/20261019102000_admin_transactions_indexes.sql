@@ -0,0 +1,34 @@
+/*
+  # Index de la liste admin des transactions (`GET /admin/transactions`)
+
+  La liste est paginée par clé sur (colonne de tri, id) : chaque page reprend
+  après la dernière ligne de la précédente par une comparaison de ligne
+  `(created_at, id) < (…, …)`. Pour que cette reprise et le tri se lisent
+  directement dans un index, sans tri ni parcours des pages déjà vues, l'id
+  devient la dernière colonne des index sur `created_at`.
+
+  1. Remplacés (mêmes usages, plus la pagination par clé)
+    - (created_at DESC) → (created_at DESC, id DESC)
+    - (status, created_at DESC) → (status, created_at DESC, id DESC)
+    - (user_id, created_at DESC) → (user_id, created_at DESC, id DESC)
+
+  2. Ajouté
+    - (amount DESC, id DESC) : tri par montant, filtres de montant
+
+  Les index sont lus dans les deux sens : les tris croissants s'en servent aussi.
+*/
+
+CREATE INDEX IF NOT EXISTS transactions_created_at_id_idx
+  ON public.transactions (created_at DESC, id DESC);
+DROP INDEX IF EXISTS public.transactions_created_at_idx;
+
+CREATE INDEX IF NOT EXISTS transactions_status_created_at_id_idx
+  ON public.transactions (status, created_at DESC, id DESC);
+DROP INDEX IF EXISTS public.transactions_status_created_at_idx;
+
+CREATE INDEX IF NOT EXISTS transactions_user_id_created_at_id_idx
+  ON public.transactions (user_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS public.transactions_user_id_created_at_idx;
+
+CREATE INDEX IF NOT EXISTS transactions_amount_id_idx
+  ON public.transactions (amount DESC, id DESC);
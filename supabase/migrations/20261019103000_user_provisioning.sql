@@ -0,0 +1,42 @@
+/*
+  # Création de comptes en masse (personnel, bénévoles, délégations)
+
+  `POST /admin/users/provisioning` enregistre les lignes du fichier envoyé dans
+  `user_provisioning` et inscrit une tâche `users.provision` dans la même
+  transaction. Le worker crée les comptes Auth par l'API admin, les profils
+  `users` par lots, et note le résultat de chaque ligne : une tâche interrompue
+  reprend aux lignes encore `pending`.
+
+  1. Table `user_provisioning`
+    - `job_id` : tâche qui traite la ligne (supprimée avec elle)
+    - `email` / `first_name` / `last_name` : compte à créer
+    - `user_id` : identifiant réservé pour le compte Auth avant sa création. Un
+      nouvel essai après une interruption retrouve ainsi le compte déjà créé
+      au lieu de le prendre pour un compte préexistant. Pour un e-mail déjà
+      inscrit, identifiant de son profil (NULL s'il n'en a pas).
+    - `status` : `pending` → `created`, `existing` (e-mail déjà inscrit) ou
+      `failed` (refusé par l'API Auth, voir `error`)
+
+  2. Security
+    - RLS activé sans politique : la table n'est accessible qu'au backend
+*/
+
+CREATE TABLE IF NOT EXISTS public.user_provisioning (
+  id UUID PRIMARY KEY DEFAULT public.uuid_generate_v7(),
+  job_id UUID NOT NULL REFERENCES public.jobs(id) ON DELETE CASCADE,
+  email TEXT NOT NULL,
+  first_name TEXT NOT NULL,
+  last_name TEXT NOT NULL,
+  user_id UUID DEFAULT gen_random_uuid(),
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'created', 'existing', 'failed')),
+  error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  UNIQUE (job_id, email)
+);
+
+-- Lignes restant à traiter d'une tâche, dans l'ordre du fichier ; décompte par statut
+CREATE INDEX IF NOT EXISTS user_provisioning_job_id_status_id_idx
+  ON public.user_provisioning (job_id, status, id);
+
+ALTER TABLE public.user_provisioning ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,45 @@
+/*
+  # Création du profil à l'inscription
+
+  Le profil `public.users` était inséré par le backend après `sign_up`, dans un
+  second aller-retour : un compte Auth pouvait rester sans profil si cette
+  insertion échouait, et le premier jeton émis ne portait pas les claims du
+  profil (`custom_access_token_hook`).
+
+  1. Trigger `on_auth_user_created` sur `auth.users`
+    - crée le profil dans la transaction qui crée le compte, avec le prénom et le
+      nom passés dans les métadonnées d'inscription (`options.data` de `sign_up`,
+      `user_metadata` de l'API admin)
+    - `user_key` : clé secrète des e-tickets, tirée au hasard
+    - sans effet si le profil existe déjà (compte créé par un autre chemin)
+
+  2. Security
+    - fonction en SECURITY DEFINER, exécutée par `supabase_auth_admin` lors de
+      l'inscription ; non exécutable par les rôles de l'API
+*/
+
+CREATE OR REPLACE FUNCTION public.handle_new_auth_user()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.users (id, email, first_name, last_name, user_key)
+  VALUES (
+    NEW.id,
+    NEW.email,
+    coalesce(NEW.raw_user_meta_data ->> 'first_name', ''),
+    coalesce(NEW.raw_user_meta_data ->> 'last_name', ''),
+    gen_random_uuid()
+  )
+  ON CONFLICT DO NOTHING;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = '';
+
+REVOKE ALL ON FUNCTION public.handle_new_auth_user() FROM PUBLIC, anon, authenticated;
+
+-- Les comptes sans e-mail (téléphone seul) n'ont pas de profil : `users.email` est obligatoire
+DROP TRIGGER IF EXISTS on_auth_user_created ON auth.users;
+CREATE TRIGGER on_auth_user_created
+  AFTER INSERT ON auth.users
+  FOR EACH ROW
+  WHEN (NEW.email IS NOT NULL)
+  EXECUTE FUNCTION public.handle_new_auth_user();
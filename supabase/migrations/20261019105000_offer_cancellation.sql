@@ -0,0 +1,147 @@
+/*
+  # Annulation d'une offre (séance annulée) : remboursement et annulation des billets
+
+  `POST /admin/offers/{id}/cancel` ferme l'offre à la vente puis confie le
+  remboursement à une tâche de fond (`offers.cancel`), qui parcourt les
+  réservations de l'offre par lots : chaque lot est une transaction courte,
+  et une tâche interrompue reprend sans rembourser deux fois.
+
+  1. Colonnes
+    - `offers.cancelled_at` : date d'annulation ; une offre annulée n'est plus vendue
+    - `reservations.refunded_at` / `refund_amount` : remboursement de la réservation.
+      Le montant est la part de la réservation dans sa transaction, au prorata
+      des prix des offres (une transaction peut porter plusieurs offres)
+    - `e_tickets.voided_at` : billet annulé, refusé au contrôle d'accès
+    - une transaction `completed` passe à `refunded` quand toutes ses
+      réservations sont remboursées
+
+  2. Index
+    - (offer_id, id) sur `reservations` remplace (offer_id) : parcours par clé
+      des réservations d'une offre, sans tri
+
+  3. Événements (outbox, par instruction : un lot produit ses événements en un INSERT)
+    - `offer.cancelled` : passage de `offers.cancelled_at` à une date
+    - `reservation.refunded` : passage de `reservations.refunded_at` à une date,
+      avec le montant remboursé (remboursements partiels compris)
+    - `ticket.voided` : passage de `e_tickets.voided_at` à une date
+    - `order.refunded` : inchangé, émis au passage de la transaction à `refunded`
+
+  Les ombres partitionnées (20261019099000), si la bascule n'a pas encore eu
+  lieu, reçoivent les mêmes colonnes et index, et leurs triggers de
+  synchronisation sont regénérés.
+*/
+
+ALTER TABLE public.offers ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMPTZ;
+
+ALTER TABLE public.reservations
+  ADD COLUMN IF NOT EXISTS refunded_at TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS refund_amount NUMERIC(10,2);
+
+ALTER TABLE public.e_tickets ADD COLUMN IF NOT EXISTS voided_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS reservations_offer_id_id_idx ON public.reservations (offer_id, id);
+DROP INDEX IF EXISTS public.reservations_offer_id_idx;
+
+DO $$
+BEGIN
+  IF to_regclass('public.reservations_partitioned') IS NOT NULL THEN
+    ALTER TABLE public.reservations_partitioned
+      ADD COLUMN IF NOT EXISTS refunded_at TIMESTAMPTZ,
+      ADD COLUMN IF NOT EXISTS refund_amount NUMERIC(10,2);
+    CREATE INDEX IF NOT EXISTS reservations_partitioned_offer_id_id_idx
+      ON public.reservations_partitioned (offer_id, id);
+    DROP INDEX IF EXISTS public.reservations_partitioned_offer_id_idx;
+    PERFORM public.partition_sync_install('public.reservations', 'public.reservations_partitioned');
+  END IF;
+  IF to_regclass('public.e_tickets_partitioned') IS NOT NULL THEN
+    ALTER TABLE public.e_tickets_partitioned ADD COLUMN IF NOT EXISTS voided_at TIMESTAMPTZ;
+    PERFORM public.partition_sync_install('public.e_tickets', 'public.e_tickets_partitioned');
+  END IF;
+END $$;
+
+-- Offres ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.outbox_offers_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'offer.cancelled', n.id, jsonb_build_object(
+    'offer_id', n.id,
+    'name', n.name,
+    'cancelled_at', n.cancelled_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  WHERE n.cancelled_at IS NOT NULL AND o.cancelled_at IS NULL;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS outbox_offers_updated ON public.offers;
+CREATE TRIGGER outbox_offers_updated
+  AFTER UPDATE ON public.offers
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.outbox_offers_updated();
+
+-- Réservations ---------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.outbox_reservations_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'reservation.refunded', n.id, jsonb_build_object(
+    'reservation_id', n.id,
+    'transaction_id', n.transaction_id,
+    'user_id', n.user_id,
+    'offer_id', n.offer_id,
+    'quantity', n.quantity,
+    'refund_amount', n.refund_amount,
+    'refunded_at', n.refunded_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  WHERE n.refunded_at IS NOT NULL AND o.refunded_at IS NULL;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recréé sur la table partitionnée par partition_migration_swap (20261019099000)
+DROP TRIGGER IF EXISTS outbox_reservations_updated ON public.reservations;
+CREATE TRIGGER outbox_reservations_updated
+  AFTER UPDATE ON public.reservations
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.outbox_reservations_updated();
+
+-- Billets --------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public.outbox_e_tickets_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'ticket.scanned', n.id, jsonb_build_object(
+    'ticket_id', n.id,
+    'reservation_id', n.reservation_id,
+    'user_id', r.user_id,
+    'offer_id', r.offer_id,
+    'used_at', n.used_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  JOIN public.reservations r ON r.id = n.reservation_id
+  WHERE n.is_used AND NOT coalesce(o.is_used, false);
+
+  INSERT INTO public.outbox (event_type, aggregate_id, payload)
+  SELECT 'ticket.voided', n.id, jsonb_build_object(
+    'ticket_id', n.id,
+    'reservation_id', n.reservation_id,
+    'user_id', r.user_id,
+    'offer_id', r.offer_id,
+    'voided_at', n.voided_at
+  )
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  JOIN public.reservations r ON r.id = n.reservation_id
+  WHERE n.voided_at IS NOT NULL AND o.voided_at IS NULL;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
@@ -0,0 +1,152 @@
+/*
+  # Clés d'idempotence : jeton de bail et reprise sans double commande
+
+  Une requête dont la réponse n'avait pas pu être enregistrée (échec de
+  `complete_idempotency_key` après l'écriture de la commande) laissait sa clé
+  `in_progress` ; à l'expiration du bail, une nouvelle tentative reprenait la
+  clé et créait une seconde commande. Rien n'empêchait non plus l'ancien
+  détenteur, encore vivant, d'écraser la réponse du nouveau.
+
+  1. Colonnes de `idempotency_keys`
+    - `lease_id` : jeton du détenteur courant, renouvelé à chaque reprise.
+      `complete_idempotency_key` et `release_idempotency_key` n'agissent que
+      pour ce jeton (fencing) ; NULL une fois la clé libérée
+    - `order_key` : tiré à la réservation de la clé et conservé d'une reprise à
+      l'autre. Il sert de `transactions.transaction_key` à la commande : une
+      reprise retrouve la commande déjà écrite au lieu d'en créer une autre
+
+  2. Index
+    - UNIQUE sur `transactions.transaction_key` : deux détenteurs d'une même clé
+      ne peuvent pas écrire deux commandes, et la reprise lit la commande par sa clé
+
+  3. Fonctions
+    - `claim_idempotency_key` renvoie aussi `lease_id`, `order_key` et
+      `taken_over` (clé reprise après un bail expiré ou une libération)
+    - `complete_idempotency_key(p_key, p_lease_id, ...)` renvoie false si le
+      bail a été repris entre-temps
+    - `release_idempotency_key(p_key, p_lease_id, p_forget)` : avec `p_forget`
+      (requête refusée sans rien écrire), la clé est supprimée comme avant ;
+      sinon seul le bail est libéré, et la tentative suivante reprend la clé
+      avec le même `order_key`
+*/
+
+ALTER TABLE public.idempotency_keys
+  ADD COLUMN IF NOT EXISTS lease_id UUID,
+  ADD COLUMN IF NOT EXISTS order_key UUID NOT NULL DEFAULT gen_random_uuid();
+
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_transaction_key_key
+  ON public.transactions (transaction_key);
+
+DROP FUNCTION IF EXISTS public.claim_idempotency_key(TEXT, TEXT, INTEGER, INTEGER);
+DROP FUNCTION IF EXISTS public.complete_idempotency_key(TEXT, INTEGER, JSONB);
+DROP FUNCTION IF EXISTS public.release_idempotency_key(TEXT);
+
+-- Réserve une clé. Renvoie l'une des issues suivantes :
+--   'started'     : la clé est réservée pour cette requête (bail `lease_id`), qui doit s'exécuter
+--   'in_progress' : une autre requête avec la même clé est en cours
+--   'completed'   : la réponse enregistrée est renvoyée
+--   'mismatch'    : la clé a déjà servi pour un corps de requête différent
+CREATE OR REPLACE FUNCTION public.claim_idempotency_key(
+  p_key TEXT,
+  p_request_hash TEXT,
+  p_ttl_seconds INTEGER DEFAULT 86400,
+  p_lock_seconds INTEGER DEFAULT 30
+)
+RETURNS TABLE (
+  outcome TEXT,
+  response_status INTEGER,
+  response_body JSONB,
+  lease_id UUID,
+  order_key UUID,
+  taken_over BOOLEAN
+) AS $$
+DECLARE
+  v_user_id UUID := auth.uid();
+  v_lease_id UUID := gen_random_uuid();
+  v_row public.idempotency_keys%ROWTYPE;
+BEGIN
+  IF v_user_id IS NULL THEN
+    RAISE EXCEPTION 'Authentification requise' USING ERRCODE = '42501';
+  END IF;
+
+  DELETE FROM public.idempotency_keys k
+  WHERE k.user_id = v_user_id AND k.idempotency_key = p_key AND k.expires_at < now();
+
+  INSERT INTO public.idempotency_keys AS k (user_id, idempotency_key, request_hash, lease_id, locked_until, expires_at)
+  VALUES (
+    v_user_id, p_key, p_request_hash, v_lease_id,
+    now() + make_interval(secs => p_lock_seconds),
+    now() + make_interval(secs => p_ttl_seconds)
+  )
+  ON CONFLICT ON CONSTRAINT idempotency_keys_pkey DO NOTHING
+  RETURNING k.* INTO v_row;
+
+  IF FOUND THEN
+    RETURN QUERY SELECT 'started'::TEXT, NULL::INTEGER, NULL::JSONB, v_lease_id, v_row.order_key, false;
+    RETURN;
+  END IF;
+
+  SELECT * INTO v_row FROM public.idempotency_keys k
+  WHERE k.user_id = v_user_id AND k.idempotency_key = p_key
+  FOR UPDATE;
+
+  IF v_row.request_hash <> p_request_hash THEN
+    RETURN QUERY SELECT 'mismatch'::TEXT, NULL::INTEGER, NULL::JSONB, NULL::UUID, NULL::UUID, false;
+  ELSIF v_row.status = 'completed' THEN
+    RETURN QUERY SELECT 'completed'::TEXT, v_row.response_status, v_row.response_body, NULL::UUID, NULL::UUID, false;
+  ELSIF v_row.lease_id IS NULL OR v_row.locked_until < now() THEN
+    -- Le détenteur précédent a échoué ou disparu sans terminer : on reprend la clé
+    -- avec un nouveau bail, qui invalide le sien
+    UPDATE public.idempotency_keys k
+    SET lease_id = v_lease_id,
+        locked_until = now() + make_interval(secs => p_lock_seconds)
+    WHERE k.user_id = v_user_id AND k.idempotency_key = p_key;
+    RETURN QUERY SELECT 'started'::TEXT, NULL::INTEGER, NULL::JSONB, v_lease_id, v_row.order_key, true;
+  ELSE
+    RETURN QUERY SELECT 'in_progress'::TEXT, NULL::INTEGER, NULL::JSONB, NULL::UUID, NULL::UUID, false;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.complete_idempotency_key(
+  p_key TEXT,
+  p_lease_id UUID,
+  p_response_status INTEGER,
+  p_response_body JSONB
+)
+RETURNS BOOLEAN AS $$
+  WITH completed AS (
+    UPDATE public.idempotency_keys
+    SET status = 'completed',
+        lease_id = NULL,
+        response_status = p_response_status,
+        response_body = p_response_body
+    WHERE user_id = auth.uid() AND idempotency_key = p_key
+      AND status = 'in_progress' AND lease_id = p_lease_id
+    RETURNING 1
+  )
+  SELECT EXISTS (SELECT 1 FROM completed);
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.release_idempotency_key(p_key TEXT, p_lease_id UUID, p_forget BOOLEAN DEFAULT false)
+RETURNS VOID AS $$
+BEGIN
+  IF p_forget THEN
+    DELETE FROM public.idempotency_keys
+    WHERE user_id = auth.uid() AND idempotency_key = p_key
+      AND status = 'in_progress' AND lease_id = p_lease_id;
+  ELSE
+    UPDATE public.idempotency_keys
+    SET lease_id = NULL, locked_until = now()
+    WHERE user_id = auth.uid() AND idempotency_key = p_key
+      AND status = 'in_progress' AND lease_id = p_lease_id;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.claim_idempotency_key(TEXT, TEXT, INTEGER, INTEGER) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION public.complete_idempotency_key(TEXT, UUID, INTEGER, JSONB) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION public.release_idempotency_key(TEXT, UUID, BOOLEAN) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.claim_idempotency_key(TEXT, TEXT, INTEGER, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.complete_idempotency_key(TEXT, UUID, INTEGER, JSONB) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.release_idempotency_key(TEXT, UUID, BOOLEAN) TO authenticated;
@@ -0,0 +1,39 @@
+/*
+  # `enqueue_job` limité aux tâches qu'un utilisateur peut demander
+
+  `enqueue_job` est SECURITY DEFINER et exécutable par `authenticated` : il
+  acceptait n'importe quel `p_kind`, et un utilisateur pouvait inscrire par
+  `rpc('enqueue_job', ...)` des tâches d'administration (`users.erase`,
+  `offers.cancel`...) que les workers exécutent en service_role.
+
+  1. Fonction `enqueue_job`
+    - n'accepte plus que les types de la liste ci-dessous ; tout autre type est
+      refusé (42501)
+    - `checkout.completed` : confirmation d'une commande, dont le worker vérifie
+      qu'elle appartient à `user_id`
+
+  Les tâches d'administration sont inscrites par le backend en service_role,
+  directement dans `jobs` (`JobQueue.enqueue_many`).
+*/
+
+CREATE OR REPLACE FUNCTION public.enqueue_job(
+  p_kind TEXT,
+  p_payload JSONB DEFAULT '{}'::jsonb,
+  p_run_at TIMESTAMPTZ DEFAULT now()
+)
+RETURNS UUID AS $$
+DECLARE
+  v_id UUID;
+BEGIN
+  IF p_kind NOT IN ('checkout.completed') THEN
+    RAISE EXCEPTION 'Type de tâche non autorisé : %', p_kind USING ERRCODE = '42501';
+  END IF;
+  INSERT INTO public.jobs (kind, payload, user_id, run_at)
+  VALUES (p_kind, p_payload, auth.uid(), p_run_at)
+  RETURNING id INTO v_id;
+  RETURN v_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.enqueue_job(TEXT, JSONB, TIMESTAMPTZ) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.enqueue_job(TEXT, JSONB, TIMESTAMPTZ) TO authenticated, service_role;
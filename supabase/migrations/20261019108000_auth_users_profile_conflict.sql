@@ -0,0 +1,32 @@
+/*
+  # Création du profil à l'inscription : conflit sur l'identifiant seulement
+
+  `handle_new_auth_user` (20261019104000) ignorait tout conflit
+  (`ON CONFLICT DO NOTHING`), y compris sur l'e-mail unique de `users` : un
+  compte Auth pouvait être créé sans profil quand l'e-mail appartenait déjà à
+  un autre profil.
+
+  1. Fonction `handle_new_auth_user`
+    - seul un profil existant avec le même identifiant est ignoré (compte créé
+      par un autre chemin, par exemple la création en masse)
+    - un e-mail déjà pris par un autre profil fait échouer l'insertion, et donc
+      l'inscription entière : pas de compte Auth sans profil
+*/
+
+CREATE OR REPLACE FUNCTION public.handle_new_auth_user()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO public.users (id, email, first_name, last_name, user_key)
+  VALUES (
+    NEW.id,
+    NEW.email,
+    coalesce(NEW.raw_user_meta_data ->> 'first_name', ''),
+    coalesce(NEW.raw_user_meta_data ->> 'last_name', ''),
+    gen_random_uuid()
+  )
+  ON CONFLICT (id) DO NOTHING;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = '';
+
+REVOKE ALL ON FUNCTION public.handle_new_auth_user() FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,44 @@
+/*
+  # Création du profil à l'inscription : erreur distincte pour un e-mail déjà pris
+
+  Depuis 20261019108000, un e-mail déjà pris par un autre profil fait échouer
+  `handle_new_auth_user`, comme toute autre erreur du trigger (contrainte,
+  valeur manquante...). L'API Auth les renvoie toutes sous le même message
+  (« Database error saving new user ») : le backend ne pouvait pas distinguer
+  le conflit d'e-mail d'une vraie panne.
+
+  1. Fonction `handle_new_auth_user`
+    - la violation de `users_email_key` est relevée avec le message
+      `profile_email_taken` (SQLSTATE 23505), visible dans les journaux de
+      l'API Auth ; le backend confirme le conflit en relisant le profil qui
+      porte cet e-mail avant de répondre 409
+    - toute autre erreur est relevée telle quelle (réponse 500)
+*/
+
+CREATE OR REPLACE FUNCTION public.handle_new_auth_user()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_constraint TEXT;
+BEGIN
+  INSERT INTO public.users (id, email, first_name, last_name, user_key)
+  VALUES (
+    NEW.id,
+    NEW.email,
+    coalesce(NEW.raw_user_meta_data ->> 'first_name', ''),
+    coalesce(NEW.raw_user_meta_data ->> 'last_name', ''),
+    gen_random_uuid()
+  )
+  ON CONFLICT (id) DO NOTHING;
+  RETURN NEW;
+EXCEPTION WHEN unique_violation THEN
+  GET STACKED DIAGNOSTICS v_constraint = CONSTRAINT_NAME;
+  IF v_constraint = 'users_email_key' THEN
+    RAISE EXCEPTION 'profile_email_taken'
+      USING ERRCODE = '23505', CONSTRAINT = v_constraint,
+            DETAIL = format('Un profil existe déjà pour l''e-mail %s.', NEW.email);
+  END IF;
+  RAISE;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = '';
+
+REVOKE ALL ON FUNCTION public.handle_new_auth_user() FROM PUBLIC, anon, authenticated;